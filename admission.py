@@ -0,0 +1,258 @@
+"""
+Admission control for LLM calls: a concurrency limit with a bounded priority queue
+"""
+
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+from config import LLM_MAX_INFLIGHT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+PRIORITY_HIGH = 0  # escalation follow-ups, FAQ answers
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # bulk and batch requests
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call is shed because the server is saturated"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued call, woken through an Event (threads) or a Future (asyncio)"""
+    
+    def __init__(self, priority: int, seq: int, loop: asyncio.AbstractEventLoop = None):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.preempted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+    
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+    
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+    
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Limits concurrent LLM calls, queueing the excess by priority (thread-safe)
+    
+    Up to max_inflight calls run at once. Further calls wait in a queue of
+    at most max_queue entries, ordered by priority then arrival; a freed
+    slot goes straight to the head of the queue. When the queue is full a
+    new call either displaces the lowest-priority waiter (if it outranks
+    it) or is rejected at once, and a waiter that is not admitted within
+    queue_timeout seconds is rejected too. Rejections raise
+    AdmissionRejected carrying a Retry-After estimate.
+    
+    Threads and asyncio tasks share the same slots.
+    """
+    
+    def __init__(
+        self,
+        max_inflight: int = LLM_MAX_INFLIGHT,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        name: str = "ollama"
+    ):
+        """
+        Initialize the controller
+        
+        Args:
+            max_inflight: Calls allowed to run at once
+            max_queue: Calls allowed to wait for a slot
+            queue_timeout: Seconds a call may wait before it is rejected
+            name: Backend name used in messages
+        """
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.name = name
+        self._inflight = 0
+        self._queue: List[_Waiter] = []  # heap
+        self._seq = itertools.count()
+        self._service_time = 1.0  # EWMA of seconds a slot is held
+        self._waits: deque = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._counters = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+    
+    def acquire(self, priority: int = PRIORITY_NORMAL) -> Callable[[], None]:
+        """
+        Wait for a slot (blocking)
+        
+        Args:
+            priority: PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+        
+        Returns:
+            Function releasing the slot (safe to call more than once)
+        
+        Raises:
+            AdmissionRejected: The queue is full or the wait timed out
+        """
+        waiter = self._enter(priority, None)
+        if waiter is not None:
+            waiter.event.wait(self.queue_timeout)
+            self._settle(waiter)
+        return self._releaser()
+    
+    async def acquire_async(self, priority: int = PRIORITY_NORMAL) -> Callable[[], None]:
+        """Wait for a slot without blocking the event loop (see acquire)"""
+        waiter = self._enter(priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            self._settle(waiter)
+        return self._releaser()
+    
+    def _enter(self, priority: int, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter)"""
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._queue:
+                self._inflight += 1
+                self._counters["admitted"] += 1
+                self._waits.append(0.0)
+                return None
+            
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue, default=None)
+                self._counters["rejected"] += 1
+                if worst is None or worst.priority <= priority:
+                    raise self._rejection("queue full")
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst.preempted = True
+                worst.wake()
+            
+            waiter = _Waiter(priority, next(self._seq), loop)
+            heapq.heappush(self._queue, waiter)
+            self._counters["queued"] += 1
+            return waiter
+    
+    def _settle(self, waiter: _Waiter) -> None:
+        """Finish a wait: return when the slot was granted, raise otherwise"""
+        with self._lock:
+            if waiter.granted:
+                self._counters["admitted"] += 1
+                self._waits.append(time.monotonic() - waiter.enqueued)
+                return
+            if waiter.preempted:
+                raise self._rejection("displaced by higher-priority requests")
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            self._counters["timed_out"] += 1
+            self._counters["rejected"] += 1
+            raise self._rejection(f"no slot within {self.queue_timeout:.0f}s")
+    
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Drop a cancelled waiter, passing on a slot it was granted meanwhile"""
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+                return
+            granted = waiter.granted
+        if granted:
+            self._release(None)
+    
+    def _releaser(self) -> Callable[[], None]:
+        start = time.monotonic()
+        released = False
+        
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release(time.monotonic() - start)
+        
+        return release
+    
+    def _release(self, held: Optional[float]) -> None:
+        """Hand the slot to the next waiter, or free it"""
+        with self._lock:
+            if held is not None:
+                self._service_time += 0.2 * (held - self._service_time)
+            if self._queue:
+                waiter = heapq.heappop(self._queue)
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._inflight -= 1
+    
+    def _rejection(self, reason: str) -> AdmissionRejected:
+        """Build the rejection (lock held); Retry-After assumes the backlog drains at the observed rate"""
+        backlog = self._inflight + len(self._queue)
+        retry_after = max(1, math.ceil(self._service_time * backlog / self.max_inflight))
+        logger.warning(f"Shedding LLM call to {self.name}: {reason} (retry after {retry_after}s)")
+        return AdmissionRejected(f"LLM backend {self.name} is overloaded: {reason}", retry_after)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait times and counters"""
+        with self._lock:
+            waits = sorted(self._waits)
+            by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                name = PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+                by_priority[name] = by_priority.get(name, 0) + 1
+            return {
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "inflight": self._inflight,
+                "queue_depth": len(self._queue),
+                "queued_by_priority": by_priority,
+                "avg_wait_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "p95_wait_ms": round(1000 * waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+                "service_time_ms": round(1000 * self._service_time, 1),
+                **self._counters
+            }
+
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(base_url: str, max_inflight: int = LLM_MAX_INFLIGHT) -> AdmissionController:
+    """
+    Process-wide admission controller for an Ollama server or pool (shared by sync and async clients)
+    
+    Args:
+        base_url: Server URL, or the comma-joined URLs of a backend pool
+        max_inflight: Concurrent calls allowed, used when the controller is created
+    
+    Returns:
+        AdmissionController
+    """
+    key = base_url.rstrip('/')
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = _controllers[key] = AdmissionController(max_inflight=max_inflight, name=key)
+        return controller
@@ -0,0 +1,258 @@
+"""
+Approximate nearest-neighbour (IVF) index for large embedding matrices
+"""
+
+import math
+import logging
+from pathlib import Path
+from typing import List, Tuple, Sequence
+from config import ANN_NLIST, ANN_NPROBE
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for semantic retrieval
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per block when assigning vectors to centroids (bounds temporary memory)
+_ASSIGN_BLOCK = 16384
+
+
+def recall_at_k(exact: Sequence[Sequence[int]], approx: Sequence[Sequence[int]]) -> float:
+    """
+    Fraction of exact top-k neighbours that the approximate search also found
+    
+    Args:
+        exact: Exact result ids per query
+        approx: Approximate result ids per query
+    
+    Returns:
+        Mean recall over all queries
+    """
+    if not exact:
+        return 0.0
+    total = 0.0
+    for truth, found in zip(exact, approx):
+        if truth:
+            total += len(set(truth) & set(found)) / len(truth)
+    return total / len(exact)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalised vectors
+    
+    Vectors are clustered with spherical k-means; a query only scores the
+    vectors in its nprobe closest clusters. The index stores centroids and
+    cluster membership, while the vectors stay in the caller's matrix, so it
+    adds almost no memory on top of the dense index.
+    
+    Recall/latency is tuned with nlist (more clusters = smaller lists) and
+    nprobe (more clusters probed = higher recall, slower queries).
+    """
+    
+    def __init__(self, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE, seed: int = 0):
+        """
+        Initialize an untrained index
+        
+        Args:
+            nlist: Number of clusters (0 picks about 4 * sqrt(n) at training time)
+            nprobe: Number of clusters searched per query
+            seed: Random seed for k-means initialisation
+        """
+        if np is None:
+            raise ImportError("numpy is required for the ANN index")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.lists: List["np.ndarray"] = []
+        self.ntotal = 0
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    def _assign(self, vectors: "np.ndarray") -> "np.ndarray":
+        """Nearest centroid (by inner product) for each row"""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _ASSIGN_BLOCK):
+            block = vectors[start:start + _ASSIGN_BLOCK]
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+    
+    def train(self, vectors: "np.ndarray", iterations: int = 20, max_training_points: int = 100000) -> None:
+        """
+        Learn cluster centroids with spherical k-means
+        
+        Args:
+            vectors: L2-normalised float32 matrix
+            iterations: k-means iterations
+            max_training_points: Sample size used for training
+        """
+        rng = np.random.default_rng(self.seed)
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(4 * math.sqrt(n)))
+        nlist = min(nlist, n)
+        
+        sample = vectors
+        if n > max_training_points:
+            sample = vectors[rng.choice(n, max_training_points, replace=False)]
+        sample = np.asarray(sample, dtype=np.float32)
+        
+        self.centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.centroids = (sums / norms).astype(np.float32)
+        
+        self.nlist = nlist
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.ntotal = 0
+        logger.info(f"Trained IVF index with {nlist} clusters on {len(sample)} vectors")
+    
+    def add(self, vectors: "np.ndarray", start_id: int = None) -> None:
+        """
+        Assign vectors to clusters
+        
+        Args:
+            vectors: L2-normalised rows to add
+            start_id: Row id of the first vector (defaults to the current size)
+        """
+        if not self.is_trained:
+            raise RuntimeError("IVF index must be trained before adding vectors")
+        start_id = self.ntotal if start_id is None else start_id
+        assignments = self._assign(np.asarray(vectors, dtype=np.float32))
+        self._insert(np.arange(start_id, start_id + len(assignments), dtype=np.int64), assignments)
+        self.ntotal = max(self.ntotal, start_id + len(assignments))
+    
+    def replace(self, ids: Sequence[int], vectors: "np.ndarray") -> None:
+        """
+        Move rows whose vectors changed to the clusters of their new vectors
+        
+        Args:
+            ids: Row ids already in the index
+            vectors: Their new L2-normalised vectors
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.lists = [members[~np.isin(members, ids)] for members in self.lists]
+        self._insert(ids, self._assign(np.asarray(vectors, dtype=np.float32)))
+    
+    def _insert(self, ids: "np.ndarray", assignments: "np.ndarray") -> None:
+        """Append row ids to the posting lists of their assigned clusters"""
+        order = np.argsort(assignments, kind='stable')
+        boundaries = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        for cluster in range(self.nlist):
+            members = ids[order[boundaries[cluster]:boundaries[cluster + 1]]]
+            if len(members):
+                self.lists[cluster] = np.concatenate([self.lists[cluster], members])
+    
+    def build(self, vectors: "np.ndarray") -> "IVFIndex":
+        """Train on and add all vectors"""
+        self.train(vectors)
+        self.add(vectors, start_id=0)
+        return self
+    
+    def probe(self, query: "np.ndarray", nprobe: int = None) -> "np.ndarray":
+        """
+        Row ids in the clusters closest to a query
+        
+        Args:
+            query: Normalised query vector
+            nprobe: Clusters to probe (defaults to self.nprobe)
+        
+        Returns:
+            Array of candidate row ids
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+    
+    def search(
+        self,
+        matrix: "np.ndarray",
+        query: "np.ndarray",
+        top_k: int = 3,
+        nprobe: int = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k by inner product
+        
+        Args:
+            matrix: The normalised vectors the index was built over
+            query: Normalised query vector
+            top_k: Number of results to return
+            nprobe: Clusters to probe (defaults to self.nprobe)
+        
+        Returns:
+            List of (row id, similarity) sorted by similarity
+        """
+        candidates = self.probe(query, nprobe)
+        if len(candidates) == 0:
+            return []
+        
+        scores = matrix[candidates] @ query
+        if top_k < len(scores):
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+    
+    def save(self, path: Path, fingerprint: str = "") -> None:
+        """
+        Write the index to an .npz file
+        
+        Args:
+            path: Destination file
+            fingerprint: Identifier of the corpus the index was built over
+        """
+        sizes = np.array([len(ids) for ids in self.lists], dtype=np.int64)
+        ids = np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                sizes=sizes,
+                ids=ids,
+                params=np.array([self.nlist, self.nprobe, self.ntotal, self.seed], dtype=np.int64),
+                fingerprint=np.array(fingerprint)
+            )
+        logger.info(f"Saved IVF index ({self.ntotal} vectors) to {path}")
+    
+    @classmethod
+    def load(cls, path: Path, fingerprint: str = None) -> "IVFIndex":
+        """
+        Read an index written by save()
+        
+        Args:
+            path: Source file
+            fingerprint: Expected corpus identifier; a mismatch raises ValueError
+        
+        Returns:
+            IVFIndex
+        """
+        with np.load(path) as data:
+            stored_fingerprint = str(data['fingerprint'])
+            if fingerprint is not None and stored_fingerprint != fingerprint:
+                raise ValueError("IVF index was built over a different corpus")
+            nlist, nprobe, ntotal, seed = (int(v) for v in data['params'])
+            index = cls(nlist=nlist, nprobe=nprobe, seed=seed)
+            index.centroids = data['centroids']
+            offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids = data['ids']
+            index.lists = [ids[offsets[i]:offsets[i + 1]] for i in range(nlist)]
+            index.ntotal = ntotal
+        return index
@@ -0,0 +1,636 @@
+"""
+Asyncio-native Ollama client
+
+Speaks HTTP/1.1 directly over asyncio streams, so a waiting request costs a
+coroutine instead of a blocked worker thread.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Union, Callable
+from config import (
+    OLLAMA_BASE_URLS, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_POOL_SIZE, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+    OLLAMA_COALESCE_REQUESTS, OLLAMA_EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WINDOW_MS, LLM_ADMISSION_ENABLED, LLM_MAX_INFLIGHT
+)
+from llm_client import PREFERRED_MODELS, ChatClientBase, StreamError, error_message
+from response_cache import ResponseCache, get_response_cache
+from singleflight import AsyncSingleFlight, AsyncSharedStream
+from micro_batcher import AsyncMicroBatcher
+from model_registry import ModelRegistry, get_model_registry, select_model
+from circuit_breaker import CircuitBreaker, CircuitOpenError, AdaptiveTimeout
+from admission import AdmissionController, get_admission_controller, PRIORITY_NORMAL
+from backend_pool import BackendPool, get_backend_pool
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaHTTPError(Exception):
+    """Non-2xx response from the Ollama server"""
+    
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"Ollama returned HTTP {status}: {body[:200]}")
+        self.status = status
+
+
+class _Endpoint:
+    """Address of one Ollama server and its idle keep-alive connections"""
+    
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.ssl = parts.scheme == 'https'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.host_header = parts.netloc
+        self.idle: List["_Connection"] = []
+
+
+class _Connection:
+    """One keep-alive HTTP/1.1 connection"""
+    
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, endpoint: _Endpoint):
+        self.reader = reader
+        self.writer = writer
+        self.endpoint = endpoint
+    
+    def close(self) -> None:
+        self.writer.close()
+
+
+class _Response:
+    """Response whose body is read incrementally from its connection"""
+    
+    def __init__(
+        self,
+        client: "AsyncOllamaClient",
+        conn: _Connection,
+        status: int,
+        headers: Dict[str, str],
+        read_timeout: float
+    ):
+        self.client = client
+        self.conn = conn
+        self.status = status
+        self.headers = headers
+        self.read_timeout = read_timeout
+        self._released = False
+    
+    async def _readline(self) -> bytes:
+        return await asyncio.wait_for(self.conn.reader.readline(), self.read_timeout)
+    
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield body bytes as they arrive (chunked, sized or read-to-EOF bodies)"""
+        reader = self.conn.reader
+        reusable = self.headers.get('connection', '').lower() != 'close'
+        try:
+            if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    size = int((await self._readline()).split(b';')[0].strip() or b'0', 16)
+                    if size == 0:
+                        # Trailer section ends with an empty line
+                        while (await self._readline()) not in (b'\r\n', b'\n', b''):
+                            pass
+                        break
+                    yield await asyncio.wait_for(reader.readexactly(size), self.read_timeout)
+                    await self._readline()
+            elif 'content-length' in self.headers:
+                remaining = int(self.headers['content-length'])
+                while remaining > 0:
+                    data = await asyncio.wait_for(reader.read(min(remaining, 65536)), self.read_timeout)
+                    if not data:
+                        raise asyncio.IncompleteReadError(b'', remaining)
+                    remaining -= len(data)
+                    yield data
+            else:
+                reusable = False
+                while True:
+                    data = await asyncio.wait_for(reader.read(65536), self.read_timeout)
+                    if not data:
+                        break
+                    yield data
+        except BaseException:
+            reusable = False
+            raise
+        finally:
+            self.release(reusable)
+    
+    async def read(self) -> bytes:
+        """Read the whole body"""
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+    
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        """Yield complete newline-terminated lines of the body"""
+        buffer = b''
+        async for chunk in self.iter_chunks():
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line
+        if buffer:
+            yield buffer
+    
+    async def json(self) -> Any:
+        return json.loads(await self.read() or b'null')
+    
+    def release(self, reusable: bool = False) -> None:
+        """Return the connection to the pool, or close it"""
+        if not self._released:
+            self._released = True
+            self.client._release(self.conn, reusable)
+
+
+class AsyncChatStream:
+    """
+    Async iterator over the token deltas of a streaming /api/chat response
+    
+    Mirrors llm_client.ChatStream: deltas are yielded as they arrive, stats
+    holds the final frame, and failures set error and yield the fallback
+    message when no text was produced. A cached reply is yielded as one
+    delta, and on_complete receives the full text of a completed stream.
+    
+    Consume it with async with, so that a reader that stops early (or is
+    cancelled) closes the connection and frees its server and admission
+    slot right away instead of when the generator is garbage collected::
+        
+        async with await client.stream_generate(prompt) as stream:
+            async for delta in stream:
+                ...
+    """
+    
+    def __init__(
+        self,
+        client: "AsyncOllamaClient",
+        payload: Optional[Dict[str, Any]],
+        priority: int = PRIORITY_NORMAL,
+        cached_text: str = None,
+        on_complete: Callable[[str], None] = None
+    ):
+        self.client = client
+        self.payload = payload
+        self.priority = priority
+        self.cached_text = cached_text
+        self.on_complete = on_complete
+        self.error: Optional[Exception] = None
+        self.stats: Dict[str, Any] = {}
+        self.text = ""
+        self._iterator = self._iterate()
+    
+    def __aiter__(self) -> "AsyncChatStream":
+        return self
+    
+    async def __anext__(self) -> str:
+        return await self._iterator.__anext__()
+    
+    async def __aenter__(self) -> "AsyncChatStream":
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+    
+    @property
+    def done(self) -> bool:
+        """Whether the final stats frame was received"""
+        return bool(self.stats.get('done'))
+    
+    async def _iterate(self) -> AsyncIterator[str]:
+        if self.cached_text is not None:
+            self.text = self.cached_text
+            self.stats = {"done": True, "cached": True}
+            yield self.text
+            return
+        
+        client = self.client
+        response = backend = None
+        release = await client._admit(self.priority)
+        try:
+            backend = client.backends.acquire()
+            start = time.monotonic()
+            response = await client._request(
+                "POST", "/api/chat", self.payload, read_timeout=client.stream_timeout.current(),
+                base_url=backend.base_url
+            )
+            client._record_success(backend, client.stream_timeout, start)
+            async for line in response.iter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get('error'):
+                    raise StreamError(data['error'])
+                delta = data.get('message', {}).get('content', '')
+                if delta:
+                    self.text += delta
+                    yield delta
+                if data.get('done'):
+                    self.stats = {k: v for k, v in data.items() if k != 'message'}
+        except asyncio.CancelledError:
+            if backend is not None and response is None:
+                client.backends.record_abandoned(backend)
+            raise
+        except Exception as e:
+            if response is None:
+                client._record_error(backend, e)
+            client._log_error(e)
+            self.error = e
+        finally:
+            client._finisher(backend, release)()
+        if self.done and self.text and self.on_complete is not None:
+            self.on_complete(self.text)
+        
+        if self.error is not None and not self.text:
+            self.text = error_message(self.error)
+            yield self.text
+    
+    async def aclose(self) -> None:
+        """Stop reading; the connection is closed rather than reused"""
+        await self._iterator.aclose()
+
+
+class AsyncOllamaClient(ChatClientBase):
+    """
+    Asyncio client for Ollama (chat, streaming chat, embeddings and tags)
+    
+    Keeps up to pool_size idle keep-alive connections per server. Unlike the
+    requests-based OllamaClient, concurrency is not limited by threads: any
+    number of coroutines can wait on the server at once. Chat calls are
+    balanced over base_urls like OllamaClient's.
+    """
+    
+    def __init__(
+        self,
+        base_url: str = None,
+        model: str = OLLAMA_MODEL,
+        pool_size: int = OLLAMA_POOL_SIZE,
+        response_cache: ResponseCache = None,
+        coalesce: bool = OLLAMA_COALESCE_REQUESTS,
+        embedding_model: str = OLLAMA_EMBEDDING_MODEL,
+        embed_batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        registry: ModelRegistry = None,
+        circuit_breaker: CircuitBreaker = None,
+        admission: AdmissionController = None,
+        base_urls: List[str] = None,
+        keep_alive: Union[str, int] = OLLAMA_KEEP_ALIVE
+    ):
+        """
+        Initialize async Ollama client
+        
+        Args:
+            base_url: Ollama server URL (defaults to OLLAMA_BASE_URLS)
+            model: Model name to use
+            pool_size: Maximum idle connections kept open to the server
+            response_cache: Cache for generated replies (defaults to the shared one)
+            coalesce: Share one upstream generation between concurrent identical requests
+            embedding_model: Model used for embeddings (empty = the chat model)
+            embed_batch_window_ms: Window in which concurrent get_embeddings calls are
+                merged into one /api/embed request (0 sends each call on its own)
+            registry: Cached /api/tags view (defaults to the one shared per server,
+                also used by OllamaClient)
+            circuit_breaker: Breaker guarding chat calls to the first server (defaults to the
+                one shared per server, also used by OllamaClient; none when CIRCUIT_BREAKER_ENABLED is off)
+            admission: Concurrency limit and priority queue for chat calls (defaults to the
+                one shared per server or pool, also used by OllamaClient; None when
+                LLM_ADMISSION_ENABLED is off)
+            base_urls: Several Ollama servers to balance chat calls over (instead of base_url)
+            keep_alive: How long Ollama keeps the model loaded after a chat call ("" = server default)
+        """
+        urls = [url.rstrip('/') for url in (base_urls or ([base_url] if base_url else OLLAMA_BASE_URLS))]
+        self.base_url = urls[0]
+        self.model = model
+        self.keep_alive = keep_alive
+        self.registry = registry or get_model_registry(self.base_url)
+        self.backends = BackendPool(urls, circuit_breaker) if circuit_breaker else get_backend_pool(urls)
+        self.admission = admission or (
+            get_admission_controller(",".join(urls), LLM_MAX_INFLIGHT * len(urls)) if LLM_ADMISSION_ENABLED else None
+        )
+        self.generate_timeout = AdaptiveTimeout()
+        self.stream_timeout = AdaptiveTimeout()
+        self.pool_size = pool_size
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        self.inflight = AsyncSingleFlight() if coalesce else None
+        self.embedding_model = embedding_model
+        self.embed_batcher = AsyncMicroBatcher(
+            self.embed_many, max_batch=EMBEDDING_BATCH_SIZE, window=embed_batch_window_ms / 1000
+        ) if embed_batch_window_ms > 0 else None
+        self._endpoints = {url: _Endpoint(url) for url in urls}
+        self._model_detected = False
+        self._model_lock: Optional[asyncio.Lock] = None
+    
+    async def _acquire(self, endpoint: _Endpoint) -> Tuple[_Connection, bool]:
+        """Get an idle connection or open a new one; returns (connection, reused)"""
+        while endpoint.idle:
+            conn = endpoint.idle.pop()
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                return conn, True
+            conn.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(endpoint.host, endpoint.port, ssl=endpoint.ssl or None),
+            OLLAMA_CONNECT_TIMEOUT
+        )
+        return _Connection(reader, writer, endpoint), False
+    
+    def _release(self, conn: _Connection, reusable: bool) -> None:
+        idle = conn.endpoint.idle
+        if reusable and len(idle) < self.pool_size and not conn.writer.is_closing():
+            idle.append(conn)
+        else:
+            conn.close()
+    
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        payload: Dict[str, Any] = None,
+        read_timeout: float = OLLAMA_READ_TIMEOUT,
+        base_url: str = None
+    ) -> _Response:
+        """
+        Send a request and read the status line and headers
+        
+        A request on a reused connection that the server has already closed
+        is retried once on a fresh connection. Requests go to the first server
+        unless base_url names another one of the client's servers.
+        
+        Raises:
+            OllamaHTTPError: For non-2xx responses
+        """
+        endpoint = self._endpoints[base_url or self.base_url]
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {endpoint.host_header}\r\n"
+            "Accept: application/json\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+        
+        for attempt in range(2):
+            conn, reused = await self._acquire(endpoint)
+            try:
+                conn.writer.write(head + body)
+                await conn.writer.drain()
+                status_line = await asyncio.wait_for(conn.reader.readline(), read_timeout)
+                if not status_line:
+                    raise ConnectionResetError("Connection closed by server")
+                status = int(status_line.split()[1])
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(conn.reader.readline(), read_timeout)
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            
+            response = _Response(self, conn, status, headers, read_timeout)
+            if not 200 <= status < 300:
+                raise OllamaHTTPError(status, (await response.read()).decode('utf-8', 'replace'))
+            return response
+    
+    async def aclose(self) -> None:
+        """Close idle connections"""
+        for endpoint in self._endpoints.values():
+            while endpoint.idle:
+                endpoint.idle.pop().close()
+    
+    async def _registry_read(self, read):
+        """Run a registry read, off the loop while the first probe is pending"""
+        if not self.registry.ready:
+            return await asyncio.to_thread(read)
+        return read()
+    
+    async def is_available(self) -> bool:
+        """Check if Ollama server is available (cached; see ModelRegistry)"""
+        return await self._registry_read(self.registry.is_available)
+    
+    async def _detect_model(self):
+        """Auto-detect and use best available model"""
+        model = select_model(await self._registry_read(self.registry.model_names), PREFERRED_MODELS)
+        if model:
+            self.model = model
+            logger.info(f"Auto-detected model: {self.model}")
+        else:
+            logger.warning(f"Could not auto-detect model, using: {self.model}")
+    
+    async def _ensure_model(self):
+        """Detect model on first use"""
+        if self._model_detected:
+            return
+        if self._model_lock is None:
+            self._model_lock = asyncio.Lock()
+        async with self._model_lock:
+            if not self._model_detected:
+                await self._detect_model()
+                self._model_detected = True
+    
+    async def get_embedding_model(self) -> str:
+        """Name of the model used for embeddings"""
+        if self.embedding_model:
+            return self.embedding_model
+        await self._ensure_model()
+        return self.model
+    
+    async def validate_model_available(self) -> bool:
+        """Check if specified model is available in Ollama (cached)"""
+        if await self._registry_read(lambda: self.registry.has_model(self.model)):
+            logger.info(f"Model '{self.model}' is available")
+            return True
+        logger.warning(f"Model '{self.model}' not found. Available: {self.registry.model_names()}")
+        return False
+    
+    @staticmethod
+    def _log_error(error: Exception) -> None:
+        if isinstance(error, CircuitOpenError):
+            logger.warning(f"Skipping Ollama call: {error}")
+        elif isinstance(error, asyncio.TimeoutError):
+            logger.error("Ollama request timed out")
+        elif isinstance(error, (ConnectionError, OSError, asyncio.IncompleteReadError)):
+            logger.error(f"Cannot connect to Ollama server: {error}")
+        else:
+            logger.error(f"Error calling Ollama: {error}")
+    
+    async def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        num_ctx: int = 2048,
+        cache_version: str = "",
+        priority: int = PRIORITY_NORMAL,
+        system: str = None
+    ) -> str:
+        """
+        Generate text using Ollama
+        
+        Args:
+            prompt: Input prompt
+            temperature: Sampling temperature (0-2, higher = more creative)
+            top_p: Nucleus sampling parameter
+            num_ctx: Context window size
+            cache_version: Tag added to the response cache key
+            priority: Admission priority (admission.PRIORITY_*) when the server is busy
+            system: Instructions sent as a system message before the prompt
+        
+        Returns:
+            Generated text response
+        
+        Raises:
+            AdmissionRejected: The server is saturated and the call was shed
+        """
+        await self._ensure_model()
+        payload = self._chat_payload(prompt, False, temperature, top_p, num_ctx, system)
+        cache_key = self._cache_key(payload, cache_version)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if self.inflight is None:
+            return await self._post_chat(payload, cache_key, priority)
+        return await self.inflight.do(
+            self._flight_key(payload), lambda: self._post_chat(payload, cache_key, priority)
+        )
+    
+    async def _post_chat(self, payload: Dict[str, Any], cache_key: Optional[str], priority: int) -> str:
+        """Send a non-streaming chat request and cache the reply"""
+        release = await self._admit(priority)
+        backend = None
+        try:
+            backend = self.backends.acquire()
+            start = time.monotonic()
+            response = await self._request(
+                "POST", "/api/chat", payload, read_timeout=self.generate_timeout.current(),
+                base_url=backend.base_url
+            )
+            result = await response.json() or {}
+            self._record_success(backend, self.generate_timeout, start)
+            text = result.get('message', {}).get('content', '').strip()
+            if cache_key is not None and text:
+                self.response_cache.put(cache_key, text)
+            return text
+        except asyncio.CancelledError:
+            if backend is not None:
+                self.backends.record_abandoned(backend)
+            raise
+        except Exception as e:
+            self._record_error(backend, e)
+            self._log_error(e)
+            return error_message(e)
+        finally:
+            self._finisher(backend, release)()
+    
+    async def _admit(self, priority: int) -> Callable[[], None]:
+        """Wait for an admission slot; returns the function releasing it"""
+        if self.admission is None:
+            return lambda: None
+        return await self.admission.acquire_async(priority)
+    
+    async def stream_generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        num_ctx: int = 2048,
+        cache_version: str = "",
+        priority: int = PRIORITY_NORMAL,
+        system: str = None
+    ) -> Union[AsyncChatStream, AsyncSharedStream]:
+        """
+        Generate text, yielding token deltas as Ollama produces them
+        
+        A cached reply is returned as a single delta. Concurrent identical
+        requests read one upstream stream.
+        
+        Args:
+            prompt: Input prompt
+            temperature: Sampling temperature (0-2, higher = more creative)
+            top_p: Nucleus sampling parameter
+            num_ctx: Context window size
+            cache_version: Tag added to the response cache key
+            priority: Admission priority (admission.PRIORITY_*) when the server is busy
+            system: Instructions sent as a system message before the prompt
+        
+        Returns:
+            AsyncChatStream (or AsyncSharedStream when coalescing) yielding text deltas,
+            to be read inside async with; AdmissionRejected is raised on the first read
+            when the call is shed
+        """
+        await self._ensure_model()
+        payload = self._chat_payload(prompt, True, temperature, top_p, num_ctx, system)
+        cache_key = self._cache_key(payload, cache_version)
+        on_complete = None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return AsyncChatStream(self, None, cached_text=cached)
+            on_complete = lambda text: self.response_cache.put(cache_key, text.strip())
+        
+        if self.inflight is None:
+            return AsyncChatStream(self, payload, priority, on_complete=on_complete)
+        return self.inflight.stream(
+            self._flight_key(payload), lambda: AsyncChatStream(self, payload, priority, on_complete=on_complete)
+        )
+    
+    async def get_embeddings(self, text: str) -> Optional[list]:
+        """
+        Get embeddings for text (for semantic search)
+        
+        Args:
+            text: Text to embed
+        
+        Returns:
+            Embedding vector or None if failed
+        """
+        if self.embed_batcher is not None:
+            return await self.embed_batcher.submit(text)
+        return (await self.embed_many([text]))[0]
+    
+    async def embed_many(self, texts: List[str]) -> List[Optional[list]]:
+        """
+        Embed several texts with batched /api/embed requests
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            One embedding (or None if it failed) per text, in order
+        """
+        model = await self.get_embedding_model()
+        vectors = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            vectors.extend(await self._embed_batch(model, texts[start:start + EMBEDDING_BATCH_SIZE]))
+        return vectors
+    
+    async def _embed_batch(self, model: str, texts: List[str]) -> List[Optional[list]]:
+        """Embed one batch, falling back to /api/embeddings on servers without /api/embed"""
+        try:
+            response = await self._request("POST", "/api/embed", {"model": model, "input": texts})
+            embeddings = (await response.json() or {}).get('embeddings') or []
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
+        except OllamaHTTPError as e:
+            if e.status == 404 and 'page not found' in str(e):
+                return [await self._embed_legacy(model, text) for text in texts]
+            logger.error(f"Error getting embeddings: {e}")
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {e}")
+        return [None] * len(texts)
+    
+    async def _embed_legacy(self, model: str, text: str) -> Optional[list]:
+        """Embed one text with the legacy /api/embeddings endpoint"""
+        try:
+            response = await self._request("POST", "/api/embeddings", {"model": model, "prompt": text})
+            return (await response.json() or {}).get('embedding')
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {e}")
+            return None
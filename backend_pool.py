@@ -0,0 +1,169 @@
+"""
+Routing of LLM calls across several Ollama servers
+"""
+
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from config import CIRCUIT_BREAKER_ENABLED
+from circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest latency in the moving average
+EWMA_ALPHA = 0.3
+
+
+class Backend:
+    """One Ollama server: load, latency and health as seen by this process"""
+    
+    def __init__(self, base_url: str, circuit: Optional[CircuitBreaker]):
+        self.base_url = base_url
+        self.chat_endpoint = f"{base_url}/api/chat"
+        self.circuit = circuit
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # EWMA of successful call latency (seconds)
+        self.requests = 0
+        self.failures = 0
+    
+    @property
+    def ejected(self) -> bool:
+        """Whether passive health checks have taken the server out of rotation"""
+        return self.circuit is not None and self.circuit.is_open
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.base_url,
+            "in_flight": self.in_flight,
+            "latency_ms": round(1000 * self.latency, 1) if self.latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected,
+            "circuit": self.circuit.stats() if self.circuit is not None else None
+        }
+
+
+class BackendPool:
+    """
+    Least-outstanding-requests routing over Ollama servers (thread-safe)
+    
+    Each call goes to the healthy server with the fewest calls in flight,
+    ties going to the lowest latency average. Health is passive: every
+    server has a circuit breaker fed by the outcome of real calls, so a
+    server that keeps failing is ejected while its circuit is open and
+    reinstated when a probe call after the recovery timeout succeeds.
+    """
+    
+    def __init__(self, base_urls: Sequence[str], circuit_breaker: CircuitBreaker = None):
+        """
+        Initialize the pool
+        
+        Args:
+            base_urls: Ollama server URLs (the first is the primary, used for tags and embeddings)
+            circuit_breaker: Breaker for the primary server (defaults to the one shared
+                per server; breakers are off when CIRCUIT_BREAKER_ENABLED is off)
+        """
+        if not base_urls:
+            raise ValueError("BackendPool needs at least one Ollama URL")
+        self.backends: List[Backend] = []
+        for i, url in enumerate(base_urls):
+            url = url.rstrip('/')
+            circuit = circuit_breaker if i == 0 and circuit_breaker is not None else (
+                get_circuit_breaker(url) if CIRCUIT_BREAKER_ENABLED else None
+            )
+            self.backends.append(Backend(url, circuit))
+        self._lock = threading.Lock()
+    
+    @property
+    def urls(self) -> List[str]:
+        return [backend.base_url for backend in self.backends]
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether every server is ejected (calls would be refused)"""
+        return all(backend.ejected for backend in self.backends)
+    
+    def acquire(self, exclude: Backend = None) -> Backend:
+        """
+        Pick a server for a call and count the call as in flight
+        
+        Every acquire must be followed by release, after record_success,
+        record_failure or record_abandoned.
+        
+        Args:
+            exclude: Server not to pick (e.g. the one a hedged call is already waiting on)
+        
+        Returns:
+            Backend to send the call to
+        
+        Raises:
+            CircuitOpenError: Every server is ejected
+        """
+        with self._lock:
+            ranked = sorted(
+                self.backends,
+                key=lambda b: (b.ejected, b.in_flight, b.latency or 0.0)
+            )
+            for backend in ranked:
+                if backend is exclude:
+                    continue
+                if backend.circuit is None or backend.circuit.allow():
+                    backend.in_flight += 1
+                    backend.requests += 1
+                    return backend
+        names = [backend.base_url for backend in self.backends if backend is not exclude]
+        raise CircuitOpenError(f"circuit open for {', '.join(names)}")
+    
+    def release(self, backend: Backend) -> None:
+        """Mark a call as finished"""
+        with self._lock:
+            backend.in_flight -= 1
+    
+    def record_success(self, backend: Backend, latency: float = None) -> None:
+        """
+        Report a call the server answered
+        
+        Args:
+            backend: Server that answered
+            latency: Seconds the call took, folded into the server's average (None
+                for answers that say nothing about speed, e.g. a 4xx)
+        """
+        with self._lock:
+            if latency is not None:
+                backend.latency = latency if backend.latency is None else (
+                    backend.latency + EWMA_ALPHA * (latency - backend.latency)
+                )
+        if backend.circuit is not None:
+            backend.circuit.record_success()
+    
+    def record_failure(self, backend: Backend) -> None:
+        """Report a call that failed because of the server"""
+        with self._lock:
+            backend.failures += 1
+        if backend.circuit is not None:
+            backend.circuit.record_failure()
+    
+    def record_abandoned(self, backend: Backend) -> None:
+        """Report a call given up before the server answered (e.g. the losing copy of a hedged call)"""
+        if backend.circuit is not None:
+            backend.circuit.cancel_probe()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Per-server load, latency and health"""
+        with self._lock:
+            backends = [backend.stats() for backend in self.backends]
+        return {"backends": backends, "healthy": sum(not b["ejected"] for b in backends)}
+
+
+_pools: Dict[Tuple[str, ...], BackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_backend_pool(base_urls: Sequence[str]) -> BackendPool:
+    """Process-wide pool for a set of Ollama servers (shared by sync and async clients)"""
+    key = tuple(url.rstrip('/') for url in base_urls)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = BackendPool(key)
+        return pool
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+ANN Recall Benchmark
+Compares IVF approximate search against exact search on synthetic embeddings
+
+Usage:
+    python benchmarks/bench_ann_recall.py [num_vectors] [dim]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from ann_index import IVFIndex, recall_at_k
+from vector_index import DenseIndex
+
+NUM_VECTORS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+DIM = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+NUM_QUERIES = 200
+TOP_K = 10
+
+
+def clustered_vectors(n, dim, clusters, rng):
+    """Embedding-like data: points scattered around random topic centres"""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centres[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def timed_search(search, queries):
+    """Run every query, returning (result ids, mean latency in ms)"""
+    start = time.perf_counter()
+    results = [[i for i, _ in search(q)] for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+print('=' * 70)
+print(f'ANN RECALL BENCHMARK ({NUM_VECTORS} vectors, dim {DIM}, recall@{TOP_K})')
+print('=' * 70)
+
+rng = np.random.default_rng(42)
+data = clustered_vectors(NUM_VECTORS + NUM_QUERIES, DIM, 500, rng)
+dense = DenseIndex()
+dense.add(data[:NUM_VECTORS])
+queries = dense._normalize(data[NUM_VECTORS:])
+
+exact, exact_ms = timed_search(lambda q: dense.search(q, TOP_K), queries)
+print(f'\nExact search:  {exact_ms:8.3f} ms/query')
+
+start = time.perf_counter()
+ivf = IVFIndex().build(dense.matrix)
+print(f'IVF training:  {time.perf_counter() - start:8.2f} s ({ivf.nlist} clusters)\n')
+
+print(f'{"nprobe":>8} {"recall":>8} {"ms/query":>10} {"speedup":>9}')
+for nprobe in (1, 2, 4, 8, 16, 32, 64):
+    approx, ms = timed_search(lambda q: ivf.search(dense.matrix, q, TOP_K, nprobe=nprobe), queries)
+    print(f'{nprobe:>8} {recall_at_k(exact, approx):>8.3f} {ms:>10.3f} {exact_ms / ms:>8.1f}x')
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Embedding Throughput Benchmark
+Compares one-text-per-request embedding (legacy /api/embeddings) against
+batched /api/embed for bulk ingest, and concurrent single-query embedding
+with and without the micro-batcher, against a local stand-in Ollama server
+that processes one request at a time with a fixed cost per request
+
+Usage:
+    python benchmarks/bench_embeddings.py [num_texts] [threads] [request_ms]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from llm_client import OllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+NUM_TEXTS = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+REQUEST_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+TEXTS = [f"How do I file a claim for item number {i}?" for i in range(NUM_TEXTS)]
+
+print('=' * 70)
+print(f'EMBEDDING BENCHMARK ({NUM_TEXTS} texts, {THREADS} threads, {REQUEST_MS:.0f} ms/request)')
+print('=' * 70)
+
+
+def timed(fn):
+    """Run fn, returning (texts/second, HTTP requests sent)"""
+    before = server.requests
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return NUM_TEXTS / elapsed, server.requests - before
+
+
+def concurrent(client):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(client.get_embeddings, TEXTS))
+
+
+with FakeOllamaServer(delay=REQUEST_MS / 1000, serial=True) as server:
+    single = OllamaClient(base_url=server.base_url, model="gemma:2b", embed_batch_window_ms=0)
+    batched = OllamaClient(base_url=server.base_url, model="gemma:2b", embed_batch_window_ms=5)
+    single.get_embedding_model()
+    batched.get_embedding_model()
+    
+    rows = [
+        ("bulk: legacy one per request", lambda: [single._embed_legacy("gemma:2b", t) for t in TEXTS]),
+        ("bulk: embed_many", lambda: batched.embed_many(TEXTS)),
+        ("queries: one per request", lambda: concurrent(single)),
+        ("queries: micro-batched", lambda: concurrent(batched)),
+    ]
+    print(f'\n{"mode":<32} {"texts/s":>12} {"requests":>10}')
+    for label, fn in rows:
+        rate, requests_sent = timed(fn)
+        print(f'{label:<32} {rate:>12.0f} {requests_sent:>10}')
+
+print('\n' + '=' * 70)
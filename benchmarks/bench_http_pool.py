@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+HTTP Connection Pool Benchmark
+Compares per-request overhead of bare requests.post (new connection per call)
+against the pooled keep-alive session used by OllamaClient, against a local
+stand-in Ollama server
+
+Usage:
+    python benchmarks/bench_http_pool.py [num_requests] [threads]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import requests
+
+from llm_client import get_session
+from tests.fake_ollama import FakeOllamaServer
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+PAYLOAD = {"model": "gemma:2b", "messages": [{"role": "user", "content": "hi"}], "stream": False}
+
+print('=' * 70)
+print(f'HTTP POOL BENCHMARK ({NUM_REQUESTS} requests, {THREADS} threads)')
+print('=' * 70)
+
+
+def run(server, post, threads):
+    """Send NUM_REQUESTS chat calls, returning (mean ms/request, connections opened)"""
+    before = server.connections
+    url = f"{server.base_url}/api/chat"
+    start = time.perf_counter()
+    if threads == 1:
+        for _ in range(NUM_REQUESTS):
+            post(url, json=PAYLOAD, timeout=(5, 30)).raise_for_status()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda _: post(url, json=PAYLOAD, timeout=(5, 30)).raise_for_status(), range(NUM_REQUESTS)))
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / NUM_REQUESTS, server.connections - before
+
+
+with FakeOllamaServer() as server:
+    session = get_session(server.base_url, pool_size=THREADS)
+    session.post(f"{server.base_url}/api/chat", json=PAYLOAD).raise_for_status()  # warm up
+    
+    print(f'\n{"client":<28} {"threads":>8} {"ms/request":>12} {"connections":>12}')
+    for threads in (1, THREADS):
+        for label, post in (("requests.post (no pool)", requests.post), ("pooled session", session.post)):
+            ms, connections = run(server, post, threads)
+            print(f'{label:<28} {threads:>8} {ms:>12.3f} {connections:>12}')
+
+print('\n' + '=' * 70)
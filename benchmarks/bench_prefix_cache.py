@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Prompt Prefix Cache Benchmark
+Measures prompt evaluation (prefill) per answer when the system message is a
+warm prefix Ollama can reuse, against a cold prefix: one that changes on every
+request, or a model unloaded after every request (keep_alive 0). Runs against a
+local stand-in Ollama server that simulates the prompt cache, or against a real
+Ollama server when its URL is given
+
+Usage:
+    python benchmarks/bench_prefix_cache.py [num_requests] [ollama_url]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SYSTEM_PROMPT, OLLAMA_KEEP_ALIVE, OLLAMA_MODEL
+from data_loader import KnowledgeBase
+from llm_client import OllamaClient
+from rag_engine import RAGEngine
+from tests.fake_ollama import FakeOllamaServer
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+OLLAMA_URL = sys.argv[2] if len(sys.argv) > 2 else None
+PREFILL_MS = 0.5  # per prompt token, stand-in server only
+QUESTIONS = [
+    "How do I file a claim for my broken phone?",
+    "What does my protection plan cover?",
+    "How long does a repair take?",
+    "Can I cancel my plan and get a refund?",
+    "Is accidental damage covered for laptops?",
+]
+
+print('=' * 70)
+print(f'PREFIX CACHE BENCHMARK ({NUM_REQUESTS} requests, {OLLAMA_URL or "stand-in server"})')
+print('=' * 70)
+
+
+def build_prompts(client):
+    """User messages for QUESTIONS, with context retrieved as RAGEngine does"""
+    rag = RAGEngine(kb=KnowledgeBase(retrieval_mode="keyword"), llm_client=client, retrieval_mode="keyword")
+    return [
+        rag._create_prompt(q, rag._build_context(rag.kb.search(q, top_k=3, mode="keyword"))) for q in QUESTIONS
+    ]
+
+
+def run(client, prompts, system_for):
+    """Send NUM_REQUESTS answers; returns mean (prompt tokens evaluated, prefill ms, load ms, request ms)"""
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for i in range(NUM_REQUESTS):
+        start = time.perf_counter()
+        with client.stream_generate(prompts[i % len(prompts)], temperature=0.3, system=system_for(i)) as stream:
+            for _ in stream:
+                pass
+        elapsed = time.perf_counter() - start
+        stats = stream.stats
+        totals[0] += stats.get("prompt_eval_count", 0)
+        totals[1] += stats.get("prompt_eval_duration", 0) / 1e6
+        totals[2] += stats.get("load_duration", 0) / 1e6
+        totals[3] += elapsed * 1000
+    return [total / NUM_REQUESTS for total in totals]
+
+
+def bench(base_url):
+    modes = [
+        ("warm: stable system message", OLLAMA_KEEP_ALIVE or "5m", lambda i: SYSTEM_PROMPT),
+        ("cold: prefix changes", OLLAMA_KEEP_ALIVE or "5m", lambda i: f"Request {i}.\n{SYSTEM_PROMPT}"),
+        ("cold: model unloaded", 0, lambda i: SYSTEM_PROMPT),
+    ]
+    prompts = None
+    print(f'\n{"mode":<30} {"prompt tok":>11} {"prefill ms":>11} {"load ms":>9} {"request ms":>11}')
+    for label, keep_alive, system_for in modes:
+        client = OllamaClient(base_url=base_url, model=OLLAMA_MODEL, coalesce=False, keep_alive=keep_alive)
+        client.response_cache = None
+        prompts = prompts or build_prompts(client)
+        "".join(client.stream_generate(prompts[-1], system=system_for(-1)))  # load the model
+        tokens, prefill_ms, load_ms, request_ms = run(client, prompts, system_for)
+        print(f'{label:<30} {tokens:>11.0f} {prefill_ms:>11.1f} {load_ms:>9.1f} {request_ms:>11.1f}')
+
+
+if OLLAMA_URL:
+    bench(OLLAMA_URL)
+else:
+    with FakeOllamaServer(prefill_delay=PREFILL_MS / 1000) as server:
+        bench(server.base_url)
+
+print('\n' + '=' * 70)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Quantized Embedding Benchmark
+Reports memory reduction and recall loss of int8 and PQ storage against float32
+
+Usage:
+    python benchmarks/bench_quantization.py [num_vectors] [dim]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from ann_index import recall_at_k
+from quantization import PQVectors
+from vector_index import DenseIndex
+
+NUM_VECTORS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+DIM = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+NUM_QUERIES = 100
+TOP_K = 10
+RERANK = 50
+
+print('=' * 70)
+print(f'QUANTIZATION BENCHMARK ({NUM_VECTORS} vectors, dim {DIM}, recall@{TOP_K})')
+print('=' * 70)
+
+# Embedding-like data: a low-rank topic structure plus a little noise
+rng = np.random.default_rng(42)
+latent = rng.standard_normal((NUM_VECTORS + NUM_QUERIES, 32)).astype(np.float32)
+data = latent @ rng.standard_normal((32, DIM)).astype(np.float32)
+data += 0.1 * np.abs(data).mean() * rng.standard_normal(data.shape).astype(np.float32)
+corpus, queries = data[:NUM_VECTORS], data[NUM_VECTORS:]
+
+exact_index = DenseIndex(quantization="none")
+exact_index.add(corpus)
+full_precision = exact_index.matrix
+
+
+def run(index):
+    """Search every query, returning (result ids, mean latency in ms)"""
+    start = time.perf_counter()
+    results = [[i for i, _ in index.search(q, TOP_K)] for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+exact, exact_ms = run(exact_index)
+baseline = exact_index.nbytes
+
+print(f'\n{"storage":<22} {"memory MB":>10} {"reduction":>10} {"recall":>8} {"ms/query":>10}')
+print(f'{"float32":<22} {baseline / 2**20:>10.1f} {"1.0x":>10} {1.0:>8.3f} {exact_ms:>10.3f}')
+
+configs = [("int8", None), ("pq", 16), ("pq", 48)]
+for method, subspaces in configs:
+    for rerank in (0, RERANK):
+        index = DenseIndex(
+            quantization=method,
+            rerank=rerank,
+            rerank_fn=lambda ids: full_precision[ids]
+        )
+        if subspaces:
+            index.quantized = PQVectors(DIM, m=subspaces)
+        index.add(corpus)
+        results, ms = run(index)
+        label = f'{method}{f" m={subspaces}" if subspaces else ""}{f" +rerank{rerank}" if rerank else ""}'
+        print(
+            f'{label:<22} {index.nbytes / 2**20:>10.1f} {baseline / index.nbytes:>9.1f}x '
+            f'{recall_at_k(exact, results):>8.3f} {ms:>10.3f}'
+        )
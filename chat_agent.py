@@ -2,13 +2,15 @@
 Main chat agent orchestrator
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Iterator
 from datetime import datetime
 from data_loader import KnowledgeBase
 from llm_client import OllamaClient
 from rag_engine import RAGEngine
 from escalation_handler import EscalationHandler
+from admission import AdmissionRejected, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 from config import LOG_LEVEL, LOG_FILE
 
 # Configure logging
@@ -24,21 +26,37 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Request priorities callers may ask for (lower than normal only)
+LOW_PRIORITY_NAMES = ("low", "bulk", "batch")
+
 
 class SquareTradeAgent:
     """Main SquareTrade chat agent"""
     
-    def __init__(self):
-        """Initialize the chat agent with all components"""
+    def __init__(
+        self,
+        kb: KnowledgeBase = None,
+        llm_client: OllamaClient = None,
+        escalation_handler: EscalationHandler = None
+    ):
+        """
+        Initialize the chat agent with all components
+        
+        Args:
+            kb: KnowledgeBase instance (created from config when omitted)
+            llm_client: OllamaClient instance (created from config when omitted)
+            escalation_handler: EscalationHandler instance (created from config when omitted)
+        """
         logger.info("Initializing SquareTrade Chat Agent...")
         
         # Initialize components
-        self.kb = KnowledgeBase()
-        self.llm = OllamaClient()
+        self.kb = kb or KnowledgeBase()
+        self.llm = llm_client or OllamaClient()
         self.rag = RAGEngine(kb=self.kb, llm_client=self.llm)
-        self.escalation = EscalationHandler()
+        self.escalation = escalation_handler or EscalationHandler()
         
-        # Verify LLM is available (non-blocking, with warnings only)
+        # Verify LLM is available (non-blocking, with warnings only); both checks
+        # share one cached /api/tags probe
         try:
             if not self.llm.is_available():
                 logger.warning("Ollama server may not be available (non-blocking)")
@@ -58,7 +76,8 @@ class SquareTradeAgent:
         self,
         user_message: str,
         user_id: str = "anonymous",
-        session_id: str = None
+        session_id: str = None,
+        priority: str = None
     ) -> Dict[str, Any]:
         """
         Process user message and generate response
@@ -67,99 +86,258 @@ class SquareTradeAgent:
             user_message: User's input message
             user_id: Unique user identifier
             session_id: Chat session ID for tracking
+            priority: "bulk" (or "batch"/"low") to queue behind interactive requests
             
         Returns:
             Response dict with message, metadata, and actions
+        
+        Raises:
+            AdmissionRejected: The LLM is saturated and the request was shed
         """
         if not user_message or not user_message.strip():
-            return {
-                "response": "Please enter a question to get started.",
-                "success": False,
-                "escalated": False
-            }
+            return self._empty_message_response()
         
         logger.info(f"Processing message from user {user_id}: {user_message[:50]}...")
         
         # Step 1: Check if escalation is needed upfront
-        if self.escalation.should_escalate(user_message):
-            logger.info("Query escalated due to user request")
-            ticket = self.escalation.create_escalation(
-                user_query=user_message,
-                reason="User requested human support",
-                user_id=user_id,
-                metadata={"session_id": session_id}
-            )
-            return {
-                "response": self.escalation.get_escalation_response(ticket['id']),
-                "success": True,
-                "escalated": True,
-                "escalation_id": ticket['id'],
-                "priority": ticket['priority'],
-                "metadata": {
-                    "intent": "intent_escalation",
-                    "intent_confidence": 1.0,
-                    "user_query": user_message,
-                    "retrieved_docs": [],
-                    "escalation_reason": "User requested human support"
-                }
-            }
+        escalation = self._check_upfront_escalation(user_message, user_id, session_id)
+        if escalation is not None:
+            return escalation
         
         # Step 2: Process query with RAG engine
         try:
-            answer, metadata = self.rag.process_query(user_message)
+            answer, metadata = self.rag.process_query(user_message, self._llm_priority(session_id, priority))
+            return self._build_response(answer, metadata, user_message, user_id, session_id)
+        
+        except AdmissionRejected:
+            raise
+        
+        except Exception as e:
+            return self._error_response(e, user_message, user_id, session_id)
+    
+    async def process_message_async(
+        self,
+        user_message: str,
+        user_id: str = "anonymous",
+        session_id: str = None,
+        priority: str = None
+    ) -> Dict[str, Any]:
+        """
+        Process user message on the event loop (see process_message)
+        
+        The LLM call is awaited with the asyncio client, so a waiting
+        conversation holds no thread. Escalation bookkeeping, which writes
+        to disk, runs in a worker thread.
+        
+        Args:
+            user_message: User's input message
+            user_id: Unique user identifier
+            session_id: Chat session ID for tracking
+            priority: "bulk" (or "batch"/"low") to queue behind interactive requests
+        
+        Returns:
+            Response dict with message, metadata, and actions
+        
+        Raises:
+            AdmissionRejected: The LLM is saturated and the request was shed
+        """
+        if not user_message or not user_message.strip():
+            return self._empty_message_response()
+        
+        logger.info(f"Processing message from user {user_id}: {user_message[:50]}...")
+        
+        escalation = await asyncio.to_thread(self._check_upfront_escalation, user_message, user_id, session_id)
+        if escalation is not None:
+            return escalation
+        
+        try:
+            answer, metadata = await self.rag.process_query_async(
+                user_message, self._llm_priority(session_id, priority)
+            )
+            return await asyncio.to_thread(self._build_response, answer, metadata, user_message, user_id, session_id)
+        
+        except AdmissionRejected:
+            raise
+        
+        except Exception as e:
+            return await asyncio.to_thread(self._error_response, e, user_message, user_id, session_id)
+    
+    def process_message_stream(
+        self,
+        user_message: str,
+        user_id: str = "anonymous",
+        session_id: str = None,
+        priority: str = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Process user message, streaming the answer as it is generated
+        
+        Yields (event, data) pairs: one "metadata" event with the retrieval
+        results, "token" events carrying answer text deltas, then a "done"
+        event holding the same response dict process_message returns.
+        
+        Args:
+            user_message: User's input message
+            user_id: Unique user identifier
+            session_id: Chat session ID for tracking
+            priority: "bulk" (or "batch"/"low") to queue behind interactive requests
+            
+        Yields:
+            Tuple of (event name, event data)
+        
+        Raises:
+            AdmissionRejected: The LLM is saturated and the request was shed
+        """
+        if not user_message or not user_message.strip():
+            yield "done", self._empty_message_response()
+            return
+        
+        logger.info(f"Streaming message from user {user_id}: {user_message[:50]}...")
+        
+        escalation = self._check_upfront_escalation(user_message, user_id, session_id)
+        if escalation is not None:
+            yield "metadata", self._stream_metadata(escalation["metadata"])
+            yield "token", {"delta": escalation["response"]}
+            yield "done", escalation
+            return
+        
+        try:
+            tokens, metadata = self.rag.process_query_stream(user_message, self._llm_priority(session_id, priority))
+            yield "metadata", self._stream_metadata(metadata)
             
-            # Step 3: Check if answer requires escalation
-            if metadata.get("escalated"):
-                logger.info(f"Answer escalated: {metadata.get('reason')}")
-                ticket = self.escalation.create_escalation(
-                    user_query=user_message,
-                    reason=metadata.get('reason', 'Unable to provide confident answer'),
-                    user_id=user_id,
-                    metadata={
-                        "session_id": session_id,
-                        "confidence": metadata.get('confidence'),
-                        "category": metadata.get('category')
-                    }
-                )
-                
-                return {
-                    "response": answer,
-                    "success": True,
-                    "escalated": True,
-                    "escalation_id": ticket['id'],
-                    "priority": ticket['priority'],
-                    "metadata": metadata
-                }
+            answer = ""
+            for delta in tokens:
+                answer += delta
+                yield "token", {"delta": delta}
             
-            # Step 4: Return confident answer
-            return {
-                "response": answer,
-                "success": True,
-                "escalated": False,
-                "confidence": metadata.get('confidence'),
-                "category": metadata.get('category'),
-                "sources": len(metadata.get('retrieved_docs', [])),
-                "metadata": metadata
-            }
+            yield "done", self._build_response(answer.strip(), metadata, user_message, user_id, session_id)
+        
+        except AdmissionRejected:
+            raise
         
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            
-            # Create escalation for errors
+            yield "done", self._error_response(e, user_message, user_id, session_id)
+    
+    def _llm_priority(self, session_id: str, requested: str = None) -> int:
+        """Admission priority: bulk requests last, follow-ups to a pending escalation first"""
+        if requested in LOW_PRIORITY_NAMES:
+            return PRIORITY_LOW
+        if session_id and self.escalation.has_pending_escalation(session_id):
+            return PRIORITY_HIGH
+        return PRIORITY_NORMAL
+    
+    @staticmethod
+    def _empty_message_response() -> Dict[str, Any]:
+        return {
+            "response": "Please enter a question to get started.",
+            "success": False,
+            "escalated": False
+        }
+    
+    @staticmethod
+    def _stream_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Retrieval summary sent before the streamed answer"""
+        return {
+            "intent": metadata.get("intent"),
+            "intent_confidence": metadata.get("intent_confidence"),
+            "category": metadata.get("category"),
+            "confidence": metadata.get("confidence"),
+            "routing": metadata.get("routing"),
+            "sources": [
+                {"id": doc.get("id"), "title": doc.get("title")}
+                for doc in metadata.get("retrieved_docs", [])
+            ]
+        }
+    
+    def _check_upfront_escalation(self, user_message: str, user_id: str, session_id: str) -> Dict[str, Any]:
+        """Escalate explicit requests for a human, returning the response dict or None"""
+        if not self.escalation.should_escalate(user_message):
+            return None
+        
+        logger.info("Query escalated due to user request")
+        ticket = self.escalation.create_escalation(
+            user_query=user_message,
+            reason="User requested human support",
+            user_id=user_id,
+            metadata={"session_id": session_id}
+        )
+        return {
+            "response": self.escalation.get_escalation_response(ticket['id']),
+            "success": True,
+            "escalated": True,
+            "escalation_id": ticket['id'],
+            "priority": ticket['priority'],
+            "metadata": {
+                "intent": "intent_escalation",
+                "intent_confidence": 1.0,
+                "user_query": user_message,
+                "retrieved_docs": [],
+                "escalation_reason": "User requested human support"
+            }
+        }
+    
+    def _build_response(
+        self,
+        answer: str,
+        metadata: Dict[str, Any],
+        user_message: str,
+        user_id: str,
+        session_id: str
+    ) -> Dict[str, Any]:
+        """Turn a RAG answer into the response dict, escalating when needed"""
+        # Step 3: Check if answer requires escalation
+        if metadata.get("escalated"):
+            logger.info(f"Answer escalated: {metadata.get('reason')}")
             ticket = self.escalation.create_escalation(
                 user_query=user_message,
-                reason=f"System error: {str(e)}",
+                reason=metadata.get('reason', 'Unable to provide confident answer'),
                 user_id=user_id,
-                metadata={"session_id": session_id}
+                metadata={
+                    "session_id": session_id,
+                    "confidence": metadata.get('confidence'),
+                    "category": metadata.get('category')
+                }
             )
             
             return {
-                "response": "I encountered an error processing your request. Our support team has been notified.",
-                "success": False,
+                "response": answer,
+                "success": True,
                 "escalated": True,
                 "escalation_id": ticket['id'],
-                "error": str(e)
+                "priority": ticket['priority'],
+                "metadata": metadata
             }
+        
+        # Step 4: Return confident answer
+        return {
+            "response": answer,
+            "success": True,
+            "escalated": False,
+            "confidence": metadata.get('confidence'),
+            "category": metadata.get('category'),
+            "sources": len(metadata.get('retrieved_docs', [])),
+            "metadata": metadata
+        }
+    
+    def _error_response(self, error: Exception, user_message: str, user_id: str, session_id: str) -> Dict[str, Any]:
+        """Escalate a processing error and build the error response"""
+        logger.error(f"Error processing message: {error}")
+        
+        # Create escalation for errors
+        ticket = self.escalation.create_escalation(
+            user_query=user_message,
+            reason=f"System error: {str(error)}",
+            user_id=user_id,
+            metadata={"session_id": session_id}
+        )
+        
+        return {
+            "response": "I encountered an error processing your request. Our support team has been notified.",
+            "success": False,
+            "escalated": True,
+            "escalation_id": ticket['id'],
+            "error": str(error)
+        }
     
     def get_faq(self, category: str = None) -> Dict[str, Any]:
         """
@@ -178,12 +356,36 @@ class SquareTradeAgent:
             "category": category
         }
     
+    def get_metrics(self) -> Dict[str, Any]:
+        """Operational counters for monitoring"""
+        cache = getattr(self.llm, 'response_cache', None)
+        semantic_cache = self.rag.semantic_cache
+        inflight = getattr(self.llm, 'inflight', None)
+        backends = getattr(self.llm, 'backends', None)
+        admission = getattr(self.llm, 'admission', None)
+        hedging = getattr(self.llm, 'hedging', None)
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "knowledge_base_version": self.kb.version,
+            "response_cache": cache.stats() if cache is not None else None,
+            "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+            "request_coalescing": inflight.stats() if inflight is not None else None,
+            "backends": backends.stats() if backends is not None else None,
+            "llm_timeouts": {
+                "generate": self.llm.generate_timeout.stats(),
+                "stream": self.llm.stream_timeout.stats()
+            } if hasattr(self.llm, 'generate_timeout') else None,
+            "admission": admission.stats() if admission is not None else None,
+            "hedging": hedging.stats() if hedging is not None else None
+        }
+    
     def get_agent_status(self) -> Dict[str, Any]:
         """Get agent system status"""
         return {
             "timestamp": datetime.utcnow().isoformat(),
             "llm_available": self.llm.is_available(),
             "llm_model": self.llm.model,
+            "llm_registry": self.llm.registry.status() if hasattr(self.llm, 'registry') else None,
             "knowledge_base_documents": len(self.kb.documents),
             "pending_escalations": len(self.escalation.get_pending_escalations())
         }
@@ -0,0 +1,84 @@
+"""
+Ingest-time chunking of knowledge base documents
+"""
+
+from typing import List, Dict, Any
+from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into overlapping windows of roughly chunk_size characters
+    
+    Chunk boundaries are moved back to the nearest space so words are not cut
+    in half. A chunk_size of 0 or less disables chunking.
+    
+    Args:
+        text: Text to split
+        chunk_size: Maximum characters per chunk
+        overlap: Characters shared between consecutive chunks
+    
+    Returns:
+        List of chunk strings (at least one, possibly empty)
+    """
+    text = (text or '').strip()
+    if chunk_size <= 0 or len(text) <= chunk_size:
+        return [text]
+    if not 0 <= overlap < chunk_size:
+        raise ValueError(f"Chunk overlap ({overlap}) must be between 0 and chunk size ({chunk_size})")
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            space = text.rfind(' ', start + overlap + 1, end)
+            if space != -1:
+                end = space
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        
+        # Step back by the overlap, snapping to the start of a word
+        next_start = end - overlap
+        space = text.rfind(' ', start + 1, next_start)
+        if overlap and space != -1:
+            next_start = space + 1
+        start = max(next_start, start + 1)
+    
+    return chunks
+
+
+def chunk_document(
+    doc: Dict[str, Any],
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP
+) -> List[Dict[str, Any]]:
+    """
+    Split a knowledge base document into retrievable chunks
+    
+    Each chunk keeps the parent's id, title, category and keywords, replaces
+    content with its slice of text, and adds parent_id, chunk_id and
+    chunk_index so results can be traced back to the source document.
+    
+    Args:
+        doc: Knowledge base document
+        chunk_size: Maximum characters per chunk
+        overlap: Characters shared between consecutive chunks
+    
+    Returns:
+        List of chunk dicts
+    """
+    doc_id = doc.get('id')
+    pieces = chunk_text(doc.get('content', ''), chunk_size, overlap)
+    return [
+        {
+            **doc,
+            'content': piece,
+            'parent_id': doc_id,
+            'chunk_id': f"{doc_id}#{i}",
+            'chunk_index': i,
+            'chunk_count': len(pieces)
+        }
+        for i, piece in enumerate(pieces)
+    ]
@@ -0,0 +1,202 @@
+"""
+Circuit breaker and latency-based adaptive timeouts for the Ollama backend
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIMEOUT, ADAPTIVE_TIMEOUT_PERCENTILE,
+    ADAPTIVE_TIMEOUT_MULTIPLIER, ADAPTIVE_TIMEOUT_MIN, ADAPTIVE_TIMEOUT_MIN_SAMPLES, OLLAMA_READ_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a backend whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker (thread-safe)
+    
+    While closed, calls pass and consecutive failures are counted; reaching
+    failure_threshold opens the circuit. While open, calls are refused
+    without touching the network. After recovery_timeout seconds one call
+    is let through (half-open): its success closes the circuit, its failure
+    opens it again.
+    
+    Every call that allow() lets through must be followed by record_success
+    or record_failure, or by cancel_probe when it is abandoned before the
+    backend answers (otherwise a half-open breaker would wait forever for
+    its probe).
+    """
+    
+    def __init__(
+        self,
+        name: str = "ollama",
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT
+    ):
+        """
+        Initialize a closed breaker
+        
+        Args:
+            name: Backend name used in log messages
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to stay open before probing again
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._counters = {"rejected": 0, "opened": 0, "successes": 0, "failures": 0}
+    
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit past its recovery timeout reads as half-open"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return HALF_OPEN
+            return self._state
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused"""
+        return self.state == OPEN
+    
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info(f"Circuit {self.name} half-open, sending a probe request")
+                return True
+            self._counters["rejected"] += 1
+            return False
+    
+    def record_success(self) -> None:
+        """Report a call that reached a healthy backend"""
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            if self._state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = CLOSED
+            self._probing = False
+    
+    def record_failure(self) -> None:
+        """Report a call that failed because of the backend"""
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._counters["opened"] += 1
+                logger.warning(
+                    f"Circuit {self.name} opened after {self._failures} consecutive failures; "
+                    f"retrying in {self.recovery_timeout:.0f}s"
+                )
+    
+    def cancel_probe(self) -> None:
+        """Report a call abandoned without an outcome, so a half-open breaker may probe again"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probing:
+                self._probing = False
+    
+    def stats(self) -> Dict[str, Any]:
+        """State and counters"""
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, **self._counters}
+
+
+class AdaptiveTimeout:
+    """
+    Read timeout derived from recently observed latencies
+    
+    Until min_samples latencies have been seen the ceiling is used. After
+    that the timeout is the configured percentile times multiplier, kept
+    between floor and ceiling, so a healthy backend that usually answers in
+    a few seconds is no longer given minutes before a call is abandoned.
+    """
+    
+    def __init__(
+        self,
+        percentile: float = ADAPTIVE_TIMEOUT_PERCENTILE,
+        multiplier: float = ADAPTIVE_TIMEOUT_MULTIPLIER,
+        floor: float = ADAPTIVE_TIMEOUT_MIN,
+        ceiling: float = OLLAMA_READ_TIMEOUT,
+        min_samples: int = ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+        window: int = 200
+    ):
+        """
+        Initialize the tracker
+        
+        Args:
+            percentile: Latency percentile (0-100) the timeout is based on
+            multiplier: Headroom applied to that percentile
+            floor: Minimum timeout in seconds
+            ceiling: Maximum timeout in seconds (also used before enough samples)
+            min_samples: Latencies needed before adapting
+            window: Number of recent latencies kept
+        """
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a successful call"""
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def current(self) -> float:
+        """Timeout to use for the next call, in seconds"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.ceiling
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.floor, min(self.ceiling, ordered[index] * self.multiplier))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current timeout and sample count"""
+        with self._lock:
+            samples = len(self._samples)
+        return {"timeout": round(self.current(), 3), "samples": samples}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(base_url: str) -> CircuitBreaker:
+    """Process-wide circuit breaker for an Ollama server (shared by sync and async clients)"""
+    key = base_url.rstrip('/')
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(name=key)
+        return breaker
@@ -10,13 +10,69 @@ PROJECT_ROOT = Path(__file__).parent
 
 # Ollama Configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Comma-separated Ollama servers sharing the generation load (defaults to OLLAMA_BASE_URL alone)
+OLLAMA_BASE_URLS = [url.strip() for url in os.getenv("OLLAMA_BASE_URLS", "").split(",") if url.strip()] or [OLLAMA_BASE_URL]
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "auto")  # Will auto-detect available model
 OLLAMA_TIMEOUT = 300  # seconds
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))  # Keep-alive connections per Ollama server
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))  # seconds to establish a connection
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", str(OLLAMA_TIMEOUT)))  # seconds between response bytes
+# How long Ollama keeps the model, and with it the cached prompt prefix, loaded after a call:
+# a duration such as "30m", seconds, or -1 to never unload ("" = the server's default of 5m)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit():
+    OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE)
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "")  # e.g. nomic-embed-text (empty = use the chat model)
+MODEL_REGISTRY_TTL = float(os.getenv("MODEL_REGISTRY_TTL", "30"))  # seconds a cached /api/tags answer stays fresh
+MODEL_REGISTRY_RETRY = 5  # seconds before re-probing a server that did not answer
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive backend failures that open the circuit
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))  # seconds open before a probe request
+ADAPTIVE_TIMEOUT_PERCENTILE = 99  # Read timeout follows this latency percentile...
+ADAPTIVE_TIMEOUT_MULTIPLIER = 2.0  # ...times this headroom...
+ADAPTIVE_TIMEOUT_MIN = 15.0  # ...but never below this many seconds (or above OLLAMA_READ_TIMEOUT)
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # Successful calls observed before adapting
+LLM_ADMISSION_ENABLED = os.getenv("LLM_ADMISSION_ENABLED", "true").lower() == "true"
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "4"))  # Concurrent generations sent to Ollama (match OLLAMA_NUM_PARALLEL)
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))  # Generations allowed to wait for a slot; beyond that requests get a 503
+LLM_QUEUE_TIMEOUT = 30.0  # seconds a generation may wait for a slot
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"  # Duplicate slow chat calls to a second server
+LLM_HEDGE_PERCENTILE = 95  # Hedge when the first token is later than this percentile of recent calls...
+LLM_HEDGE_MIN_DELAY = 0.5  # ...and at least this many seconds late...
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "5"))  # ...while hedges stay under this percentage of calls
+OLLAMA_COALESCE_REQUESTS = os.getenv("OLLAMA_COALESCE_REQUESTS", "true").lower() == "true"  # Share identical in-flight generations
 
 # RAG Configuration
 CHUNK_SIZE = 500  # Character size for knowledge base chunks
 CHUNK_OVERLAP = 50  # Overlap between chunks
 TOP_K_RESULTS = 3  # Number of relevant documents to retrieve
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # Estimated tokens of retrieved passages per prompt
+ANSWER_TOKEN_RESERVE = 512  # Tokens of num_ctx kept free for the answer
+# num_ctx values a request may use (the smallest that fits is chosen); keep the list short,
+# since Ollama reloads the model whenever num_ctx changes
+NUM_CTX_LADDER = [int(n) for n in os.getenv("NUM_CTX_LADDER", "1024,2048,4096").split(",")]
+NUM_CTX_DOWNSHIFT_AFTER = 20  # Consecutive requests fitting a smaller num_ctx before switching down to it
+
+# Retrieval Configuration
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "keyword")  # keyword, bm25f, semantic or hybrid
+BM25F_K1 = 1.2  # Term frequency saturation
+BM25F_FIELD_WEIGHTS = {"title": 2.0, "content": 1.0, "keywords": 3.0}
+BM25F_FIELD_B = {"title": 0.5, "content": 0.75, "keywords": 0.3}  # Length normalisation per field
+BM25F_MIN_RELATIVE_SCORE = 0.4  # Drop results scoring below this fraction of the best hit
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_SIZE = 64  # Texts per /api/embed request
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))  # Merge concurrent single embeddings (0 = off)
+HYBRID_LEXICAL_MODE = "bm25f"  # Lexical retriever used by hybrid mode (keyword or bm25f)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # rrf (reciprocal rank) or weighted (score)
+HYBRID_CANDIDATES = 20  # Candidate budget per retriever before fusion
+HYBRID_RRF_K = 60  # Rank offset for reciprocal-rank fusion
+HYBRID_WEIGHTS = {"lexical": 0.4, "semantic": 0.6}  # Weights for weighted score fusion
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none")  # none, int8 or pq
+PQ_SUBSPACES = 16  # Product quantization sub-vectors (bytes per vector); lowered to divide the dimension
+QUANTIZED_RERANK = 20  # Candidates re-scored with exact vectors when quantized (0 disables)
+ANN_MIN_VECTORS = 20000  # Use the approximate (IVF) index once this many chunks are embedded
+ANN_NLIST = 0  # IVF clusters (0 = about 4 * sqrt(number of vectors))
+ANN_NPROBE = 8  # IVF clusters searched per query (higher = better recall, slower)
 
 # Knowledge Base Categories
 KB_CATEGORIES = {
@@ -36,19 +92,49 @@ KB_CATEGORIES = {
 
 # Intent Thresholds
 CONFIDENCE_THRESHOLD = 0.5  # Minimum confidence for answering
+INTENT_ROUTING_THRESHOLD = 0.5  # Intent confidence needed to search only the intent's mapped documents
 ESCALATION_KEYWORDS = ["agent", "human", "support", "manager", "representative"]
+HIGH_PRIORITY_KEYWORDS = ["urgent", "broken", "defective", "not working", "immediate", "critical"]
+MEDIUM_PRIORITY_KEYWORDS = ["claim", "refund", "warranty"]
+
+# Instructions sent as the system message of every answer; keep it fixed so Ollama
+# can reuse the evaluated prefix (KV cache) instead of re-reading it on each request
+SYSTEM_PROMPT = """You are a helpful SquareTrade customer support assistant. Answer the user's question based ONLY on the knowledge base content provided with it.
+
+If the answer is not in the knowledge base, politely explain that you don't have that information.
+
+Do not provide information outside of SquareTrade plans, claims, and support topics."""
 
 # Response Templates
 RESPONSE_TEMPLATES = {
     "answer": "Based on our knowledge base: {answer}",
     "uncertain": "I'm not entirely certain about that. Let me escalate this to our support team.",
     "out_of_scope": "I can only help with questions about SquareTrade plans, claims, and coverage. Your question seems outside my scope.",
-    "escalation": "I'm connecting you with a human agent who can better assist you."
+    "escalation": "I'm connecting you with a human agent who can better assist you.",
+    "degraded": "Our assistant is temporarily unavailable, but this article from our help center may answer your question:\n\n{title}\n{content}"
 }
 
 # Database for escalations (can be replaced with real DB)
 ESCALATION_DB_PATH = PROJECT_ROOT / "data" / "escalations.json"
 KNOWLEDGE_BASE_PATH = PROJECT_ROOT / "data" / "knowledge_base.json"
+INTENT_KB_PATH = PROJECT_ROOT / "data" / "intent_knowledge_base.json"
+EMBEDDING_CACHE_DIR = PROJECT_ROOT / "data" / "embeddings"
+
+# Response Cache
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = 1000  # In-memory LRU entries
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024  # In-memory LRU size cap
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds (0 = no expiry)
+RESPONSE_CACHE_SQLITE_PATH = os.getenv("RESPONSE_CACHE_SQLITE_PATH", "")  # Shared tier across workers (empty = off)
+RESPONSE_CACHE_MAX_TEMPERATURE = 0.5  # Generations sampled hotter than this are not cached
+
+# Semantic Answer Cache (reuses answers to near-duplicate questions; needs numpy and embeddings)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # Minimum cosine similarity
+SEMANTIC_CACHE_MAX_ENTRIES = 2000
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # seconds (0 = no expiry)
+SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.0"))  # Fraction of hits logged for review
+SEMANTIC_CACHE_AUDIT_PATH = PROJECT_ROOT / "logs" / "semantic_cache_audit.jsonl"
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
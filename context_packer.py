@@ -0,0 +1,211 @@
+"""
+Token-budgeted packing of retrieved passages into the LLM prompt, and num_ctx selection
+"""
+
+import re
+import logging
+import threading
+from typing import List, Dict, Any, Sequence, Tuple, Callable
+from config import (
+    CONTEXT_TOKEN_BUDGET, NUM_CTX_LADDER, NUM_CTX_DOWNSHIFT_AFTER, ANSWER_TOKEN_RESERVE, CHUNK_OVERLAP
+)
+
+logger = logging.getLogger(__name__)
+
+# Word runs and single punctuation marks, the units BPE tokenizers mostly split on
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# Characters of a word that typically fit in one token
+CHARS_PER_WORD_TOKEN = 6
+
+# Headroom for estimation error and chat template tokens when choosing num_ctx
+ESTIMATE_MARGIN = 1.1
+
+# Passages are truncated to fit the budget only if this many tokens are left
+MIN_PASSAGE_TOKENS = 32
+
+# Shortest repeated text taken to be the overlap between consecutive chunks
+MIN_MERGE_OVERLAP = 10
+
+# Word-set overlap above which a passage repeats one already packed
+DUPLICATE_SIMILARITY = 0.8
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate token count of text
+    
+    Every punctuation mark counts as one token and every word as one token
+    per CHARS_PER_WORD_TOKEN characters. That is close enough to the Llama
+    and Gemma tokenizers on English text for budgeting, without loading
+    either; ESTIMATE_MARGIN covers the difference when sizing num_ctx.
+    """
+    return sum(1 + (len(piece) - 1) // CHARS_PER_WORD_TOKEN for piece in _PIECE.findall(text or ''))
+
+
+def choose_num_ctx(
+    prompt_tokens: int,
+    reserve: int = ANSWER_TOKEN_RESERVE,
+    ladder: Sequence[int] = NUM_CTX_LADDER
+) -> int:
+    """
+    Smallest context window on the ladder that holds the prompt and the answer
+    
+    Args:
+        prompt_tokens: Estimated tokens of every message sent
+        reserve: Tokens kept free for the answer
+        ladder: Allowed num_ctx values
+    
+    Returns:
+        num_ctx to request (the largest rung when nothing is big enough)
+    """
+    needed = int(prompt_tokens * ESTIMATE_MARGIN) + reserve
+    rungs = sorted(ladder)
+    return next((rung for rung in rungs if rung >= needed), rungs[-1])
+
+
+def _merge_overlap(left: str, right: str, max_overlap: int = 2 * CHUNK_OVERLAP) -> str:
+    """Join consecutive chunks, dropping the text the second repeats from the end of the first"""
+    for size in range(min(len(left), len(right), max_overlap), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]) and (size == len(right) or right[size] == ' '):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def _truncate(text: str, max_tokens: int, estimator: Callable[[str], int]) -> str:
+    """Cut text at a word boundary so that it (with the ellipsis) fits in max_tokens"""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimator(" ".join(words[:mid]) + " ...") <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + " ..."
+
+
+class ContextPacker:
+    """
+    Greedy packing of retrieved chunks into a token budget
+    
+    Chunks are taken in relevance order. A chunk that repeats text already
+    packed (the same passage reached through another document, or most of
+    its words) is skipped, and adjacent chunks of one document are joined
+    without their shared overlap. A chunk that does not fit is cut to the
+    remaining budget, or skipped when little is left so a smaller, less
+    relevant chunk may still fit. The packed passages are laid out by
+    source document in document order.
+    
+    num_ctx moves up the ladder as soon as a request needs it but only
+    back down after NUM_CTX_DOWNSHIFT_AFTER requests in a row fit a smaller
+    window: Ollama reloads the model (dropping its prompt cache) whenever
+    num_ctx changes, so alternating sizes would cost more than they save.
+    """
+    
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, estimator: Callable[[str], int] = estimate_tokens):
+        """
+        Initialize the packer
+        
+        Args:
+            budget: Tokens the context may use
+            estimator: Function estimating the tokens of a text
+        """
+        self.budget = budget
+        self.estimator = estimator
+        self._num_ctx = None
+        self._smaller = []  # num_ctx wanted by the current run of requests needing less
+        self._lock = threading.Lock()
+    
+    def pack(self, docs: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """
+        Build the prompt context from retrieved chunks
+        
+        Args:
+            docs: Retrieved chunks, most relevant first
+        
+        Returns:
+            Tuple of (context text, estimated tokens used)
+        """
+        sources: Dict[Any, Dict[str, Any]] = {}
+        packed_words: List[set] = []
+        used = 0
+        for doc in docs:
+            content = (doc.get('content') or '').strip()
+            words = set(content.lower().split())
+            if not content or self._is_duplicate(content, words, sources, packed_words):
+                continue
+            
+            key = doc.get('parent_id', doc.get('id'))
+            header = 0 if key in sources else self.estimator(f"Source 0: {doc.get('title', 'Unknown')}\n---\n")
+            cost = header + self.estimator(content)
+            remaining = self.budget - used
+            if cost > remaining:
+                if remaining - header < MIN_PASSAGE_TOKENS:
+                    continue
+                content = _truncate(content, remaining - header, self.estimator)
+                cost = header + self.estimator(content)
+            
+            source = sources.setdefault(key, {"title": doc.get('title', 'Unknown'), "chunks": []})
+            source["chunks"].append((doc.get('chunk_index', 0), content))
+            packed_words.append(words)
+            used += cost
+        
+        context_parts = []
+        for i, source in enumerate(sources.values(), 1):
+            context_parts.append(f"Source {i}: {source['title']}")
+            context_parts.append(self._join_chunks(source["chunks"]))
+            context_parts.append("---")
+        
+        packed = sum(len(source["chunks"]) for source in sources.values())
+        logger.debug(f"Packed {packed} of {len(docs)} chunks into {used}/{self.budget} context tokens")
+        return "\n".join(context_parts), used
+    
+    @staticmethod
+    def _is_duplicate(
+        content: str,
+        words: set,
+        sources: Dict[Any, Dict[str, Any]],
+        packed_words: List[set]
+    ) -> bool:
+        """Whether a passage is contained in, or mostly the same words as, one already packed"""
+        for source in sources.values():
+            if any(content in chunk for _, chunk in source["chunks"]):
+                return True
+        for other in packed_words:
+            if words and len(words & other) / len(words | other) >= DUPLICATE_SIMILARITY:
+                return True
+        return False
+    
+    @staticmethod
+    def _join_chunks(chunks: List[Tuple[int, str]]) -> str:
+        """Text of one document's chunks in document order (adjacent chunks merged)"""
+        chunks = sorted(chunks, key=lambda c: c[0])
+        text = chunks[0][1]
+        for (prev_index, _), (index, chunk) in zip(chunks, chunks[1:]):
+            text = _merge_overlap(text, chunk) if index == prev_index + 1 else f"{text} ... {chunk}"
+        return text
+    
+    def num_ctx(self, *messages: str) -> int:
+        """
+        num_ctx for a request made of these messages
+        
+        Args:
+            messages: Text of every message sent (system prompt, user prompt)
+        
+        Returns:
+            The smallest adequate window, or the current one while it is larger
+            but smaller requests have not yet been seen long enough
+        """
+        wanted = choose_num_ctx(sum(self.estimator(message) for message in messages))
+        with self._lock:
+            if self._num_ctx is None or wanted >= self._num_ctx:
+                self._num_ctx = wanted
+                self._smaller = []
+            else:
+                self._smaller.append(wanted)
+                if len(self._smaller) >= NUM_CTX_DOWNSHIFT_AFTER:
+                    logger.info(f"Lowering num_ctx from {self._num_ctx} to {max(self._smaller)}")
+                    self._num_ctx = max(self._smaller)
+                    self._smaller = []
+            return self._num_ctx
@@ -3,10 +3,24 @@ Knowledge base loader and manager for SquareTrade content
 """
 
 import json
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
-from config import KNOWLEDGE_BASE_PATH, KB_CATEGORIES
+from typing import List, Dict, Any, Callable, Optional, Union, Iterable, Set
+from config import (
+    KNOWLEDGE_BASE_PATH, INTENT_KB_PATH, KB_CATEGORIES, RETRIEVAL_MODE, CHUNK_SIZE, CHUNK_OVERLAP,
+    EMBEDDING_CACHE_ENABLED, ANN_MIN_VECTORS, ANN_NLIST, ANN_NPROBE, HYBRID_LEXICAL_MODE, HYBRID_FUSION,
+    HYBRID_CANDIDATES, HYBRID_RRF_K, HYBRID_WEIGHTS
+)
+from search_index import InvertedIndex
+from chunking import chunk_document
+from vector_index import DenseIndex, numpy_available
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,16 +28,64 @@ logger = logging.getLogger(__name__)
 class KnowledgeBase:
     """Manages SquareTrade knowledge base"""
     
-    def __init__(self, kb_path: Path = None):
+    # Runs the dense retriever alongside the lexical one in hybrid mode
+    _hybrid_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kb-hybrid")
+    # Recent query embeddings, shared by semantic search and the semantic answer cache
+    _QUERY_VECTOR_CACHE_SIZE = 256
+    # Seconds before chunks whose embedding failed are embedded again
+    _EMBED_RETRY_INTERVAL = 30.0
+    
+    def __init__(
+        self,
+        kb_path: Path = None,
+        retrieval_mode: str = None,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        embedder: Callable[[str], Optional[List[float]]] = None,
+        batch_embedder: Callable[[List[str]], List[Optional[List[float]]]] = None,
+        embedding_model: Union[str, Callable[[], str]] = None,
+        embedding_store: EmbeddingStore = None
+    ):
         """
         Initialize knowledge base
         
         Args:
-            kb_path: Path to knowledge base JSON file
+            kb_path: Path to knowledge base JSON file (when omitted and the default
+                file is missing, the documents bundled with the intent knowledge
+                base are used)
+            retrieval_mode: Default ranking mode for search ('keyword', 'bm25f' or 'semantic')
+            chunk_size: Characters per retrieval chunk (0 disables chunking)
+            chunk_overlap: Characters shared between consecutive chunks
+            embedder: Function returning an embedding for a text, used by semantic search
+            batch_embedder: Function embedding a list of texts in one call, used to
+                embed chunks in bulk (falls back to embedder per text)
+            embedding_model: Embedding model name, or a function returning it, used
+                to key the on-disk embedding cache
+            embedding_store: Embedding cache (created on demand when omitted)
         """
         self.kb_path = kb_path or KNOWLEDGE_BASE_PATH
+        self._use_intent_documents = kb_path is None
+        self.retrieval_mode = retrieval_mode or RETRIEVAL_MODE
+        self.chunk_size = chunk_size
+        self.chunk_overlap = self._valid_overlap(chunk_size, chunk_overlap)
         self.documents: List[Dict[str, Any]] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self._docs_by_id: Dict[str, Dict[str, Any]] = {}
+        self._chunks_by_doc_id: Dict[str, List[int]] = {}
+        self.embedder = embedder
+        self.batch_embedder = batch_embedder
+        self.embedding_model = embedding_model
+        self.embedding_store = embedding_store
+        self.dense_index: Optional[DenseIndex] = None
+        self._dense_lock = threading.Lock()
+        self._unembedded: Set[int] = set()  # chunk positions stored as zero rows
+        self._embed_retry_at = 0.0
+        self._query_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_lock = threading.Lock()
+        # Content fingerprint; changes whenever documents change (used to invalidate caches)
+        self.version = ""
         self._load_knowledge_base()
+        self.rebuild_index()
     
     def _load_knowledge_base(self):
         """Load knowledge base from JSON file"""
@@ -37,6 +99,8 @@ class KnowledgeBase:
                     else:
                         self.documents = data if isinstance(data, list) else []
                 logger.info(f"Loaded {len(self.documents)} documents from knowledge base")
+            elif self._use_intent_documents and self._load_intent_documents():
+                logger.info(f"Loaded {len(self.documents)} documents from {INTENT_KB_PATH.name}")
             else:
                 logger.warning(f"Knowledge base not found at {self.kb_path}")
                 self.documents = self._load_sample_knowledge_base()
@@ -44,6 +108,17 @@ class KnowledgeBase:
             logger.error(f"Error loading knowledge base: {e}")
             self.documents = self._load_sample_knowledge_base()
     
+    def _load_intent_documents(self) -> bool:
+        """Load the documents array bundled with the intent knowledge base"""
+        if not INTENT_KB_PATH.exists():
+            return False
+        with open(INTENT_KB_PATH, 'r', encoding='utf-8') as f:
+            documents = json.load(f).get('documents', [])
+        if not documents:
+            return False
+        self.documents = documents
+        return True
+    
     def _load_sample_knowledge_base(self) -> List[Dict[str, Any]]:
         """
         Load sample knowledge base (placeholder for actual SquareTrade content)
@@ -87,42 +162,342 @@ class KnowledgeBase:
             }
         ]
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        mode: str = None,
+        doc_ids: Iterable[str] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search knowledge base for relevant documents
         
+        Ranking runs over document chunks, so each result carries the chunk's
+        content along with parent_id and chunk_index.
+        
         Args:
             query: Search query from user
             top_k: Number of top results to return
+            mode: Ranking mode ('keyword', 'bm25f', 'semantic' or 'hybrid'),
+                defaults to retrieval_mode
+            doc_ids: Only rank chunks of these documents (None searches everything)
             
         Returns:
-            List of relevant documents with relevance scores
+            List of relevant chunks with relevance scores
         """
-        results = []
-        query_terms = query.lower().split()
+        mode = mode or self.retrieval_mode
+        restrict_to = self._chunk_positions(doc_ids) if doc_ids is not None else None
+        if restrict_to is not None and not restrict_to:
+            return []
+        if mode == "hybrid":
+            return self._hybrid_search(query, top_k, restrict_to)
         
-        for doc in self.documents:
-            # Simple keyword matching (in production, use semantic search)
-            content_lower = (doc.get('content', '') + ' ' + doc.get('title', '')).lower()
-            keywords = doc.get('keywords', [])
+        return [
+            {
+                **self.index.documents[chunk_idx],
+                'relevance_score': score
+            }
+            for chunk_idx, score in self._rank(query, top_k, mode, restrict_to)
+        ]
+    
+    def _chunk_positions(self, doc_ids: Iterable[str]) -> Set[int]:
+        """Chunk positions belonging to the given document ids"""
+        positions: Set[int] = set()
+        for doc_id in doc_ids:
+            positions.update(self._chunks_by_doc_id.get(doc_id, ()))
+        return positions
+    
+    def _rank(self, query: str, top_k: int, mode: str, restrict_to: Set[int] = None) -> List[tuple]:
+        """Rank chunks with a single retriever, returning (chunk position, score)"""
+        if mode == "semantic":
+            try:
+                hits = self._semantic_search(query, top_k, restrict_to)
+            except Exception as e:
+                logger.error(f"Semantic search failed: {e}")
+                hits = None
+            if hits is None:
+                logger.warning("Semantic search unavailable, using keyword search")
+                hits = self.index.keyword_search(query, top_k=top_k, restrict_to=restrict_to)
+            return hits
+        if mode == "bm25f":
+            return self.index.bm25f_search(query, top_k=top_k, restrict_to=restrict_to)
+        if mode != "keyword":
+            logger.warning(f"Unknown retrieval mode '{mode}', using keyword search")
+        return self.index.keyword_search(query, top_k=top_k, restrict_to=restrict_to)
+    
+    def _hybrid_search(self, query: str, top_k: int, restrict_to: Set[int] = None) -> List[Dict[str, Any]]:
+        """
+        Combine lexical and dense retrieval
+        
+        Both retrievers run concurrently, each capped at HYBRID_CANDIDATES, and
+        their rankings are merged with reciprocal-rank fusion or weighted score
+        fusion (HYBRID_FUSION). relevance_score stays on the 0-10 scale: the
+        weighted fused score, or for RRF the best score either retriever gave.
+        """
+        budget = max(top_k, HYBRID_CANDIDATES)
+        dense_future = self._hybrid_executor.submit(self._semantic_search, query, budget, restrict_to)
+        lexical_hits = self._rank(query, budget, HYBRID_LEXICAL_MODE, restrict_to)
+        try:
+            dense_hits = dense_future.result() or []
+        except Exception as e:
+            logger.error(f"Dense retrieval failed, using lexical results only: {e}")
+            dense_hits = []
+        
+        fused: Dict[int, float] = {}
+        best_score: Dict[int, float] = {}
+        for retriever, hits in (("lexical", lexical_hits), ("semantic", dense_hits)):
+            for rank, (chunk_idx, score) in enumerate(hits, 1):
+                if HYBRID_FUSION == "weighted":
+                    contribution = HYBRID_WEIGHTS.get(retriever, 0.5) * score
+                else:
+                    contribution = 1.0 / (HYBRID_RRF_K + rank)
+                fused[chunk_idx] = fused.get(chunk_idx, 0.0) + contribution
+                best_score[chunk_idx] = max(best_score.get(chunk_idx, 0.0), score)
+        
+        ranked = InvertedIndex.top_k(fused, top_k)
+        return [
+            {
+                **self.index.documents[chunk_idx],
+                'relevance_score': round(fusion_score, 4) if HYBRID_FUSION == "weighted" else best_score[chunk_idx],
+                'fusion_score': round(fusion_score, 6)
+            }
+            for chunk_idx, fusion_score in ranked
+        ]
+    
+    def _chunk_text_for_embedding(self, chunk: Dict[str, Any]) -> str:
+        """Text that represents a chunk in embedding space"""
+        return f"{chunk.get('title', '')}\n{chunk.get('content', '')}".strip()
+    
+    def _ensure_dense_index(self) -> Optional[DenseIndex]:
+        """
+        Embed any chunks that are not yet in the dense index
+        
+        Chunks are embedded once; later calls only embed newly added chunks.
+        Chunks whose embedding failed are kept as zero rows and embedded
+        again, at most every _EMBED_RETRY_INTERVAL seconds, until they succeed.
+        
+        Returns:
+            DenseIndex, or None if numpy or an embedder is not available
+        """
+        if self.embedder is None or not numpy_available():
+            return None
+        
+        with self._dense_lock:
+            start = len(self.dense_index) if self.dense_index is not None else 0
+            retry = sorted(self._unembedded) if time.monotonic() >= self._embed_retry_at else []
+            positions = retry + list(range(start, len(self.chunks)))
+            if not positions:
+                return self.dense_index
             
-            # Calculate relevance score
-            score = 0
-            for term in query_terms:
-                if term in content_lower:
-                    score += 2
-                if term in [k.lower() for k in keywords]:
-                    score += 3
+            vectors = self._embed_texts([self._chunk_text_for_embedding(self.chunks[i]) for i in positions])
+            if self.dense_index is None:
+                if all(v is None for v in vectors):
+                    logger.error("Could not embed any knowledge base chunks")
+                    return None
+                self.dense_index = DenseIndex(rerank_fn=self._exact_vectors)
+            repaired = [(i, v) for i, v in zip(retry, vectors) if v is not None]
+            self.dense_index.replace([i for i, _ in repaired], [v for _, v in repaired])
+            self.dense_index.add(vectors[len(retry):])
             
-            if score > 0:
-                results.append({
-                    **doc,
-                    'relevance_score': score
-                })
+            self._unembedded = (self._unembedded - set(retry)) | {i for i, v in zip(positions, vectors) if v is None}
+            if self._unembedded:
+                self._embed_retry_at = time.monotonic() + self._EMBED_RETRY_INTERVAL
+                logger.warning(
+                    f"{len(self._unembedded)} chunks could not be embedded; "
+                    f"retrying in {self._EMBED_RETRY_INTERVAL:.0f}s"
+                )
+            logger.info(f"Embedded {len(positions)} chunks ({len(self.dense_index)} total)")
+            
+            if self.dense_index.ann is None and len(self.dense_index) >= ANN_MIN_VECTORS:
+                self._attach_ann_index()
+            return self.dense_index
+    
+    def _exact_vectors(self, chunk_ids: List[int]) -> Optional[List[Optional[List[float]]]]:
+        """
+        Full-precision embeddings for chunk positions, read from the embedding cache
+        
+        Used to re-rank quantized search results; returns None when the cache
+        cannot supply every vector.
+        """
+        if self.embedding_store is None:
+            return None
+        vectors = self.embedding_store.get_many(
+            [self._chunk_text_for_embedding(self.chunks[i]) for i in chunk_ids]
+        )
+        if any(v is None for v in vectors):
+            return None
+        return vectors
+    
+    def _attach_ann_index(self) -> None:
+        """Load a saved IVF index matching the current chunks, or train and save one"""
+        store = self.embedding_store
+        # Everything the saved centroids and posting lists depend on: the embedded
+        # text of every chunk (not just its id, which survives an edit), the model
+        # and the index parameters
+        digest = hashlib.sha256(json.dumps([
+            store.model if store is not None else None, ANN_NLIST, ANN_NPROBE, self.dense_index.quantization
+        ]).encode('utf-8'))
+        for chunk in self.chunks:
+            digest.update(f"\n{chunk.get('chunk_id')}\n{self._chunk_text_for_embedding(chunk)}".encode('utf-8'))
+        fingerprint = digest.hexdigest()
+        ann_path = store.vectors_path.with_suffix('.ivf.npz') if store is not None else None
         
-        # Sort by relevance and return top_k
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return results[:top_k]
+        if ann_path is not None and ann_path.exists():
+            try:
+                self.dense_index.ann = IVFIndex.load(ann_path, fingerprint=fingerprint)
+                logger.info(f"Loaded IVF index from {ann_path}")
+                return
+            except Exception as e:
+                logger.warning(f"Could not reuse IVF index, rebuilding: {e}")
+        
+        ann = self.dense_index.build_ann()
+        if ann_path is not None:
+            try:
+                ann.save(ann_path, fingerprint=fingerprint)
+            except Exception as e:
+                logger.error(f"Error saving IVF index: {e}")
+    
+    def _get_embedding_store(self) -> Optional[EmbeddingStore]:
+        """Get the embedding cache, opening it for the embedding model on first use"""
+        if self.embedding_store is not None or not EMBEDDING_CACHE_ENABLED:
+            return self.embedding_store
+        
+        model = self.embedding_model() if callable(self.embedding_model) else self.embedding_model
+        if not model:
+            return None
+        try:
+            self.embedding_store = EmbeddingStore(model)
+        except Exception as e:
+            logger.error(f"Could not open embedding cache: {e}")
+        return self.embedding_store
+    
+    def _embed_texts(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Embed texts, reusing cached vectors and caching new ones
+        
+        Only texts whose content hash is not in the cache reach the embedder.
+        """
+        store = self._get_embedding_store()
+        vectors = store.get_many(texts) if store is not None else [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        
+        unbatched = missing
+        if missing and self.batch_embedder is not None:
+            batch = list(self.batch_embedder([texts[i] for i in missing]) or [])
+            if len(batch) != len(missing):
+                logger.warning(
+                    f"Batch embedder returned {len(batch)} vectors for {len(missing)} texts; "
+                    f"embedding the rest one at a time"
+                )
+            for i, vector in zip(missing, batch):
+                vectors[i] = vector
+            unbatched = missing[len(batch):]
+        for i in unbatched:
+            vectors[i] = self.embedder(texts[i])
+        
+        if store is not None and missing:
+            store.put_many([texts[i] for i in missing], [vectors[i] for i in missing])
+        logger.info(f"Embeddings: {len(texts) - len(missing)} cached, {len(missing)} computed")
+        return vectors
+    
+    def _semantic_search(self, query: str, top_k: int, restrict_to: Set[int] = None) -> Optional[List[tuple]]:
+        """
+        Rank chunks by cosine similarity to the query embedding
+        
+        Similarities are scaled to the 0-10 relevance range used by the
+        other ranking modes.
+        
+        Returns:
+            List of (chunk position, relevance score), or None if unavailable
+        """
+        dense_index = self._ensure_dense_index()
+        if dense_index is None:
+            return None
+        
+        query_vector = self.embed_query(query)
+        if query_vector is None:
+            return None
+        
+        return [
+            (chunk_idx, round(similarity * 10, 4))
+            for chunk_idx, similarity in dense_index.search(query_vector, top_k=top_k, restrict_to=restrict_to)
+        ]
+    
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """
+        Embedding of a query, memoized for recently seen queries
+        
+        Args:
+            query: Query text
+        
+        Returns:
+            Embedding, or None if no embedder is configured or it failed
+        """
+        if self.embedder is None:
+            return None
+        with self._query_lock:
+            if query in self._query_vectors:
+                self._query_vectors.move_to_end(query)
+                return self._query_vectors[query]
+        
+        vector = self.embedder(query)
+        if vector is None:
+            return None
+        with self._query_lock:
+            self._query_vectors[query] = vector
+            if len(self._query_vectors) > self._QUERY_VECTOR_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+        return vector
+    
+    def rebuild_index(self) -> None:
+        """Re-chunk the current documents and rebuild the search indexes"""
+        self.dense_index = None
+        self._unembedded = set()
+        self.chunks = []
+        self._docs_by_id = {}
+        self._chunks_by_doc_id = {}
+        for doc in self.documents:
+            self._register_chunks(doc, chunk_document(doc, self.chunk_size, self.chunk_overlap))
+        self.index = InvertedIndex(self.chunks)
+        self.version = self._next_version("", self.documents)
+        logger.info(
+            f"Indexed {len(self.documents)} documents as {len(self.chunks)} chunks "
+            f"({len(self.index.postings)} terms)"
+        )
+    
+    @staticmethod
+    def _valid_overlap(chunk_size: int, overlap: int) -> int:
+        """Chunk overlap, replaced (with a warning) when it is not between 0 and chunk_size"""
+        if chunk_size <= 0 or 0 <= overlap < chunk_size:
+            return overlap
+        clamped = min(max(overlap, 0), chunk_size // 2)
+        logger.warning(
+            f"Chunk overlap ({overlap}) must be between 0 and the chunk size ({chunk_size}); using {clamped}"
+        )
+        return clamped
+    
+    @staticmethod
+    def _next_version(version: str, docs: List[Dict[str, Any]]) -> str:
+        """Fold documents into a version fingerprint"""
+        digest = hashlib.sha256(version.encode('utf-8'))
+        digest.update(json.dumps(docs, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def _register_chunks(self, doc: Dict[str, Any], chunks: List[Dict[str, Any]]) -> None:
+        """Append a document's chunks and record them in the id lookups"""
+        self._docs_by_id[doc.get('id')] = doc
+        positions = self._chunks_by_doc_id.setdefault(doc.get('id'), [])
+        for chunk in chunks:
+            positions.append(len(self.chunks))
+            self.chunks.append(chunk)
+    
+    def get_by_id(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document by id"""
+        return self._docs_by_id.get(doc_id)
+    
+    def get_by_ids(self, doc_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Get documents by id, skipping unknown ids"""
+        return [self._docs_by_id[doc_id] for doc_id in doc_ids if doc_id in self._docs_by_id]
     
     def get_by_category(self, category: str) -> List[Dict[str, Any]]:
         """Get all documents in a specific category"""
@@ -133,6 +508,11 @@ class KnowledgeBase:
         if 'id' not in doc:
             doc['id'] = f"doc_{len(self.documents) + 1}"
         self.documents.append(doc)
+        chunks = chunk_document(doc, self.chunk_size, self.chunk_overlap)
+        self._register_chunks(doc, chunks)
+        for chunk in chunks:
+            self.index.add(chunk)
+        self.version = self._next_version(self.version, [doc])
         logger.info(f"Added document: {doc.get('id')}")
     
     def save_to_file(self) -> None:
@@ -0,0 +1,169 @@
+"""
+Persistent on-disk cache of text embeddings
+"""
+
+import re
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Tuple
+from config import EMBEDDING_CACHE_DIR
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for semantic retrieval
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Embedding cache keyed by (model name, SHA-256 of text)
+    
+    Vectors for one model live in a flat float32 file that is memory-mapped
+    read-only, with a small JSON sidecar mapping text hashes to row numbers.
+    Restarts and extra workers map the file instead of re-embedding.
+    """
+    
+    def __init__(self, model: str, cache_dir: Path = None):
+        """
+        Initialize the store for a model
+        
+        Args:
+            model: Embedding model name (part of the cache key)
+            cache_dir: Directory holding the vector and sidecar files
+        """
+        if np is None:
+            raise ImportError("numpy is required for the embedding store")
+        self.model = model
+        self.cache_dir = Path(cache_dir or EMBEDDING_CACHE_DIR)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model)
+        self.vectors_path = self.cache_dir / f"{safe_name}.f32"
+        self.index_path = self.cache_dir / f"{safe_name}.json"
+        self.lock_path = self.cache_dir / f"{safe_name}.lock"
+        self.dim: Optional[int] = None
+        # (text hash -> row, memory-mapped vectors), replaced as a whole so that
+        # lock-free readers never pair new rows with an older, shorter map
+        self._table: Tuple[dict, Any] = ({}, None)
+        self._lock = threading.Lock()
+        self._load()
+    
+    def __len__(self) -> int:
+        return len(self._table[0])
+    
+    @staticmethod
+    def text_key(text: str) -> str:
+        """Hash used to identify a text in the cache"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _load(self) -> None:
+        """Load the sidecar index and memory-map the vector file"""
+        try:
+            if not self.index_path.exists():
+                return
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+            if sidecar.get('model') != self.model:
+                logger.warning(f"Embedding cache {self.index_path} belongs to another model, ignoring")
+                return
+            rows = sidecar['rows']
+            vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode='r', shape=(len(rows), sidecar['dim'])
+            ) if rows else None
+            self.dim = sidecar['dim']
+            self._table = (rows, vectors)
+            logger.info(f"Loaded {len(rows)} cached embeddings for model {self.model}")
+        except Exception as e:
+            logger.error(f"Error loading embedding cache: {e}")
+            self.dim, self._table = None, ({}, None)
+    
+    @contextmanager
+    def _file_lock(self):
+        """Serialise writers across threads and, where supported, processes"""
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'w') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def get(self, text: str) -> Optional["np.ndarray"]:
+        """Get the cached embedding for a text, or None"""
+        rows, vectors = self._table
+        row = rows.get(self.text_key(text))
+        if row is None or vectors is None:
+            return None
+        return np.array(vectors[row])
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional["np.ndarray"]]:
+        """Get cached embeddings for several texts (None for misses)"""
+        return [self.get(text) for text in texts]
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Optional[Sequence[float]]]) -> int:
+        """
+        Append embeddings for texts that are not cached yet
+        
+        Args:
+            texts: Embedded texts
+            vectors: Their embeddings (None entries are skipped)
+        
+        Returns:
+            Number of new vectors written
+        """
+        with self._file_lock():
+            # Another worker may have appended since we last loaded
+            self._load()
+            
+            cached = self._table[0]
+            new_keys, new_vectors, seen = [], [], set()
+            for text, vector in zip(texts, vectors):
+                if vector is None:
+                    continue
+                key = self.text_key(text)
+                if key in cached or key in seen:
+                    continue
+                if self.dim is None:
+                    self.dim = len(vector)
+                if len(vector) != self.dim:
+                    logger.warning(f"Skipping embedding with dimension {len(vector)} (expected {self.dim})")
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_vectors.append(vector)
+            
+            if not new_keys:
+                return 0
+            
+            rows = dict(cached)
+            block = np.asarray(new_vectors, dtype=np.float32)
+            mode = 'r+b' if self.vectors_path.exists() else 'wb'
+            with open(self.vectors_path, mode) as f:
+                # Overwrite anything past the last indexed row (e.g. an interrupted write)
+                f.seek(len(rows) * self.dim * 4)
+                f.write(block.tobytes())
+                f.truncate()
+            for key in new_keys:
+                rows[key] = len(rows)
+            
+            tmp_path = self.index_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"model": self.model, "dim": self.dim, "rows": rows}, f)
+            os.replace(tmp_path, self.index_path)
+            
+            self._load()
+            logger.info(f"Cached {len(new_keys)} new embeddings for model {self.model}")
+            return len(new_keys)
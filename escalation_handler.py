@@ -6,8 +6,9 @@ import json
 import logging
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 from config import ESCALATION_DB_PATH, ESCALATION_KEYWORDS
+from keyword_matcher import KeywordMatcher, get_keyword_matcher
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +16,18 @@ logger = logging.getLogger(__name__)
 class EscalationHandler:
     """Manages escalations to human support agents"""
     
-    def __init__(self, db_path: Path = None):
+    def __init__(self, db_path: Path = None, matcher: KeywordMatcher = None):
         """
         Initialize escalation handler
         
         Args:
             db_path: Path to escalations database
+            matcher: Keyword matcher (defaults to the shared one)
         """
         self.db_path = db_path or ESCALATION_DB_PATH
+        self.matcher = matcher or get_keyword_matcher()
         self.escalations: List[Dict[str, Any]] = []
+        self._pending_sessions: Set[str] = set()  # chat sessions with a pending ticket
         self._load_escalations()
     
     def _load_escalations(self):
@@ -38,6 +42,16 @@ class EscalationHandler:
         except Exception as e:
             logger.error(f"Error loading escalations: {e}")
             self.escalations = []
+        self._pending_sessions = {
+            session_id for session_id in map(self._pending_session, self.escalations) if session_id
+        }
+    
+    @staticmethod
+    def _pending_session(ticket: Dict[str, Any]) -> Optional[str]:
+        """Session id of a pending ticket (None if resolved or not tied to a session)"""
+        if ticket.get('status') != 'pending':
+            return None
+        return (ticket.get('metadata') or {}).get('session_id')
     
     def should_escalate(self, user_query: str, confidence: float = 0.0, reason: str = None) -> bool:
         """
@@ -52,11 +66,12 @@ class EscalationHandler:
             True if should escalate, False otherwise
         """
         # Check for explicit escalation requests
-        query_lower = user_query.lower()
-        for keyword in ESCALATION_KEYWORDS:
-            if keyword in query_lower:
-                logger.info(f"Escalation keyword detected: {keyword}")
-                return True
+        matched = self.matcher.scan(user_query).get("escalation")
+        if matched:
+            # The matcher reports keywords normalised, which a configured one may not be
+            keyword = next((kw for kw in ESCALATION_KEYWORDS if kw.strip().lower() in matched), min(matched))
+            logger.info(f"Escalation keyword detected: {keyword}")
+            return True
         
         # Check confidence threshold
         if confidence < 0.5 and reason:
@@ -99,6 +114,9 @@ class EscalationHandler:
         }
         
         self.escalations.append(ticket)
+        session_id = self._pending_session(ticket)
+        if session_id:
+            self._pending_sessions.add(session_id)
         self._save_escalations()
         
         logger.info(f"Created escalation ticket: {escalation_id}")
@@ -114,16 +132,14 @@ class EscalationHandler:
         Returns:
             Priority level: 'low', 'medium', 'high'
         """
-        query_lower = query.lower()
+        matches = self.matcher.scan(query)
         
         # High priority keywords
-        high_priority_words = ["urgent", "broken", "defective", "not working", "immediate", "critical"]
-        if any(word in query_lower for word in high_priority_words):
+        if "priority:high" in matches:
             return "high"
         
         # Medium priority keywords
-        medium_priority_words = ["claim", "refund", "warranty"]
-        if any(word in query_lower for word in medium_priority_words):
+        if "priority:medium" in matches:
             return "medium"
         
         return "low"
@@ -156,6 +172,10 @@ class EscalationHandler:
         """Get all pending escalation tickets"""
         return [e for e in self.escalations if e.get('status') == 'pending']
     
+    def has_pending_escalation(self, session_id: str) -> bool:
+        """Whether a chat session has a pending escalation ticket"""
+        return session_id in self._pending_sessions
+    
     def resolve_escalation(self, escalation_id: str, resolution: str = None) -> bool:
         """
         Mark escalation as resolved
@@ -169,7 +189,10 @@ class EscalationHandler:
         """
         for ticket in self.escalations:
             if ticket['id'] == escalation_id:
+                session_id = self._pending_session(ticket)
                 ticket['status'] = 'resolved'
+                if session_id and session_id not in map(self._pending_session, self.escalations):
+                    self._pending_sessions.discard(session_id)
                 ticket['resolved_at'] = datetime.utcnow().isoformat()
                 if resolution:
                     ticket['resolution'] = resolution
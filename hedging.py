@@ -0,0 +1,105 @@
+"""
+Request hedging for LLM calls: when and how often to send a duplicate to a second backend
+"""
+
+import logging
+import threading
+from typing import Dict, Any
+from config import (
+    LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_BUDGET, ADAPTIVE_TIMEOUT_MIN_SAMPLES, OLLAMA_READ_TIMEOUT
+)
+from circuit_breaker import AdaptiveTimeout
+
+logger = logging.getLogger(__name__)
+
+# Unused hedge budget that may be saved up for a burst of slow calls
+MAX_SAVED_HEDGES = 10.0
+
+
+class HedgePolicy:
+    """
+    Hedge delay, hedge budget and statistics (thread-safe)
+    
+    A call is hedged when its first token has not arrived within the
+    configured percentile of recent time-to-first-token latencies (never
+    less than min_delay). Until min_samples latencies have been seen the
+    delay is OLLAMA_READ_TIMEOUT, so nothing is hedged.
+    
+    The budget is a token bucket: every call adds budget / 100 of a hedge
+    (at most MAX_SAVED_HEDGES are kept) and every hedge spends one, so
+    duplicates never exceed budget percent of calls.
+    """
+    
+    def __init__(
+        self,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        budget: float = LLM_HEDGE_BUDGET,
+        min_delay: float = LLM_HEDGE_MIN_DELAY,
+        min_samples: int = ADAPTIVE_TIMEOUT_MIN_SAMPLES
+    ):
+        """
+        Initialize the policy
+        
+        Args:
+            percentile: Time-to-first-token percentile (0-100) after which a call is hedged
+            budget: Hedges allowed, as a percentage of calls
+            min_delay: Minimum seconds to wait before hedging
+            min_samples: Latencies needed before hedging starts
+        """
+        self.budget = budget
+        self._first_token = AdaptiveTimeout(
+            percentile=percentile, multiplier=1.0, floor=min_delay, ceiling=OLLAMA_READ_TIMEOUT,
+            min_samples=min_samples
+        )
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0, "over_budget": 0}
+    
+    def delay(self) -> float:
+        """Seconds to wait for the first token before hedging"""
+        return self._first_token.current()
+    
+    def observe(self, seconds: float) -> None:
+        """Record the time to first token of a call's winning attempt"""
+        self._first_token.observe(seconds)
+    
+    def start(self) -> None:
+        """Count a call, earning its share of the hedge budget"""
+        with self._lock:
+            self._counters["calls"] += 1
+            self._tokens = min(MAX_SAVED_HEDGES, self._tokens + self.budget / 100)
+    
+    def try_hedge(self) -> bool:
+        """Spend one hedge from the budget; False when the budget is used up"""
+        with self._lock:
+            if self._tokens < 1.0:
+                self._counters["over_budget"] += 1
+                return False
+            self._tokens -= 1.0
+            self._counters["hedged"] += 1
+            return True
+    
+    def refund(self) -> None:
+        """Return a hedge spent by try_hedge that could not be sent (no other server available)"""
+        with self._lock:
+            self._tokens = min(MAX_SAVED_HEDGES, self._tokens + 1.0)
+            self._counters["hedged"] -= 1
+    
+    def record_winner(self, hedge: bool) -> None:
+        """Report which attempt of a hedged call answered first"""
+        with self._lock:
+            self._counters["hedge_wins" if hedge else "primary_wins"] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hedge rate, win counts, current delay and counters"""
+        delay = self.delay()
+        with self._lock:
+            calls = self._counters["calls"]
+            hedged = self._counters["hedged"]
+            return {
+                "delay_ms": round(1000 * delay, 1),
+                "budget_percent": self.budget,
+                "hedge_rate": round(hedged / calls, 4) if calls else 0.0,
+                "hedge_win_rate": round(self._counters["hedge_wins"] / hedged, 4) if hedged else 0.0,
+                **self._counters
+            }
@@ -0,0 +1,226 @@
+"""
+Single-pass multi-pattern keyword matching (Aho-Corasick)
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Tuple
+from config import (
+    KB_CATEGORIES, ESCALATION_KEYWORDS, HIGH_PRIORITY_KEYWORDS, MEDIUM_PRIORITY_KEYWORDS, INTENT_KB_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+# Recent scan results kept so several components checking the same message share one pass
+_SCAN_CACHE_SIZE = 256
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum()
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over named keyword groups
+    
+    Keywords are added under a group name (e.g. "category:claims") and
+    compiled into one automaton, so a message is scanned once no matter how
+    many groups or keywords exist. Matches must start and end on word
+    boundaries ("what" does not match "whatever"); a trailing plural "s" is
+    allowed so "claim" still matches "claims".
+    """
+    
+    def __init__(self, groups: Mapping[str, Iterable[str]] = None):
+        """
+        Initialize the matcher
+        
+        Args:
+            groups: Mapping of group name to keywords (compiled immediately)
+        """
+        self._pending: Dict[str, List[str]] = {}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._keywords: List[str] = []
+        self._keyword_groups: List[Tuple[str, ...]] = []
+        self._cache: "OrderedDict[str, Mapping[str, FrozenSet[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if groups:
+            for name, keywords in groups.items():
+                self.add_group(name, keywords)
+            self.build()
+    
+    def add_group(self, name: str, keywords: Iterable[str]) -> None:
+        """Add keywords under a group name (call build() afterwards)"""
+        self._pending.setdefault(name, []).extend(
+            kw.strip().lower() for kw in keywords if kw and kw.strip()
+        )
+    
+    def build(self) -> "KeywordMatcher":
+        """Compile all added groups into the automaton"""
+        groups_by_keyword: Dict[str, List[str]] = {}
+        for name, keywords in self._pending.items():
+            for keyword in keywords:
+                names = groups_by_keyword.setdefault(keyword, [])
+                if name not in names:
+                    names.append(name)
+        
+        goto: List[Dict[str, int]] = [{}]
+        output: List[List[int]] = [[]]
+        self._keywords = list(groups_by_keyword)
+        self._keyword_groups = [tuple(groups_by_keyword[kw]) for kw in self._keywords]
+        for keyword_id, keyword in enumerate(self._keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append([])
+                state = next_state
+            output[state].append(keyword_id)
+        
+        # Breadth-first pass to compute failure links and merge outputs
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] = output[next_state] + output[fail[next_state]]
+        
+        with self._lock:
+            self._goto, self._fail, self._output = goto, fail, output
+            self._cache.clear()
+        logger.info(f"Compiled keyword matcher: {len(self._keywords)} keywords in {len(self._pending)} groups")
+        return self
+    
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find every word-bounded keyword occurrence in one pass
+        
+        Args:
+            text: Text to scan (matched case-insensitively)
+        
+        Returns:
+            List of (start, end, keyword) in order of end position
+        """
+        return [(start, end, self._keywords[keyword_id]) for start, end, keyword_id in self._matches(text)]
+    
+    def _matches(self, text: str) -> List[Tuple[int, int, int]]:
+        """Run the automaton, returning (start, end, keyword id) for bounded matches"""
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword_id in output[state]:
+                start, end = i + 1 - len(self._keywords[keyword_id]), i + 1
+                if self._bounded(text, start, end):
+                    matches.append((start, end, keyword_id))
+        return matches
+    
+    @staticmethod
+    def _bounded(text: str, start: int, end: int) -> bool:
+        """Whether text[start:end] sits on word boundaries (allowing a plural 's')"""
+        if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+            return False
+        # Plural allowance only for words of 3+ letters, so "hi" does not match "his"
+        if end < len(text) and text[end] == 's' and end - start >= 3:
+            end += 1
+        return end >= len(text) or not (_is_word_char(text[end]) and _is_word_char(text[end - 1]))
+    
+    def scan(self, text: str) -> Mapping[str, FrozenSet[str]]:
+        """
+        Matched keywords per group
+        
+        Results for recently scanned texts are cached, so the components
+        that each inspect the same message reuse a single pass.
+        
+        Args:
+            text: Text to scan
+        
+        Returns:
+            Read-only mapping of group name to the set of matched keywords
+            (groups without matches are omitted)
+        """
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+        
+        found: Dict[str, set] = {}
+        for _, _, keyword_id in self._matches(text):
+            for name in self._keyword_groups[keyword_id]:
+                found.setdefault(name, set()).add(self._keywords[keyword_id])
+        result = MappingProxyType({name: frozenset(kws) for name, kws in found.items()})
+        
+        with self._lock:
+            self._cache[text] = result
+            if len(self._cache) > _SCAN_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+
+_shared_matcher = None
+_shared_lock = threading.Lock()
+
+
+def _load_intent_keywords() -> Dict[str, List[str]]:
+    """Keywords per intent from the intent knowledge base"""
+    try:
+        if INTENT_KB_PATH.exists():
+            with open(INTENT_KB_PATH, 'r', encoding='utf-8') as f:
+                intents = json.load(f).get('intents', {})
+            return {name: info.get('keywords', []) for name, info in intents.items()}
+    except Exception as e:
+        logger.warning(f"Could not load intent keywords: {e}")
+    return {}
+
+
+def build_keyword_matcher(intent_keywords: Mapping[str, Iterable[str]] = None) -> KeywordMatcher:
+    """
+    Build a matcher over every rule keyword set
+    
+    Groups are named "category:<name>", "intent:<name>", "escalation" and
+    "priority:high" / "priority:medium".
+    
+    Args:
+        intent_keywords: Keywords per intent (loaded from INTENT_KB_PATH if omitted)
+    
+    Returns:
+        Compiled KeywordMatcher
+    """
+    if intent_keywords is None:
+        intent_keywords = _load_intent_keywords()
+    matcher = KeywordMatcher()
+    for category, info in KB_CATEGORIES.items():
+        matcher.add_group(f"category:{category}", info["keywords"])
+    for intent, keywords in intent_keywords.items():
+        matcher.add_group(f"intent:{intent}", keywords)
+    matcher.add_group("escalation", ESCALATION_KEYWORDS)
+    matcher.add_group("priority:high", HIGH_PRIORITY_KEYWORDS)
+    matcher.add_group("priority:medium", MEDIUM_PRIORITY_KEYWORDS)
+    return matcher.build()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """Process-wide matcher shared by the RAG engine and escalation handler"""
+    global _shared_matcher
+    if _shared_matcher is None:
+        with _shared_lock:
+            if _shared_matcher is None:
+                _shared_matcher = build_keyword_matcher()
+    return _shared_matcher
@@ -2,61 +2,479 @@
 Ollama LLM client for interacting with local language model
 """
 
+import time
+import queue
+import asyncio
 import logging
+import itertools
+import threading
 import requests
 import json
-from typing import Optional, Dict, Any
-from config import OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_TIMEOUT
+from typing import Optional, Dict, Any, Iterator, Callable, Union, List
+from requests.adapters import HTTPAdapter
+from config import (
+    OLLAMA_BASE_URLS, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_POOL_SIZE, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+    OLLAMA_COALESCE_REQUESTS, OLLAMA_EMBEDDING_MODEL, RESPONSE_CACHE_MAX_TEMPERATURE, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WINDOW_MS, LLM_ADMISSION_ENABLED, LLM_MAX_INFLIGHT, LLM_HEDGING_ENABLED
+)
+from response_cache import ResponseCache, get_response_cache, make_cache_key
+from singleflight import SingleFlight, SharedStream
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry, get_model_registry, select_model
+from circuit_breaker import CircuitBreaker, CircuitOpenError, AdaptiveTimeout
+from admission import AdmissionController, get_admission_controller, PRIORITY_NORMAL
+from backend_pool import Backend, BackendPool, get_backend_pool
+from hedging import HedgePolicy
 
 logger = logging.getLogger(__name__)
 
+# Auto-detection order when OLLAMA_MODEL is "auto" (first substring match wins)
+PREFERRED_MODELS = ['gemma:2b', 'gemma', 'mistral', 'llama2', 'neural-chat']
 
-class OllamaClient:
-    """Client for communicating with Ollama LLM"""
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str, pool_size: int = OLLAMA_POOL_SIZE) -> requests.Session:
+    """
+    Shared keep-alive session for an Ollama server
+    
+    All clients talking to the same server reuse one connection pool, so
+    requests skip the TCP handshake once a connection is warm. The pool is
+    thread-safe; when more than pool_size requests run at once the extra
+    connections are closed after use instead of being kept.
+    
+    Args:
+        base_url: Ollama server URL
+        pool_size: Maximum idle connections kept open to the server
+    
+    Returns:
+        requests.Session
+    """
+    key = base_url.rstrip('/')
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+TIMEOUT_MESSAGE = "I'm experiencing delays. Please try again."
+UNAVAILABLE_MESSAGE = "Service temporarily unavailable. Please try again."
+FAILURE_MESSAGE = "An error occurred while processing your request."
+
+
+def error_message(error: Exception) -> str:
+    """User-facing fallback text for a failed Ollama call (sync or async client)"""
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+        return TIMEOUT_MESSAGE
+    if isinstance(error, (requests.exceptions.ConnectionError, ConnectionError, asyncio.IncompleteReadError)):
+        return UNAVAILABLE_MESSAGE
+    return FAILURE_MESSAGE
+
+
+class StreamError(RuntimeError):
+    """Error frame sent by Ollama in a streamed reply (a failure of the server, like a 5xx)"""
+    
+    status = 500
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """Whether an error means the Ollama server is down or overloaded (sync or async client)"""
+    status = getattr(error, 'status', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, (
+        requests.exceptions.Timeout, requests.exceptions.ConnectionError, asyncio.TimeoutError,
+        ConnectionError, asyncio.IncompleteReadError
+    ))
+
+
+def is_error_message(text: str) -> bool:
+    """Whether a generated reply is one of the error fallback messages"""
+    return text in (TIMEOUT_MESSAGE, UNAVAILABLE_MESSAGE, FAILURE_MESSAGE)
+
+
+class ChatStream:
+    """
+    Iterator over the token deltas of a streaming /api/chat response
+    
+    Deltas (message.content of each NDJSON frame) are yielded as soon as
+    they arrive. Once the stream is exhausted, stats holds the final frame
+    (eval_count, durations, ...) and text the full reply. If the request or
+    the stream fails, the fallback message is yielded instead and error is
+    set, so callers can always render what they receive.
+    """
+    
+    def __init__(
+        self,
+        response: requests.Response = None,
+        error: Exception = None,
+        cached_text: str = None,
+        on_complete: Callable[[str], None] = None,
+        on_close: Callable[[], None] = None,
+        lines: Iterator[bytes] = None
+    ):
+        """
+        Initialize the stream
+        
+        Args:
+            response: Streaming HTTP response
+            error: Error raised before the stream started
+            cached_text: Complete reply from the response cache (yielded as one delta)
+            on_complete: Called with the full text after a successful stream
+            on_close: Called once when the stream is closed (releases its admission slot)
+            lines: NDJSON lines of response to read instead of response.iter_lines() (for a
+                response whose first lines were already read)
+        """
+        self.response = response
+        self.lines = lines
+        self.error = error
+        self.cached_text = cached_text
+        self.on_complete = on_complete
+        self.on_close = on_close
+        self.stats: Dict[str, Any] = {}
+        self.text = ""
+        self._iterator = self._iterate()
+    
+    def __iter__(self) -> Iterator[str]:
+        return self
+    
+    def __next__(self) -> str:
+        return next(self._iterator)
+    
+    def __enter__(self) -> "ChatStream":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    @property
+    def done(self) -> bool:
+        """Whether the final stats frame was received"""
+        return bool(self.stats.get('done'))
+    
+    def _iterate(self) -> Iterator[str]:
+        if self.cached_text is not None:
+            self.text = self.cached_text
+            self.stats = {"done": True, "cached": True}
+            yield self.text
+            return
+        
+        if self.error is None:
+            try:
+                lines = self.lines if self.lines is not None else self.response.iter_lines()
+                for line in lines:
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise StreamError(data['error'])
+                    delta = data.get('message', {}).get('content', '')
+                    if delta:
+                        self.text += delta
+                        yield delta
+                    if data.get('done'):
+                        self.stats = {k: v for k, v in data.items() if k != 'message'}
+                        break
+            except Exception as e:
+                logger.error(f"Error handling streaming response: {e}")
+                self.error = e
+            finally:
+                self.close()
+            if self.done and self.text and self.on_complete is not None:
+                self.on_complete(self.text)
+        
+        if self.error is not None and not self.text:
+            self.text = error_message(self.error)
+            yield self.text
+    
+    def close(self) -> None:
+        """Release the connection back to the pool"""
+        if self.response is not None:
+            self.response.close()
+        if self.on_close is not None:
+            on_close, self.on_close = self.on_close, None
+            on_close()
+
+
+class _HedgedAttempt:
+    """
+    One copy of a hedged streaming chat call
+    
+    A thread sends the request and reads up to the first delta (or the
+    final frame), then hands the attempt to results; an error frame fails
+    the attempt like a 5xx. A cancelled attempt
+    closes its connection, which stops the generation on the server, and
+    frees its server once the thread is done with it.
+    """
+    
+    def __init__(
+        self,
+        client: "OllamaClient",
+        backend: Backend,
+        payload: Dict[str, Any],
+        results: "queue.Queue[_HedgedAttempt]",
+        hedge: bool
+    ):
+        self.client = client
+        self.backend = backend
+        self.hedge = hedge
+        self.start = time.monotonic()
+        self.response: Optional[requests.Response] = None
+        self.lines: Optional[Iterator[bytes]] = None
+        self.first: List[bytes] = []  # lines read before the first delta
+        self.error: Optional[Exception] = None
+        self._results = results
+        self._finished = False
+        self._cancelled = False
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, args=(payload,), name="ollama-hedge", daemon=True).start()
+    
+    def _run(self, payload: Dict[str, Any]) -> None:
+        try:
+            response = self.client.sessions[self.backend.base_url].post(
+                self.backend.chat_endpoint,
+                json=payload,
+                stream=True,
+                timeout=(OLLAMA_CONNECT_TIMEOUT, self.client.stream_timeout.current())
+            )
+            with self._lock:
+                self.response = response
+                cancelled = self._cancelled
+            if not cancelled:
+                response.raise_for_status()
+                self.lines = response.iter_lines()
+                for line in self.lines:
+                    self.first.append(line)
+                    data = json.loads(line) if line else {}
+                    if data.get('error'):
+                        raise StreamError(data['error'])
+                    if data.get('done') or data.get('message', {}).get('content'):
+                        break
+        except Exception as e:
+            self.error = e
+        
+        with self._lock:
+            self._finished = True
+            cancelled = self._cancelled
+        if cancelled:
+            self._discard()
+        else:
+            self._results.put(self)
+    
+    def cancel(self) -> None:
+        """Abandon the attempt (another one answered first)"""
+        with self._lock:
+            self._cancelled = True
+            finished = self._finished
+            response = self.response
+        if finished:
+            self._discard()
+        elif response is not None:
+            response.close()  # unblocks the reading thread, which then discards the attempt
+    
+    def close(self) -> None:
+        """Close the connection and free the server (its outcome already reported)"""
+        if self.response is not None:
+            self.response.close()
+        self.client.backends.release(self.backend)
+    
+    def _discard(self) -> None:
+        self.client.backends.record_abandoned(self.backend)
+        self.close()
+
+
+class ChatClientBase:
+    """
+    Request building and server bookkeeping shared by the sync and async clients
+    
+    Subclasses set model, keep_alive, response_cache and backends.
+    """
+    
+    def _finisher(self, backend: Optional[Backend], release: Callable[[], None]) -> Callable[[], None]:
+        """Function ending a call: frees its server and its admission slot"""
+        def finish() -> None:
+            if backend is not None:
+                self.backends.release(backend)
+            release()
+        return finish
+    
+    def _record_success(self, backend: Backend, tracker: AdaptiveTimeout, start: float) -> None:
+        """Report an answered call to the server pool and its latency to the timeout tracker"""
+        latency = time.monotonic() - start
+        tracker.observe(latency)
+        self.backends.record_success(backend, latency)
+    
+    def _record_error(self, backend: Optional[Backend], error: Exception) -> None:
+        """Report a failed call to the server pool (errors not caused by the server count as answers)"""
+        if backend is None:
+            return
+        if is_backend_failure(error):
+            self.backends.record_failure(backend)
+        else:
+            self.backends.record_success(backend)
+    
+    def _chat_payload(
+        self,
+        prompt: str,
+        stream: bool,
+        temperature: float,
+        top_p: float,
+        num_ctx: int,
+        system: str = None
+    ) -> Dict[str, Any]:
+        """Request body for /api/chat (the system message, when given, comes first so it is a shared prefix)"""
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "top_p": top_p,
+                "num_ctx": num_ctx
+            }
+        }
+        if self.keep_alive != "":
+            payload["keep_alive"] = self.keep_alive
+        return payload
+    
+    def _cache_key(self, payload: Dict[str, Any], cache_version: str) -> Optional[str]:
+        """Response cache key for a request, or None when it should not be cached"""
+        if self.response_cache is None or payload["options"]["temperature"] > RESPONSE_CACHE_MAX_TEMPERATURE:
+            return None
+        return make_cache_key(payload["model"], payload["messages"], self._key_options(payload), cache_version)
+    
+    @staticmethod
+    def _flight_key(payload: Dict[str, Any]) -> str:
+        """Key under which identical in-flight requests are coalesced"""
+        return make_cache_key(payload["model"], payload["messages"], ChatClientBase._key_options(payload))
     
-    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = OLLAMA_MODEL):
+    @staticmethod
+    def _key_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Options that identify a request for caching and coalescing
+        
+        num_ctx is left out: it only sizes the window (always large enough
+        for the prompt) and follows recent traffic, so the same prompt would
+        otherwise get a different key whenever the packer moves up or down
+        the ladder.
+        """
+        return {k: v for k, v in payload["options"].items() if k != "num_ctx"}
+
+
+class OllamaClient(ChatClientBase):
+    """
+    Client for communicating with Ollama LLM
+    
+    Chat calls are spread over every server in base_urls (least outstanding
+    requests first, failing servers ejected); model detection and embeddings
+    use the first server, so every server should have the same models.
+    With hedging, a call whose first token is late is duplicated to a
+    second server and the slower copy is cancelled.
+    """
+    
+    def __init__(
+        self,
+        base_url: str = None,
+        model: str = OLLAMA_MODEL,
+        session: requests.Session = None,
+        response_cache: ResponseCache = None,
+        coalesce: bool = OLLAMA_COALESCE_REQUESTS,
+        embedding_model: str = OLLAMA_EMBEDDING_MODEL,
+        embed_batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        registry: ModelRegistry = None,
+        circuit_breaker: CircuitBreaker = None,
+        admission: AdmissionController = None,
+        base_urls: List[str] = None,
+        hedging: HedgePolicy = None,
+        keep_alive: Union[str, int] = OLLAMA_KEEP_ALIVE
+    ):
         """
         Initialize Ollama client
         
         Args:
-            base_url: Ollama server URL
+            base_url: Ollama server URL (defaults to OLLAMA_BASE_URLS)
             model: Model name to use
+            session: HTTP session for the first server (defaults to the pooled session
+                shared per server)
+            response_cache: Cache for generated replies (defaults to the shared one
+                from config, which is None when RESPONSE_CACHE_ENABLED is off)
+            coalesce: Share one upstream generation between concurrent identical requests
+            embedding_model: Model used for embeddings (empty = the chat model)
+            embed_batch_window_ms: Window in which concurrent get_embeddings calls are
+                merged into one /api/embed request (0 sends each call on its own)
+            registry: Cached /api/tags view (defaults to the one shared per server)
+            circuit_breaker: Breaker guarding chat calls to the first server (defaults to
+                the one shared per server; none when CIRCUIT_BREAKER_ENABLED is off)
+            admission: Concurrency limit and priority queue for chat calls (defaults to
+                the one shared per server or pool, allowing LLM_MAX_INFLIGHT calls per
+                server; None when LLM_ADMISSION_ENABLED is off)
+            base_urls: Several Ollama servers to balance chat calls over (instead of base_url)
+            hedging: Hedge delay and budget for chat calls (defaults to a new policy when
+                LLM_HEDGING_ENABLED is on and there are several servers, else None)
+            keep_alive: How long Ollama keeps the model loaded after a chat call ("" = server default)
         """
-        self.base_url = base_url.rstrip('/')
+        urls = [url.rstrip('/') for url in (base_urls or ([base_url] if base_url else OLLAMA_BASE_URLS))]
+        self.base_url = urls[0]
         self.model = model
-        self.generate_endpoint = f"{self.base_url}/api/chat"
-        self.embedding_endpoint = f"{self.base_url}/api/embeddings"
+        self.hedging = hedging or (HedgePolicy() if LLM_HEDGING_ENABLED and len(urls) > 1 else None)
+        self.keep_alive = keep_alive
+        self.session = session or get_session(self.base_url)
+        self.sessions = {url: get_session(url) for url in urls}
+        self.sessions[self.base_url] = self.session
+        self.backends = BackendPool(urls, circuit_breaker) if circuit_breaker else get_backend_pool(urls)
+        self.registry = registry or get_model_registry(self.base_url, session=self.session)
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        self.inflight = SingleFlight() if coalesce else None
+        self.admission = admission or (
+            get_admission_controller(",".join(urls), LLM_MAX_INFLIGHT * len(urls)) if LLM_ADMISSION_ENABLED else None
+        )
+        self.timeout = (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+        # Chat read timeouts adapt to observed latency (full reply / first streamed byte)
+        self.generate_timeout = AdaptiveTimeout()
+        self.stream_timeout = AdaptiveTimeout()
+        self.embed_endpoint = f"{self.base_url}/api/embed"
+        self.embedding_endpoint = f"{self.base_url}/api/embeddings"  # Legacy single-text endpoint
+        self.embedding_model = embedding_model
+        self.embed_batcher = MicroBatcher(
+            self.embed_many, max_batch=EMBEDDING_BATCH_SIZE, window=embed_batch_window_ms / 1000,
+            name="ollama-embed"
+        ) if embed_batch_window_ms > 0 else None
         self._model_detected = False
     
     def is_available(self) -> bool:
-        """Check if Ollama server is available"""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"Ollama server not available: {e}")
-            return False
+        """Check if Ollama server is available (cached; see ModelRegistry)"""
+        return self.registry.is_available()
     
     def _detect_model(self):
         """Auto-detect and use best available model"""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                if models:
-                    available_names = [m['name'] for m in models]
-                    # Prefer gemma:2b if available, then gemma, then others
-                    for preferred in ['gemma:2b', 'gemma', 'mistral', 'llama2', 'neural-chat']:
-                        for available in available_names:
-                            if preferred in available:
-                                self.model = available
-                                logger.info(f"Auto-detected model: {self.model}")
-                                return
-                    # Use first available model if no preference match
-                    self.model = available_names[0]
-                    logger.info(f"Using first available model: {self.model}")
-        except Exception as e:
-            logger.warning(f"Could not auto-detect model: {e}, using: {self.model}")
+        # Prefer gemma:2b if available, then gemma, then others
+        model = select_model(self.registry.model_names(), PREFERRED_MODELS)
+        if model:
+            self.model = model
+            logger.info(f"Auto-detected model: {self.model}")
+        else:
+            logger.warning(f"Could not auto-detect model, using: {self.model}")
+    
+    def _ensure_model(self):
+        """Detect model on first use"""
+        if not self._model_detected:
+            self._detect_model()
+            self._model_detected = True
+    
+    def get_embedding_model(self) -> str:
+        """Name of the model used for embeddings"""
+        if self.embedding_model:
+            return self.embedding_model
+        self._ensure_model()
+        return self.model
     
     def generate(
         self,
@@ -64,7 +482,10 @@ class OllamaClient:
         stream: bool = False,
         temperature: float = 0.7,
         top_p: float = 0.9,
-        num_ctx: int = 2048
+        num_ctx: int = 2048,
+        cache_version: str = "",
+        priority: int = PRIORITY_NORMAL,
+        system: str = None
     ) -> str:
         """
         Generate text using Ollama
@@ -75,108 +496,326 @@ class OllamaClient:
             temperature: Sampling temperature (0-2, higher = more creative)
             top_p: Nucleus sampling parameter
             num_ctx: Context window size
+            cache_version: Tag added to the response cache key (e.g. the knowledge
+                base version) so cached replies are dropped when it changes
+            priority: Admission priority (admission.PRIORITY_*) when the server is busy
+            system: Instructions sent as a system message before the prompt; keep them
+                identical across calls so Ollama can reuse the already evaluated prefix
             
         Returns:
             Generated text response
+        
+        Raises:
+            AdmissionRejected: The server is saturated and the call was shed
         """
-        # Detect model on first use
-        if not self._model_detected:
-            self._detect_model()
-            self._model_detected = True
-            
+        if stream:
+            return self._handle_streaming_response(self.stream_generate(
+                prompt, temperature=temperature, top_p=top_p, num_ctx=num_ctx, cache_version=cache_version,
+                priority=priority, system=system
+            ))
+        
+        self._ensure_model()
+        payload = self._chat_payload(prompt, False, temperature, top_p, num_ctx, system)
+        cache_key = self._cache_key(payload, cache_version)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if self.inflight is None:
+            return self._post_chat(payload, cache_key, priority)
+        return self.inflight.do(self._flight_key(payload), lambda: self._post_chat(payload, cache_key, priority))
+    
+    def _post_chat(self, payload: Dict[str, Any], cache_key: Optional[str], priority: int) -> str:
+        """Send a non-streaming chat request and cache the reply"""
+        if self.hedging is not None:
+            # Hedging needs the first token, so the reply is streamed and collected
+            on_complete = None
+            if cache_key is not None:
+                on_complete = lambda text: self.response_cache.put(cache_key, text.strip())
+            return self._handle_streaming_response(
+                self._hedged_stream(dict(payload, stream=True), on_complete, priority)
+            )
+        
+        release = self._admit(priority)
+        backend = None
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "stream": stream,
-                "options": {
-                    "temperature": temperature,
-                    "top_p": top_p,
-                    "num_ctx": num_ctx
-                }
-            }
-            
-            response = requests.post(
-                self.generate_endpoint,
+            backend = self.backends.acquire()
+            start = time.monotonic()
+            response = self.sessions[backend.base_url].post(
+                backend.chat_endpoint,
                 json=payload,
-                timeout=OLLAMA_TIMEOUT
+                timeout=(OLLAMA_CONNECT_TIMEOUT, self.generate_timeout.current())
             )
             response.raise_for_status()
-            
-            if stream:
-                return self._handle_streaming_response(response)
-            else:
-                result = response.json()
-                return result.get('message', {}).get('content', '').strip()
+            self._record_success(backend, self.generate_timeout, start)
+            result = response.json()
+            text = result.get('message', {}).get('content', '').strip()
+            if cache_key is not None and text:
+                self.response_cache.put(cache_key, text)
+            return text
         
-        except requests.exceptions.Timeout:
-            logger.error("Ollama request timed out")
-            return "I'm experiencing delays. Please try again."
-        except requests.exceptions.ConnectionError:
-            logger.error("Cannot connect to Ollama server")
-            return "Service temporarily unavailable. Please try again."
         except Exception as e:
-            logger.error(f"Error calling Ollama: {e}")
-            return "An error occurred while processing your request."
+            self._record_error(backend, e)
+            self._log_error(e)
+            return error_message(e)
+        
+        finally:
+            self._finisher(backend, release)()
     
-    def _handle_streaming_response(self, response: requests.Response) -> str:
-        """Handle streaming response from Ollama"""
-        result = ""
+    def stream_generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        num_ctx: int = 2048,
+        cache_version: str = "",
+        priority: int = PRIORITY_NORMAL,
+        system: str = None
+    ) -> Union[ChatStream, SharedStream]:
+        """
+        Generate text, yielding token deltas as Ollama produces them
+        
+        A cached reply is returned as a single delta. Concurrent identical
+        requests read one upstream stream; each receives every delta.
+        
+        Args:
+            prompt: Input prompt
+            temperature: Sampling temperature (0-2, higher = more creative)
+            top_p: Nucleus sampling parameter
+            num_ctx: Context window size
+            cache_version: Tag added to the response cache key
+            priority: Admission priority (admission.PRIORITY_*) when the server is busy
+            system: Instructions sent as a system message before the prompt
+        
+        Returns:
+            ChatStream (or SharedStream when coalescing) yielding text deltas;
+            its stats attribute holds the final frame once iteration completes
+        
+        Raises:
+            AdmissionRejected: The server is saturated and the call was shed (raised
+                on the first read when coalescing)
+        """
+        self._ensure_model()
+        payload = self._chat_payload(prompt, True, temperature, top_p, num_ctx, system)
+        cache_key = self._cache_key(payload, cache_version)
+        on_complete = None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return ChatStream(cached_text=cached)
+            on_complete = lambda text: self.response_cache.put(cache_key, text.strip())
+        
+        if self.inflight is None:
+            return self._open_stream(payload, on_complete, priority)
+        return self.inflight.stream(
+            self._flight_key(payload), lambda: self._open_stream(payload, on_complete, priority)
+        )
+    
+    def _open_stream(
+        self,
+        payload: Dict[str, Any],
+        on_complete: Optional[Callable[[str], None]],
+        priority: int
+    ) -> ChatStream:
+        """Send a streaming chat request (the admission slot and server are held until the stream closes)"""
+        if self.hedging is not None:
+            return self._hedged_stream(payload, on_complete, priority)
+        
+        release = self._admit(priority)
+        backend = None
         try:
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    result += data.get('response', '')
-            return result.strip()
+            backend = self.backends.acquire()
+            start = time.monotonic()
+            response = self.sessions[backend.base_url].post(
+                backend.chat_endpoint,
+                json=payload,
+                stream=True,
+                timeout=(OLLAMA_CONNECT_TIMEOUT, self.stream_timeout.current())
+            )
+            response.raise_for_status()
+            self._record_success(backend, self.stream_timeout, start)
+            return ChatStream(response, on_complete=on_complete, on_close=self._finisher(backend, release))
         except Exception as e:
-            logger.error(f"Error handling streaming response: {e}")
-            return result.strip() if result else "Error processing response."
+            self._finisher(backend, release)()
+            self._record_error(backend, e)
+            self._log_error(e)
+            return ChatStream(error=e)
+    
+    def _hedged_stream(
+        self,
+        payload: Dict[str, Any],
+        on_complete: Optional[Callable[[str], None]],
+        priority: int
+    ) -> ChatStream:
+        """
+        Send a streaming chat request, hedged to a second server when the first token is late
+        
+        The first attempt to produce a token wins and the other one is
+        cancelled. A hedge is sent only within the policy's budget and
+        does not take an admission slot of its own. An attempt that fails
+        leaves the call to the other one, if any.
+        """
+        release = self._admit(priority)
+        self.hedging.start()
+        results: "queue.Queue[_HedgedAttempt]" = queue.Queue()
+        try:
+            primary = _HedgedAttempt(self, self.backends.acquire(), payload, results, hedge=False)
+        except CircuitOpenError as e:
+            release()
+            self._log_error(e)
+            return ChatStream(error=e)
+        
+        running = [primary]
+        waited = hedged = False
+        winner = error = None
+        while running and winner is None:
+            try:
+                attempt = results.get(timeout=None if waited else self.hedging.delay())
+            except queue.Empty:
+                waited = True
+                hedge = self._start_hedge(primary, payload, results)
+                if hedge is not None:
+                    running.append(hedge)
+                    hedged = True
+                continue
+            running.remove(attempt)
+            if attempt.error is None:
+                winner = attempt
+            else:
+                error = attempt.error
+                self._record_error(attempt.backend, error)
+                attempt.close()
+        
+        for attempt in running:
+            attempt.cancel()
+        if winner is None:
+            release()
+            self._log_error(error)
+            return ChatStream(error=error)
+        
+        self.hedging.observe(time.monotonic() - primary.start)  # the wait the caller saw
+        if hedged:
+            self.hedging.record_winner(winner.hedge)
+        self._record_success(winner.backend, self.stream_timeout, winner.start)
+        return ChatStream(
+            winner.response, on_complete=on_complete, on_close=self._finisher(winner.backend, release),
+            lines=itertools.chain(winner.first, winner.lines)
+        )
+    
+    def _start_hedge(
+        self,
+        primary: _HedgedAttempt,
+        payload: Dict[str, Any],
+        results: "queue.Queue[_HedgedAttempt]"
+    ) -> Optional[_HedgedAttempt]:
+        """Duplicate a slow call to another healthy server, if the budget allows"""
+        if not self.hedging.try_hedge():
+            return None
+        try:
+            backend = self.backends.acquire(exclude=primary.backend)
+        except CircuitOpenError:
+            self.hedging.refund()
+            return None
+        logger.info(f"Hedging chat call to {backend.base_url} after {time.monotonic() - primary.start:.2f}s")
+        return _HedgedAttempt(self, backend, payload, results, hedge=True)
+    
+    def _admit(self, priority: int) -> Callable[[], None]:
+        """Wait for an admission slot; returns the function releasing it"""
+        if self.admission is None:
+            return lambda: None
+        return self.admission.acquire(priority)
+    
+    @staticmethod
+    def _log_error(error: Exception) -> None:
+        if isinstance(error, CircuitOpenError):
+            logger.warning(f"Skipping Ollama call: {error}")
+        elif isinstance(error, requests.exceptions.Timeout):
+            logger.error("Ollama request timed out")
+        elif isinstance(error, requests.exceptions.ConnectionError):
+            logger.error("Cannot connect to Ollama server")
+        else:
+            logger.error(f"Error calling Ollama: {error}")
+    
+    def _handle_streaming_response(self, stream: Union[ChatStream, SharedStream]) -> str:
+        """Collect a streamed reply into one string"""
+        with stream:
+            for _ in stream:
+                pass
+        return stream.text.strip()
     
     def get_embeddings(self, text: str) -> Optional[list]:
         """
         Get embeddings for text (for semantic search)
         
+        Concurrent calls are merged into one batched request by the
+        micro-batcher when it is enabled.
+        
         Args:
             text: Text to embed
             
         Returns:
             Embedding vector or None if failed
         """
+        if self.embed_batcher is not None:
+            return self.embed_batcher.submit(text)
+        return self.embed_many([text])[0]
+    
+    def embed_many(self, texts: List[str]) -> List[Optional[list]]:
+        """
+        Embed several texts with batched /api/embed requests
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            One embedding (or None if it failed) per text, in order
+        """
+        model = self.get_embedding_model()
+        vectors = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            vectors.extend(self._embed_batch(model, texts[start:start + EMBEDDING_BATCH_SIZE]))
+        return vectors
+    
+    def _embed_batch(self, model: str, texts: List[str]) -> List[Optional[list]]:
+        """Embed one batch, falling back to /api/embeddings on servers without /api/embed"""
         try:
-            payload = {
-                "model": self.model,
-                "prompt": text
-            }
-            
-            response = requests.post(
-                self.embedding_endpoint,
-                json=payload,
-                timeout=OLLAMA_TIMEOUT
+            response = self.session.post(
+                self.embed_endpoint,
+                json={"model": model, "input": texts},
+                timeout=self.timeout
             )
+            if response.status_code == 404 and 'page not found' in response.text:
+                return [self._embed_legacy(model, text) for text in texts]
             response.raise_for_status()
             
-            result = response.json()
-            return result.get('embedding')
+            embeddings = response.json().get('embeddings') or []
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
         
         except Exception as e:
             logger.error(f"Error getting embeddings: {e}")
-            return None
+            return [None] * len(texts)
     
-    def validate_model_available(self) -> bool:
-        """Check if specified model is available in Ollama"""
+    def _embed_legacy(self, model: str, text: str) -> Optional[list]:
+        """Embed one text with the legacy /api/embeddings endpoint"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [m.get('name', '').split(':')[0] for m in models]
-                if self.model in model_names:
-                    logger.info(f"Model '{self.model}' is available")
-                    return True
-                else:
-                    logger.warning(f"Model '{self.model}' not found. Available: {model_names}")
-                    return False
+            response = self.session.post(
+                self.embedding_endpoint,
+                json={"model": model, "prompt": text},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json().get('embedding')
         except Exception as e:
-            logger.error(f"Error checking model availability: {e}")
-            return False
+            logger.error(f"Error getting embeddings: {e}")
+            return None
+    
+    def validate_model_available(self) -> bool:
+        """Check if specified model is available in Ollama (cached)"""
+        if self.registry.has_model(self.model):
+            logger.info(f"Model '{self.model}' is available")
+            return True
+        logger.warning(f"Model '{self.model}' not found. Available: {self.registry.model_names()}")
+        return False
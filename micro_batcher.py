@@ -0,0 +1,184 @@
+"""
+Micro-batching: merge concurrent single-item calls into batch calls
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _fail_missing(batch: List[Tuple[Any, Any]], results: List[Any]) -> None:
+    """Fail the futures of items batch_fn returned no result for, so their callers do not wait forever"""
+    if len(results) >= len(batch):
+        return
+    error = RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+    logger.error(str(error))
+    for _, future in batch[len(results):]:
+        if not future.done():
+            future.set_exception(error)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and processes them in batches
+    
+    A daemon worker waits for the first item, then keeps collecting until
+    window seconds have passed or max_batch items are queued, and hands the
+    batch to batch_fn. Each caller blocks only for its own result, so a
+    lone request pays at most the window in extra latency.
+    """
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 64,
+        window: float = 0.005,
+        name: str = "micro-batcher"
+    ):
+        """
+        Initialize the batcher (the worker starts on first submit)
+        
+        Args:
+            batch_fn: Function mapping a list of items to a list of results
+                of the same length
+            max_batch: Maximum items per batch
+            window: Seconds to wait for more items after the first one
+            name: Worker thread name
+        """
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.window = window
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._counters = {"items": 0, "batches": 0}
+    
+    def submit(self, item: Any) -> Any:
+        """
+        Process one item as part of the next batch
+        
+        Args:
+            item: Item to process
+        
+        Returns:
+            Result of batch_fn for this item (its exception is re-raised)
+        """
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future.result()
+    
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+    
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+    
+    def _process(self, batch: List[Tuple[Any, Future]]) -> None:
+        self._counters["items"] += len(batch)
+        self._counters["batches"] += 1
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)}: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        _fail_missing(batch, results)
+    
+    def stats(self) -> dict:
+        """Items processed and batches sent"""
+        return dict(self._counters)
+
+
+class AsyncMicroBatcher:
+    """
+    asyncio counterpart of MicroBatcher
+    
+    The first submit schedules a flush after window seconds; reaching
+    max_batch flushes immediately. Batches run as tasks on the caller's loop.
+    """
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 64,
+        window: float = 0.005
+    ):
+        """
+        Initialize the batcher
+        
+        Args:
+            batch_fn: Coroutine function mapping a list of items to results
+            max_batch: Maximum items per batch
+            window: Seconds to wait for more items after the first one
+        """
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._counters = {"items": 0, "batches": 0}
+    
+    async def submit(self, item: Any) -> Any:
+        """Process one item as part of the next batch and return its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._process(batch))
+    
+    async def _process(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self._counters["items"] += len(batch)
+        self._counters["batches"] += 1
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)}: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        _fail_missing(batch, results)
+    
+    def stats(self) -> dict:
+        """Items processed and batches sent"""
+        return dict(self._counters)
@@ -0,0 +1,173 @@
+"""
+Shared, cached view of the models an Ollama server offers (/api/tags)
+"""
+
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+import requests
+from config import MODEL_REGISTRY_TTL, MODEL_REGISTRY_RETRY, OLLAMA_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Timeout for /api/tags (connect, read)
+TAGS_TIMEOUT = (OLLAMA_CONNECT_TIMEOUT, 5)
+
+
+def select_model(names: Sequence[str], preferred: Sequence[str]) -> Optional[str]:
+    """
+    Pick a model: the first installed name containing a preferred substring,
+    in preference order, else the first installed model
+    
+    Args:
+        names: Installed model names
+        preferred: Preferred name substrings, best first
+    
+    Returns:
+        Model name, or None when nothing is installed
+    """
+    for wanted in preferred:
+        for name in names:
+            if wanted in name:
+                return name
+    return names[0] if names else None
+
+
+class ModelRegistry:
+    """
+    Cached /api/tags for one Ollama server, shared by every client
+    
+    Reads are memory reads. Once the cached answer is older than ttl (or
+    retry after a failed probe), the next read starts a refresh on a
+    background thread and still returns the cached answer. Only the very
+    first read waits, for at most the tags timeout, for the initial probe.
+    """
+    
+    def __init__(
+        self,
+        base_url: str,
+        session: requests.Session = None,
+        ttl: float = MODEL_REGISTRY_TTL,
+        retry: float = MODEL_REGISTRY_RETRY
+    ):
+        """
+        Initialize the registry (nothing is fetched until the first read)
+        
+        Args:
+            base_url: Ollama server URL
+            session: HTTP session used for probes (a private one when omitted)
+            ttl: Seconds a successful probe stays fresh
+            retry: Seconds a failed probe stays fresh
+        """
+        self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.ttl = ttl
+        self.retry = retry
+        self._models: List[Dict[str, Any]] = []
+        self._available = False
+        self._error: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        self._refreshing = False
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {"probes": 0, "failures": 0}
+    
+    def refresh(self) -> bool:
+        """
+        Probe /api/tags now (blocking) and update the cache
+        
+        Returns:
+            Whether the server answered
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=TAGS_TIMEOUT)
+            response.raise_for_status()
+            models, available, error = response.json().get('models', []), True, None
+        except Exception as e:
+            models, available, error = None, False, str(e)
+            logger.error(f"Ollama server not available: {e}")
+        
+        with self._lock:
+            self._counters["probes"] += 1
+            if models is not None:
+                self._models = models
+            else:
+                self._counters["failures"] += 1
+            self._available = available
+            self._error = error
+            self._fetched_at = time.monotonic()
+            self._refreshing = False
+        self._ready.set()
+        return available
+    
+    def _read(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Cached (models, available), scheduling a refresh when stale"""
+        with self._lock:
+            fetched_at = self._fetched_at
+            stale = fetched_at is None or (
+                time.monotonic() - fetched_at > (self.ttl if self._available else self.retry)
+            )
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self.refresh, name="ollama-tags", daemon=True).start()
+        if fetched_at is None:
+            self.wait_ready()
+        with self._lock:
+            return self._models, self._available
+    
+    @property
+    def ready(self) -> bool:
+        """Whether the first probe has finished"""
+        return self._ready.is_set()
+    
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Wait for the first probe to finish; returns whether it has"""
+        return self._ready.wait(sum(TAGS_TIMEOUT) if timeout is None else timeout)
+    
+    def is_available(self) -> bool:
+        """Whether the last probe reached the server"""
+        return self._read()[1]
+    
+    def model_names(self) -> List[str]:
+        """Installed model names from the last successful probe"""
+        return [m.get('name', '') for m in self._read()[0]]
+    
+    def has_model(self, model: str) -> bool:
+        """Whether a model is installed (with or without its tag)"""
+        names = self.model_names()
+        return model in names or model in [name.split(':')[0] for name in names]
+    
+    def status(self) -> Dict[str, Any]:
+        """Cached state for health endpoints (never waits)"""
+        with self._lock:
+            return {
+                "available": self._available,
+                "models": [m.get('name', '') for m in self._models],
+                "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+                "error": self._error,
+                **self._counters
+            }
+
+
+_registries: Dict[str, ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_model_registry(base_url: str, session: requests.Session = None) -> ModelRegistry:
+    """
+    Process-wide registry for an Ollama server
+    
+    Args:
+        base_url: Ollama server URL
+        session: HTTP session for probes, used when the registry is created
+    
+    Returns:
+        ModelRegistry
+    """
+    key = base_url.rstrip('/')
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ModelRegistry(key, session=session)
+        return registry
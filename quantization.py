@@ -0,0 +1,246 @@
+"""
+Compressed embedding storage: scalar int8 and product quantization
+"""
+
+import logging
+from typing import Optional, Sequence, Tuple
+from config import PQ_SUBSPACES
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for semantic retrieval
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Rows processed per block while encoding/scoring (bounds temporary float32 memory)
+_SCORE_BLOCK = 65536
+
+
+def _kmeans(points: "np.ndarray", k: int, iterations: int, rng) -> "np.ndarray":
+    """Plain Euclidean k-means, returning the centroids"""
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+        assignments = np.argmax(points @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
+
+
+class Int8Vectors:
+    """
+    Scalar int8 quantization with a per-vector scale
+    
+    Each vector is stored as int8 codes plus one float32 scale (max |x| / 127),
+    about 4x smaller than float32. Scoring is asymmetric: the query stays in
+    float32 and is multiplied against the decoded codes.
+    """
+    
+    name = "int8"
+    
+    def __init__(self, dim: int):
+        """
+        Initialize empty storage
+        
+        Args:
+            dim: Vector dimension
+        """
+        if np is None:
+            raise ImportError("numpy is required for quantized embeddings")
+        self.dim = dim
+        self.codes = np.zeros((0, dim), dtype=np.int8)
+        self.scales = np.zeros(0, dtype=np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+    
+    @staticmethod
+    def _encode(vectors: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """Int8 codes and per-row scales for float32 vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    
+    def add(self, vectors: "np.ndarray") -> None:
+        """Quantize and append float32 vectors"""
+        codes, scales = self._encode(vectors)
+        self.codes = np.concatenate([self.codes, codes])
+        self.scales = np.concatenate([self.scales, scales])
+    
+    def replace(self, ids: Sequence[int], vectors: "np.ndarray") -> None:
+        """Quantize float32 vectors over existing rows"""
+        codes, scales = self._encode(vectors)
+        self.codes[ids] = codes
+        self.scales[ids] = scales
+    
+    def decode(self, ids: Optional[Sequence[int]] = None) -> "np.ndarray":
+        """Approximate float32 vectors for the given rows (all rows if None)"""
+        codes = self.codes if ids is None else self.codes[ids]
+        scales = self.scales if ids is None else self.scales[ids]
+        return codes.astype(np.float32) * scales[:, None]
+    
+    def score(self, query: "np.ndarray", ids: Optional[Sequence[int]] = None) -> "np.ndarray":
+        """
+        Asymmetric inner products between a float32 query and stored rows
+        
+        Args:
+            query: Query vector
+            ids: Rows to score (all rows if None)
+        
+        Returns:
+            Array of approximate inner products
+        """
+        codes = self.codes if ids is None else self.codes[ids]
+        scales = self.scales if ids is None else self.scales[ids]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCORE_BLOCK):
+            block = codes[start:start + _SCORE_BLOCK].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores * scales
+
+
+class PQVectors:
+    """
+    Product quantization
+    
+    Vectors are split into m sub-vectors, each replaced by the id of its
+    nearest centroid in a 256-entry codebook, so a vector costs m bytes.
+    Queries use asymmetric distance computation: a per-query lookup table
+    of sub-vector inner products is summed over each row's codes.
+    """
+    
+    name = "pq"
+    
+    def __init__(self, dim: int, m: int = PQ_SUBSPACES, ks: int = 256, seed: int = 0):
+        """
+        Initialize untrained storage
+        
+        Args:
+            dim: Vector dimension (must be divisible by m)
+            m: Number of sub-vectors
+            ks: Centroids per sub-space (at most 256)
+            seed: Random seed for codebook training
+        """
+        if np is None:
+            raise ImportError("numpy is required for quantized embeddings")
+        if dim % m:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by {m} PQ sub-spaces")
+        self.dim = dim
+        self.m = m
+        self.dsub = dim // m
+        self.ks = min(ks, 256)
+        self.seed = seed
+        self.codebooks = None
+        self.codes = np.zeros((0, m), dtype=np.uint8)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def nbytes(self) -> int:
+        codebooks = self.codebooks.nbytes if self.codebooks is not None else 0
+        return self.codes.nbytes + codebooks
+    
+    def train(self, vectors: "np.ndarray", iterations: int = 15, max_training_points: int = 20000) -> None:
+        """
+        Learn one codebook per sub-space
+        
+        Args:
+            vectors: Training vectors
+            iterations: k-means iterations per sub-space
+            max_training_points: Sample size used for training
+        """
+        rng = np.random.default_rng(self.seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > max_training_points:
+            vectors = vectors[rng.choice(len(vectors), max_training_points, replace=False)]
+        ks = min(self.ks, len(vectors))
+        self.codebooks = np.stack([
+            _kmeans(vectors[:, j * self.dsub:(j + 1) * self.dsub], ks, iterations, rng)
+            for j in range(self.m)
+        ])
+        logger.info(f"Trained PQ codebooks: {self.m} sub-spaces x {ks} centroids on {len(vectors)} vectors")
+    
+    def _encode(self, vectors: "np.ndarray") -> "np.ndarray":
+        """Nearest-centroid codes of vectors in every sub-space"""
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        half_norms = 0.5 * (self.codebooks ** 2).sum(axis=2)
+        for start in range(0, len(vectors), _SCORE_BLOCK):
+            block = vectors[start:start + _SCORE_BLOCK]
+            for j in range(self.m):
+                sub = block[:, j * self.dsub:(j + 1) * self.dsub]
+                codes[start:start + len(block), j] = np.argmax(sub @ self.codebooks[j].T - half_norms[j], axis=1)
+        return codes
+    
+    def add(self, vectors: "np.ndarray") -> None:
+        """Encode and append vectors (trains codebooks on the first batch)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.codebooks is None:
+            self.train(vectors)
+        self.codes = np.concatenate([self.codes, self._encode(vectors)])
+    
+    def replace(self, ids: Sequence[int], vectors: "np.ndarray") -> None:
+        """Encode vectors over existing rows (codebooks are already trained)"""
+        self.codes[ids] = self._encode(np.asarray(vectors, dtype=np.float32))
+    
+    def decode(self, ids: Optional[Sequence[int]] = None) -> "np.ndarray":
+        """Reconstructed float32 vectors for the given rows (all rows if None)"""
+        codes = self.codes if ids is None else self.codes[ids]
+        return np.hstack([self.codebooks[j][codes[:, j]] for j in range(self.m)])
+    
+    def score(self, query: "np.ndarray", ids: Optional[Sequence[int]] = None) -> "np.ndarray":
+        """
+        Asymmetric inner products via per-query lookup tables
+        
+        Args:
+            query: Query vector
+            ids: Rows to score (all rows if None)
+        
+        Returns:
+            Array of approximate inner products
+        """
+        codes = self.codes if ids is None else self.codes[ids]
+        lut = np.einsum('mkd,md->mk', self.codebooks, query.reshape(self.m, self.dsub).astype(np.float32))
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):
+            scores += lut[j][codes[:, j]]
+        return scores
+
+
+def pq_subspaces(dim: int, limit: int = PQ_SUBSPACES) -> int:
+    """Largest number of PQ sub-spaces, at most limit, that divides the dimension"""
+    return next(m for m in range(min(limit, dim), 0, -1) if dim % m == 0)
+
+
+def make_quantized_vectors(method: str, dim: int):
+    """
+    Create compressed vector storage
+    
+    Args:
+        method: 'int8' or 'pq'
+        dim: Vector dimension (for 'pq', PQ_SUBSPACES is lowered to a divisor of it)
+    
+    Returns:
+        Int8Vectors or PQVectors
+    """
+    if method == "int8":
+        return Int8Vectors(dim)
+    if method == "pq":
+        m = pq_subspaces(dim)
+        if m != PQ_SUBSPACES:
+            logger.warning(f"Embedding dimension {dim} is not divisible by {PQ_SUBSPACES}; using {m} PQ sub-spaces")
+        return PQVectors(dim, m=m)
+    raise ValueError(f"Unknown quantization method: {method}")
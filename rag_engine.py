@@ -2,13 +2,23 @@
 RAG (Retrieval-Augmented Generation) Engine for intelligent responses
 """
 
+import asyncio
 import logging
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator, Optional
 from data_loader import KnowledgeBase
-from llm_client import OllamaClient
-from config import TOP_K_RESULTS, CONFIDENCE_THRESHOLD, RESPONSE_TEMPLATES, KB_CATEGORIES, PROJECT_ROOT
+from llm_client import OllamaClient, is_error_message
+from async_llm_client import AsyncOllamaClient
+from keyword_matcher import KeywordMatcher, get_keyword_matcher
+from semantic_cache import SemanticCache
+from admission import PRIORITY_HIGH, PRIORITY_NORMAL
+from vector_index import numpy_available
+from context_packer import ContextPacker
+from config import (
+    TOP_K_RESULTS, CONFIDENCE_THRESHOLD, RESPONSE_TEMPLATES, KB_CATEGORIES, PROJECT_ROOT, RETRIEVAL_MODE,
+    INTENT_ROUTING_THRESHOLD, OLLAMA_MODEL, SEMANTIC_CACHE_ENABLED, SYSTEM_PROMPT
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,18 +29,47 @@ class RAGEngine:
     Combines knowledge base retrieval with LLM generation
     """
     
-    def __init__(self, kb: KnowledgeBase = None, llm_client: OllamaClient = None):
+    def __init__(
+        self,
+        kb: KnowledgeBase = None,
+        llm_client: OllamaClient = None,
+        retrieval_mode: str = None,
+        matcher: KeywordMatcher = None,
+        async_llm_client: AsyncOllamaClient = None,
+        semantic_cache: SemanticCache = None,
+        context_packer: ContextPacker = None
+    ):
         """
         Initialize RAG engine
         
         Args:
             kb: KnowledgeBase instance
             llm_client: OllamaClient instance
+            retrieval_mode: Retrieval mode ('keyword', 'bm25f', 'semantic' or 'hybrid'),
+                defaults to RETRIEVAL_MODE
+            matcher: Keyword matcher for intents and categories (defaults to the shared one)
+            async_llm_client: AsyncOllamaClient used by process_query_async (created on
+                first use for the same server and model as llm_client)
+            semantic_cache: Cache of answers to near-duplicate questions (created
+                when SEMANTIC_CACHE_ENABLED is set and numpy is installed)
+            context_packer: Fits retrieved chunks into the prompt's token budget and
+                sizes num_ctx (defaults to one using CONTEXT_TOKEN_BUDGET)
         """
         self.kb = kb or KnowledgeBase()
+        self.retrieval_mode = retrieval_mode or RETRIEVAL_MODE
         self.llm = llm_client or OllamaClient()
+        self.async_llm = async_llm_client
+        if self.kb.embedder is None and hasattr(self.llm, 'get_embeddings'):
+            self.kb.embedder = self.llm.get_embeddings
+            self.kb.batch_embedder = getattr(self.llm, 'embed_many', None)
+            self.kb.embedding_model = self.llm.get_embedding_model
         self.intents = self._load_intents()
+        self.matcher = matcher or get_keyword_matcher()
         self.dialogflows = self._load_dialogflows()
+        if semantic_cache is None and SEMANTIC_CACHE_ENABLED and numpy_available():
+            semantic_cache = SemanticCache()
+        self.semantic_cache = semantic_cache
+        self.packer = context_packer or ContextPacker()
     
     def _load_intents(self) -> Dict[str, Dict]:
         """Load intent definitions from knowledge base"""
@@ -78,13 +117,13 @@ class RAGEngine:
         Returns:
             Tuple of (intent_name, confidence)
         """
-        query_lower = user_query.lower()
+        matches = self.matcher.scan(user_query)
         best_intent = None
         best_score = 0.0
         
         for intent_name, intent_info in self.intents.items():
             keywords = intent_info.get('keywords', [])
-            matched = sum(1 for kw in keywords if kw in query_lower)
+            matched = len(matches.get(f"intent:{intent_name}", ()))
             
             if matched > 0:
                 score = matched / len(keywords) if keywords else 0
@@ -95,16 +134,134 @@ class RAGEngine:
         logger.info(f"Detected intent: {best_intent} (confidence: {best_score:.2f})")
         return best_intent, best_score
     
-    def process_query(self, user_query: str) -> Tuple[str, Dict[str, Any]]:
+    def process_query(self, user_query: str, priority: int = PRIORITY_NORMAL) -> Tuple[str, Dict[str, Any]]:
         """
         Process user query and generate response
         
         Args:
             user_query: User's question
+            priority: Admission priority of the LLM call (admission.PRIORITY_*)
             
+        Returns:
+            Tuple of (response, metadata dict)
+        
+        Raises:
+            AdmissionRejected: The LLM is saturated and the call was shed
+        """
+        response, metadata = self._prepare_query(user_query)
+        if response is None and self._circuit_open(self.llm):
+            response = self._degraded_answer(metadata)
+        if response is None:
+            response = self._generate_answer(
+                user_query, metadata["retrieved_docs"], self._llm_priority(metadata, priority)
+            )
+            if is_error_message(response):
+                response = self._degraded_answer(metadata)
+            else:
+                logger.info(f"Generated answer with confidence: {metadata['confidence']:.2f}")
+                self._remember_answer(user_query, response, metadata)
+        
+        return response, metadata
+    
+    async def process_query_async(
+        self,
+        user_query: str,
+        priority: int = PRIORITY_NORMAL
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Process user query without holding a thread while the LLM generates
+        
+        Retrieval runs in a worker thread (it may call the embedder); the
+        answer is generated with the asyncio client.
+        
+        Args:
+            user_query: User's question
+            priority: Admission priority of the LLM call (admission.PRIORITY_*)
+        
         Returns:
             Tuple of (response, metadata dict)
         """
+        response, metadata = await asyncio.to_thread(self._prepare_query, user_query)
+        if response is None and self._circuit_open(self._get_async_llm()):
+            response = self._degraded_answer(metadata)
+        if response is None:
+            prompt = self._create_prompt(user_query, self._build_context(metadata["retrieved_docs"]))
+            response = await self._get_async_llm().generate(
+                prompt=prompt,
+                temperature=0.3,  # Lower temperature for factual answers
+                top_p=0.9,
+                num_ctx=self.packer.num_ctx(SYSTEM_PROMPT, prompt),
+                cache_version=self.kb.version,
+                priority=self._llm_priority(metadata, priority),
+                system=SYSTEM_PROMPT
+            )
+            if is_error_message(response):
+                response = self._degraded_answer(metadata)
+            else:
+                logger.info(f"Generated answer with confidence: {metadata['confidence']:.2f}")
+                await asyncio.to_thread(self._remember_answer, user_query, response, metadata)
+        
+        return response, metadata
+    
+    def _get_async_llm(self) -> AsyncOllamaClient:
+        """Async client for the same server and model as the sync client"""
+        if self.async_llm is None:
+            self.async_llm = AsyncOllamaClient(
+                base_urls=getattr(getattr(self.llm, 'backends', None), 'urls', None),
+                model=getattr(self.llm, 'model', OLLAMA_MODEL),
+                response_cache=getattr(self.llm, 'response_cache', None)
+            )
+        return self.async_llm
+    
+    def process_query_stream(
+        self,
+        user_query: str,
+        priority: int = PRIORITY_NORMAL
+    ) -> Tuple[Iterator[str], Dict[str, Any]]:
+        """
+        Process user query, streaming the generated answer
+        
+        Retrieval and the wait for the first delta run before this returns, so
+        the metadata is complete (including whether a failed LLM call fell
+        back to a help-center article) while the answer is still being
+        generated.
+        
+        Args:
+            user_query: User's question
+            priority: Admission priority of the LLM call (admission.PRIORITY_*)
+        
+        Returns:
+            Tuple of (iterator of answer text deltas, metadata dict)
+        """
+        response, metadata = self._prepare_query(user_query)
+        if response is None and self._circuit_open(self.llm):
+            response = self._degraded_answer(metadata)
+        if response is not None:
+            return iter([response]), metadata
+        
+        stream = self._stream_answer(
+            user_query, metadata["retrieved_docs"], self._llm_priority(metadata, priority)
+        )
+        # The first delta tells a failed call (its fallback message) from an answer
+        first = next(stream, "")
+        if is_error_message(first):
+            self._close_stream(stream)
+            return iter([self._degraded_answer(metadata)]), metadata
+        
+        logger.info(f"Streaming answer with confidence: {metadata['confidence']:.2f}")
+        return self._relay_stream(user_query, first, stream, metadata), metadata
+    
+    def _prepare_query(self, user_query: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Run intent detection, retrieval and confidence scoring for a query
+        
+        Args:
+            user_query: User's question
+        
+        Returns:
+            Tuple of (fixed response, metadata dict); the response is None when
+            an answer should be generated from metadata["retrieved_docs"]
+        """
         metadata = {
             "user_query": user_query,
             "category": None,
@@ -113,7 +270,10 @@ class RAGEngine:
             "escalated": False,
             "reason": None,
             "intent": None,
-            "intent_confidence": 0.0
+            "intent_confidence": 0.0,
+            "routing": None,
+            "cache": None,
+            "degraded": False
         }
         
         # Step 1: Detect user intent
@@ -134,8 +294,13 @@ class RAGEngine:
             logger.info("Welcome intent detected - returning capabilities")
             return response, metadata
         
+        # Step 2c: Reuse the answer to a near-duplicate question
+        response = self._cached_answer(user_query, metadata)
+        if response is not None:
+            return response, metadata
+        
         # Step 3: Retrieve relevant documents from knowledge base
-        retrieved_docs = self.kb.search(user_query, top_k=TOP_K_RESULTS)
+        retrieved_docs = self._retrieve(user_query, intent, intent_score, metadata)
         metadata["retrieved_docs"] = retrieved_docs
         
         logger.info(f"Retrieved {len(retrieved_docs)} documents for query: {user_query[:50]}...")
@@ -156,16 +321,141 @@ class RAGEngine:
         
         # Step 5: Generate response using LLM with context
         if confidence >= CONFIDENCE_THRESHOLD:
-            response = self._generate_answer(user_query, retrieved_docs)
-            logger.info(f"Generated answer with confidence: {confidence:.2f}")
-        else:
-            response = RESPONSE_TEMPLATES["uncertain"]
-            metadata["escalated"] = True
-            metadata["reason"] = f"Low confidence score: {confidence:.2f}"
-            logger.warning(f"Low confidence ({confidence:.2f}), escalating")
+            return None, metadata
         
+        response = RESPONSE_TEMPLATES["uncertain"]
+        metadata["escalated"] = True
+        metadata["reason"] = f"Low confidence score: {confidence:.2f}"
+        logger.warning(f"Low confidence ({confidence:.2f}), escalating")
         return response, metadata
     
+    @staticmethod
+    def _llm_priority(metadata: Dict[str, Any], priority: int) -> int:
+        """Promote normal-priority questions answered from a matched FAQ intent"""
+        if priority == PRIORITY_NORMAL and metadata.get("routing") == "intent":
+            return PRIORITY_HIGH
+        return priority
+    
+    @staticmethod
+    def _circuit_open(llm) -> bool:
+        """Whether the client's circuit breakers are refusing calls to every LLM server"""
+        backends = getattr(llm, 'backends', None)
+        return backends is not None and backends.is_open
+    
+    def _degraded_answer(self, metadata: Dict[str, Any]) -> str:
+        """
+        Answer with the top retrieved document when the LLM cannot be used
+        
+        Args:
+            metadata: Query metadata (retrieved_docs must not be empty)
+        
+        Returns:
+            Help-center article text
+        """
+        top = metadata["retrieved_docs"][0]
+        doc = self.kb.get_by_id(top.get('parent_id', top.get('id'))) or top
+        metadata["degraded"] = True
+        metadata["reason"] = "LLM unavailable"
+        logger.warning(f"LLM unavailable, answering with document {doc.get('id')}")
+        return RESPONSE_TEMPLATES["degraded"].format(
+            title=doc.get('title', ''),
+            content=doc.get('content', '')
+        )
+    
+    def _cached_answer(self, user_query: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        Look up the semantic cache for a question with the same intent
+        
+        Args:
+            user_query: User's question
+            metadata: Query metadata (filled from the cached answer on a hit)
+        
+        Returns:
+            Cached answer, or None on a miss
+        """
+        if self.semantic_cache is None:
+            return None
+        vector = self.kb.embed_query(user_query)
+        if vector is None:
+            return None
+        
+        hit = self.semantic_cache.lookup(user_query, vector, metadata["intent"], self.kb.version)
+        if hit is None:
+            return None
+        
+        metadata.update({key: value for key, value in hit["metadata"].items() if key != "user_query"})
+        metadata["cache"] = {
+            "type": "semantic",
+            "similarity": round(hit["similarity"], 4),
+            "cached_query": hit["query"]
+        }
+        logger.info(f"Semantic cache hit ({hit['similarity']:.3f}) for query: {user_query[:50]}...")
+        return hit["response"]
+    
+    def _remember_answer(self, user_query: str, response: str, metadata: Dict[str, Any]) -> None:
+        """Store a generated answer in the semantic cache (error fallbacks are skipped)"""
+        if self.semantic_cache is None or not response or is_error_message(response):
+            return
+        vector = self.kb.embed_query(user_query)
+        if vector is not None:
+            self.semantic_cache.add(
+                user_query, vector, metadata["intent"], response, dict(metadata), self.kb.version
+            )
+    
+    def _relay_stream(
+        self,
+        user_query: str,
+        first: str,
+        stream: Iterator[str],
+        metadata: Dict[str, Any]
+    ) -> Iterator[str]:
+        """Yield the first delta (already read) and the rest of a stream, caching the answer once it completes"""
+        parts = []
+        try:
+            if first:
+                parts.append(first)
+                yield first
+            for delta in stream:
+                parts.append(delta)
+                yield delta
+        finally:
+            self._close_stream(stream)
+        if getattr(stream, 'error', None) is None:
+            self._remember_answer(user_query, "".join(parts), metadata)
+    
+    @staticmethod
+    def _close_stream(stream: Iterator[str]) -> None:
+        """Close an LLM stream (frees its connection and admission slot) if it supports closing"""
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+    
+    def _retrieve(self, user_query: str, intent: str, intent_score: float, metadata: Dict[str, Any]) -> List[Dict]:
+        """
+        Retrieve chunks, searching only an intent's mapped documents when the intent is confident
+        
+        Args:
+            user_query: User's question
+            intent: Detected intent name
+            intent_score: Intent confidence
+            metadata: Query metadata (records the routing used)
+        
+        Returns:
+            List of retrieved chunks
+        """
+        doc_ids = self.intents.get(intent, {}).get('documents') if intent else None
+        if doc_ids and intent_score >= INTENT_ROUTING_THRESHOLD:
+            retrieved_docs = self.kb.search(
+                user_query, top_k=TOP_K_RESULTS, mode=self.retrieval_mode, doc_ids=doc_ids
+            )
+            if retrieved_docs:
+                metadata["routing"] = "intent"
+                logger.info(f"Routed query to {len(doc_ids)} documents mapped to {intent}")
+                return retrieved_docs
+        
+        metadata["routing"] = "search"
+        return self.kb.search(user_query, top_k=TOP_K_RESULTS, mode=self.retrieval_mode)
+    
     def _detect_category(self, query: str) -> str:
         """
         Detect the category of the query
@@ -176,22 +466,27 @@ class RAGEngine:
         Returns:
             Category name
         """
-        query_lower = query.lower()
+        matches = self.matcher.scan(query)
         
-        for category, info in KB_CATEGORIES.items():
-            for keyword in info["keywords"]:
-                if keyword in query_lower:
-                    return category
+        for category in KB_CATEGORIES:
+            if f"category:{category}" in matches:
+                return category
         
         return "support"  # default category
     
-    def _generate_answer(self, user_query: str, context_docs: List[Dict[str, Any]]) -> str:
+    def _generate_answer(
+        self,
+        user_query: str,
+        context_docs: List[Dict[str, Any]],
+        priority: int = PRIORITY_NORMAL
+    ) -> str:
         """
         Generate answer using LLM with context from retrieved documents
         
         Args:
             user_query: Original user question
             context_docs: Retrieved context documents
+            priority: Admission priority of the LLM call
             
         Returns:
             Generated answer
@@ -207,24 +502,51 @@ class RAGEngine:
             prompt=prompt,
             stream=False,
             temperature=0.3,  # Lower temperature for factual answers
-            top_p=0.9
+            top_p=0.9,
+            num_ctx=self.packer.num_ctx(SYSTEM_PROMPT, prompt),
+            cache_version=self.kb.version,
+            priority=priority,
+            system=SYSTEM_PROMPT
         )
         
         return response
     
+    def _stream_answer(
+        self,
+        user_query: str,
+        context_docs: List[Dict[str, Any]],
+        priority: int = PRIORITY_NORMAL
+    ) -> Iterator[str]:
+        """Stream an answer from the LLM, yielding text deltas as they arrive"""
+        prompt = self._create_prompt(user_query, self._build_context(context_docs))
+        return self.llm.stream_generate(
+            prompt=prompt,
+            temperature=0.3,  # Lower temperature for factual answers
+            top_p=0.9,
+            num_ctx=self.packer.num_ctx(SYSTEM_PROMPT, prompt),
+            cache_version=self.kb.version,
+            priority=priority,
+            system=SYSTEM_PROMPT
+        )
+    
     def _build_context(self, docs: List[Dict[str, Any]]) -> str:
-        """Build context string from documents"""
-        context_parts = []
-        for i, doc in enumerate(docs, 1):
-            context_parts.append(f"Source {i}: {doc.get('title', 'Unknown')}")
-            context_parts.append(doc.get('content', ''))
-            context_parts.append("---")
-        
-        return "\n".join(context_parts)
+        """
+        Build context string from retrieved chunks
+        
+        Chunks from the same parent document are grouped under one source,
+        in document order, so the prompt only carries the relevant passages.
+        The most relevant chunks are kept within the packer's token budget
+        and repeated passages are dropped (see ContextPacker).
+        """
+        context, _ = self.packer.pack(docs)
+        return context
     
     def _create_prompt(self, user_query: str, context: str) -> str:
         """
-        Create a structured prompt for the LLM
+        Create the user message for the LLM
+        
+        The fixed instructions are sent separately as SYSTEM_PROMPT, so
+        this holds only the parts that change between requests.
         
         Args:
             user_query: User's question
@@ -233,13 +555,7 @@ class RAGEngine:
         Returns:
             Formatted prompt
         """
-        prompt = f"""You are a helpful SquareTrade customer support assistant. Answer the user's question based ONLY on the provided knowledge base content below. 
-
-If the answer is not in the knowledge base, politely explain that you don't have that information.
-
-Do not provide information outside of SquareTrade plans, claims, and support topics.
-
-Knowledge Base Content:
+        prompt = f"""Knowledge Base Content:
 {context}
 
 User Question: {user_query}
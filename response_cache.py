@@ -0,0 +1,207 @@
+"""
+Cache of LLM responses keyed by model, prompt and sampling options
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_SQLITE_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, prompt: Any, options: Dict[str, Any], version: str = "") -> str:
+    """
+    Hash identifying one generation request
+
+    Args:
+        model: Model name
+        prompt: Full prompt text or list of chat messages
+        options: Sampling options sent to Ollama
+        version: Extra invalidation tag, e.g. the knowledge base version
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    material = json.dumps([model, prompt, options, version], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache
+
+    The memory tier is an LRU bounded by entry count and total bytes, with a
+    TTL per entry. The optional SQLite tier is shared by every worker that
+    points at the same file; memory misses fall through to it and hits are
+    promoted back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        sqlite_path: Path = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum entries kept in memory
+            max_bytes: Maximum total size of cached responses in memory
+            ttl: Seconds an entry stays valid (0 disables expiry)
+            sqlite_path: SQLite file for the shared tier (None disables it)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0, "misses": 0, "memory_hits": 0, "sqlite_hits": 0,
+            "stores": 0, "evictions": 0, "expirations": 0
+        }
+        self._db = None
+        if sqlite_path:
+            self._open_sqlite(Path(sqlite_path))
+
+    def _open_sqlite(self, path: Path) -> None:
+        """Open (and create) the shared SQLite tier"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            logger.info(f"Response cache SQLite tier at {path}")
+        except Exception as e:
+            logger.error(f"Could not open response cache database {path}: {e}")
+            self._db = None
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl if self.ttl > 0 else 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at and expires_at < now:
+                    self._remove(key)
+                    self._counters["expirations"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+
+            row = self._sqlite_get(key, now)
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            value, expires_at = row
+            self._counters["hits"] += 1
+            self._counters["sqlite_hits"] += 1
+            self._store(key, value, expires_at)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        """Store a response in every tier"""
+        expires_at = self._expiry()
+        with self._lock:
+            self._counters["stores"] += 1
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at)
+                    )
+                except Exception as e:
+                    logger.error(f"Error writing response cache database: {e}")
+
+    def _sqlite_get(self, key: str, now: float) -> Optional[tuple]:
+        """(value, expires_at) from the SQLite tier, or None (lock held)"""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at and expires_at < now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._counters["expirations"] += 1
+                return None
+            return value, expires_at
+        except Exception as e:
+            logger.error(f"Error reading response cache database: {e}")
+            return None
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        """Insert into the memory tier and evict down to the limits (lock held)"""
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value.encode('utf-8'))
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "sqlite": self._db is not None
+            }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache built from config (None when disabled)"""
+    global _shared_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache(sqlite_path=RESPONSE_CACHE_SQLITE_PATH or None)
+    return _shared_cache
@@ -0,0 +1,257 @@
+"""
+Inverted index over knowledge base documents for fast keyword retrieval
+"""
+
+import re
+import math
+import heapq
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple, Iterable, Optional, Set
+from config import BM25F_K1, BM25F_FIELD_WEIGHTS, BM25F_FIELD_B, BM25F_MIN_RELATIVE_SCORE
+
+# Document fields that are tokenized into the index
+INDEXED_FIELDS = ("title", "content", "keywords")
+
+# Query words that carry no topical signal for BM25F ranking
+STOP_WORDS = frozenset([
+    "a", "about", "am", "an", "and", "are", "as", "at", "be", "by", "can", "could", "do",
+    "doe", "for", "from", "get", "have", "how", "i", "if", "in", "is", "it", "me", "my",
+    "need", "of", "on", "or", "our", "please", "should", "that", "the", "thi", "to",
+    "want", "was", "what", "when", "where", "which", "who", "why", "will", "with",
+    "would", "you", "your"
+])
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_token(token: str) -> str:
+    """
+    Normalize a single lowercase token
+    
+    Strips a simple plural suffix so that "plans" and "plan" share a posting,
+    which keeps the recall the old substring matching had.
+    """
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into normalized index tokens
+    
+    Args:
+        text: Raw text
+    
+    Returns:
+        List of tokens in order of appearance
+    """
+    return [normalize_token(t) for t in _TOKEN_RE.findall(text.lower())]
+
+
+def field_tokens(doc: Dict[str, Any], field: str) -> List[str]:
+    """Tokenize one field of a document (keywords are a list of phrases)"""
+    value = doc.get(field) or ''
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(str(v) for v in value)
+    return tokenize(str(value))
+
+
+class InvertedIndex:
+    """
+    Token -> posting list index over title, content and keywords
+    
+    Each posting maps a document position to its per-field term frequencies,
+    so a query only touches documents that share at least one token with it.
+    """
+    
+    def __init__(self, documents: Iterable[Dict[str, Any]] = ()):
+        """
+        Initialize the index
+        
+        Args:
+            documents: Documents to index, in knowledge base order
+        """
+        self.documents: List[Dict[str, Any]] = []
+        self.postings: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        self.field_lengths: List[List[int]] = []
+        self.field_weights = [BM25F_FIELD_WEIGHTS.get(f, 1.0) for f in INDEXED_FIELDS]
+        self.field_b = [BM25F_FIELD_B.get(f, 0.75) for f in INDEXED_FIELDS]
+        self.k1 = BM25F_K1
+        self.idf: Dict[str, float] = {}
+        self._length_norms: List[List[float]] = []
+        self._stats_dirty = True
+        for doc in documents:
+            self.add(doc)
+        self._compute_statistics()
+    
+    def __len__(self) -> int:
+        return len(self.documents)
+    
+    def add(self, doc: Dict[str, Any]) -> int:
+        """
+        Index a single document
+        
+        Args:
+            doc: Document dict
+        
+        Returns:
+            Position of the document in the index
+        """
+        doc_idx = len(self.documents)
+        self.documents.append(doc)
+        lengths = [0] * len(INDEXED_FIELDS)
+        self.field_lengths.append(lengths)
+        self._stats_dirty = True
+        
+        for field_pos, field in enumerate(INDEXED_FIELDS):
+            tokens = field_tokens(doc, field)
+            lengths[field_pos] = len(tokens)
+            for token in tokens:
+                tfs = self.postings[token].get(doc_idx)
+                if tfs is None:
+                    tfs = [0] * len(INDEXED_FIELDS)
+                    self.postings[token][doc_idx] = tfs
+                tfs[field_pos] += 1
+        
+        return doc_idx
+    
+    def _compute_statistics(self) -> None:
+        """Precompute IDF table and per-document field length norms for BM25F"""
+        num_docs = len(self.documents)
+        self.idf = {
+            token: math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for token, posting in self.postings.items()
+        }
+        
+        avg_lengths = [
+            (sum(lengths[pos] for lengths in self.field_lengths) / num_docs) if num_docs else 0.0
+            for pos in range(len(INDEXED_FIELDS))
+        ]
+        self._length_norms = [
+            [
+                (1 - b) + b * (lengths[pos] / avg_lengths[pos]) if avg_lengths[pos] else 1.0
+                for pos, b in enumerate(self.field_b)
+            ]
+            for lengths in self.field_lengths
+        ]
+        self._stats_dirty = False
+    
+    def _unseen_idf(self) -> float:
+        """IDF of a term that appears in no document"""
+        return math.log(1 + (len(self.documents) + 0.5) / 0.5)
+    
+    def get_postings(self, token: str) -> Dict[int, List[int]]:
+        """Get posting list (doc position -> field term frequencies) for a token"""
+        return self.postings.get(token, {})
+    
+    def _matching_postings(
+        self,
+        token: str,
+        restrict_to: Optional[Set[int]]
+    ) -> Iterable[Tuple[int, List[int]]]:
+        """
+        (doc position, field term frequencies) pairs of a token's posting list
+        
+        With restrict_to only those documents are returned, walking whichever
+        of the posting list and the restricted set is smaller, so a search
+        narrowed to a few documents does not visit every posting of common terms.
+        """
+        postings = self.get_postings(token)
+        if restrict_to is None:
+            return postings.items()
+        if len(restrict_to) < len(postings):
+            return ((doc_idx, postings[doc_idx]) for doc_idx in restrict_to if doc_idx in postings)
+        return ((doc_idx, tfs) for doc_idx, tfs in postings.items() if doc_idx in restrict_to)
+    
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 3,
+        restrict_to: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Score documents with the keyword heuristic
+        
+        A query term found in the title or content adds 2 points and a term
+        found in the keywords adds 3 points, as the original linear scan did.
+        
+        Args:
+            query: Search query
+            top_k: Number of results to return
+            restrict_to: Only score these doc positions (None scores all)
+        
+        Returns:
+            List of (doc position, score) sorted by descending score
+        """
+        scores: Dict[int, float] = defaultdict(int)
+        for term in tokenize(query):
+            for doc_idx, (title_tf, content_tf, keyword_tf) in self._matching_postings(term, restrict_to):
+                if title_tf or content_tf:
+                    scores[doc_idx] += 2
+                if keyword_tf:
+                    scores[doc_idx] += 3
+        
+        return self.top_k(scores, top_k)
+    
+    def bm25f_search(
+        self,
+        query: str,
+        top_k: int = 3,
+        restrict_to: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Score documents with BM25F over the weighted title, content and keyword fields
+        
+        Scores are normalised to a 0-10 scale: 10 means every informative query
+        term matched with saturated term frequency. Stop words are ignored and
+        unknown terms count against the score, so weak matches stay low.
+        Results far below the best hit are dropped so they do not dilute the
+        average relevance used for confidence.
+        
+        Args:
+            query: Search query
+            top_k: Number of results to return
+            restrict_to: Only score these doc positions (None scores all)
+        
+        Returns:
+            List of (doc position, score) sorted by descending score
+        """
+        if self._stats_dirty:
+            self._compute_statistics()
+        
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t not in STOP_WORDS]
+        if not terms:
+            return []
+        
+        k1 = self.k1
+        max_score = 0.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                max_score += self._unseen_idf() * (k1 + 1)
+                continue
+            max_score += idf * (k1 + 1)
+            for doc_idx, tfs in self._matching_postings(term, restrict_to):
+                norms = self._length_norms[doc_idx]
+                weighted_tf = sum(
+                    weight * tf / norm
+                    for weight, tf, norm in zip(self.field_weights, tfs, norms)
+                    if tf
+                )
+                scores[doc_idx] += idf * weighted_tf * (k1 + 1) / (k1 + weighted_tf)
+        
+        hits = self.top_k(scores, top_k)
+        if not hits:
+            return []
+        
+        floor = hits[0][1] * BM25F_MIN_RELATIVE_SCORE
+        scale = 10.0 / max_score
+        return [(doc_idx, round(score * scale, 4)) for doc_idx, score in hits if score >= floor]
+    
+    @staticmethod
+    def top_k(scores: Dict[int, float], top_k: int) -> List[Tuple[int, float]]:
+        """Select the best scoring documents, ties broken by document order"""
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(doc_idx, score) for doc_idx, score in best if score > 0]
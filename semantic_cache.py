@@ -0,0 +1,230 @@
+"""
+Semantic answer cache for near-duplicate questions
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, Sequence
+from config import (
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_AUDIT_RATE, SEMANTIC_CACHE_AUDIT_PATH
+)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for semantic retrieval
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Answers keyed by query embedding, detected intent and KB version
+    
+    A lookup returns the stored answer of the most similar cached question
+    when its cosine similarity reaches the threshold, the intent matches and
+    it was answered from the same knowledge base version. Embeddings live in
+    a preallocated float32 matrix with one row per slot, so a lookup is a
+    single matrix-vector product; the least recently used slot is reused
+    once the cache is full.
+    
+    With audit_rate > 0 a sample of hits is appended to a JSONL file
+    (cached question, new question, similarity, answer) so false hits can be
+    reviewed offline and the threshold tuned.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        audit_rate: float = SEMANTIC_CACHE_AUDIT_RATE,
+        audit_path: Path = SEMANTIC_CACHE_AUDIT_PATH
+    ):
+        """
+        Initialize an empty cache
+        
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum cached answers
+            ttl: Seconds an answer stays valid (0 disables expiry)
+            audit_rate: Fraction of hits written to the audit log
+            audit_path: JSONL file receiving audited hits
+        """
+        if np is None:
+            raise ImportError("numpy is required for the semantic cache")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self.audit_path = Path(audit_path)
+        self.dim: Optional[int] = None
+        self._matrix = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._groups = np.full(max_entries, -1, dtype=np.int64)
+        self._group_ids: Dict[tuple, int] = {}
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "audited": 0}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _normalize(self, vector: Sequence[float]) -> Optional["np.ndarray"]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0 or (self.dim is not None and vector.shape != (self.dim,)):
+            return None
+        return vector / norm
+    
+    def _group(self, intent: Optional[str], version: str) -> int:
+        """Integer id for an (intent, KB version) pair (lock held)"""
+        return self._group_ids.setdefault((intent, version), len(self._group_ids))
+    
+    def lookup(
+        self,
+        query: str,
+        vector: Sequence[float],
+        intent: Optional[str],
+        version: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the cached answer for a near-duplicate question
+        
+        Args:
+            query: Incoming question (used for auditing)
+            vector: Its embedding
+            intent: Detected intent
+            version: Knowledge base version
+        
+        Returns:
+            Dict with query, response, metadata and similarity, or None
+        """
+        with self._lock:
+            query_vector = self._normalize(vector) if self._matrix is not None else None
+            group = self._group_ids.get((intent, version))
+            if query_vector is None or group is None:
+                self._counters["misses"] += 1
+                return None
+            
+            candidates = self._valid & (self._groups == group)
+            if not candidates.any():
+                self._counters["misses"] += 1
+                return None
+            scores = np.where(candidates, self._matrix @ query_vector, -1.0)
+            slot = int(np.argmax(scores))
+            similarity = float(scores[slot])
+            if similarity < self.threshold:
+                self._counters["misses"] += 1
+                return None
+            
+            entry = self._entries[slot]
+            if entry["expires_at"] and entry["expires_at"] < time.time():
+                self._free(slot)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            
+            self._lru.move_to_end(slot)
+            self._counters["hits"] += 1
+            hit = {
+                "query": entry["query"],
+                "response": entry["response"],
+                "metadata": entry["metadata"],
+                "similarity": similarity
+            }
+        
+        if self.audit_rate > 0 and random.random() < self.audit_rate:
+            self._audit(query, intent, hit)
+        return hit
+    
+    def add(
+        self,
+        query: str,
+        vector: Sequence[float],
+        intent: Optional[str],
+        response: str,
+        metadata: Dict[str, Any],
+        version: str = ""
+    ) -> None:
+        """
+        Cache an answer
+        
+        Args:
+            query: Answered question
+            vector: Its embedding
+            intent: Detected intent
+            response: Answer text
+            metadata: Metadata returned with the answer
+            version: Knowledge base version
+        """
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vector)
+                self._matrix = np.zeros((self.max_entries, self.dim), dtype=np.float32)
+            row = self._normalize(vector)
+            if row is None:
+                logger.warning("Skipping semantic cache entry with an empty or mismatched embedding")
+                return
+            
+            if len(self._entries) < self.max_entries:
+                slot = int(np.argmin(self._valid))
+            else:
+                slot = next(iter(self._lru))
+                self._free(slot)
+                self._counters["evictions"] += 1
+            
+            self._matrix[slot] = row
+            self._valid[slot] = True
+            self._groups[slot] = self._group(intent, version)
+            self._entries[slot] = {
+                "query": query,
+                "response": response,
+                "metadata": metadata,
+                "expires_at": time.time() + self.ttl if self.ttl > 0 else 0.0
+            }
+            self._lru[slot] = None
+            self._counters["stores"] += 1
+    
+    def _free(self, slot: int) -> None:
+        """Release a slot (lock held)"""
+        self._valid[slot] = False
+        self._entries.pop(slot, None)
+        self._lru.pop(slot, None)
+    
+    def _audit(self, query: str, intent: Optional[str], hit: Dict[str, Any]) -> None:
+        """Append a sampled hit to the audit log"""
+        record = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "query": query,
+            "cached_query": hit["query"],
+            "intent": intent,
+            "similarity": round(hit["similarity"], 4),
+            "response": hit["response"]
+        }
+        try:
+            self.audit_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock, open(self.audit_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._counters["audited"] += 1
+        except Exception as e:
+            logger.error(f"Error writing semantic cache audit log: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold
+            }
@@ -0,0 +1,419 @@
+"""
+Request coalescing: concurrent identical calls share one upstream call
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterator, AsyncIterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class _Call:
+    """A call in flight and the callers waiting on it"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key (thread-safe)
+    
+    The first caller for a key runs the call; callers arriving while it is
+    in flight wait and receive the same result (or exception). Streams are
+    shared the same way: every subscriber replays the deltas produced so far
+    and then follows the single upstream stream. Nothing is kept once a call
+    finishes, so this is not a cache.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, "StreamFanout"] = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "coalesced": 0}
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for the identical call already in flight
+        
+        Args:
+            key: Identity of the call
+            fn: Function performing the call
+        
+        Returns:
+            Result of the (shared) call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters["calls"] += 1
+            else:
+                self._counters["coalesced"] += 1
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def stream(self, key: str, open_stream: Callable[[], Iterator[str]]) -> "SharedStream":
+        """
+        Subscribe to the identical stream in flight, or start a new one
+        
+        Args:
+            key: Identity of the stream
+            open_stream: Function returning the upstream iterator (called lazily,
+                on the first read)
+        
+        Returns:
+            SharedStream for this caller
+        """
+        with self._lock:
+            fanout = self._streams.get(key)
+            subscriber = fanout.subscribe() if fanout is not None else None
+            if subscriber is None:
+                fanout = StreamFanout(open_stream, on_finish=lambda: self._forget(key, fanout))
+                self._streams[key] = fanout
+                subscriber = fanout.subscribe()
+                self._counters["calls"] += 1
+            else:
+                self._counters["coalesced"] += 1
+        return subscriber
+    
+    def _forget(self, key: str, fanout: "StreamFanout") -> None:
+        with self._lock:
+            if self._streams.get(key) is fanout:
+                del self._streams[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls, coalesced callers and calls in flight"""
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._calls) + len(self._streams)}
+
+
+class StreamFanout:
+    """
+    One upstream iterator read by several subscribers
+    
+    Deltas are buffered so late subscribers can replay them. Whichever
+    subscriber runs out of buffered deltas pulls the next one from upstream;
+    the others wait for it. If every subscriber closes before the end, the
+    upstream is closed too. An exception raised by the upstream is re-raised
+    to every subscriber after the deltas produced before it.
+    """
+    
+    def __init__(self, open_stream: Callable[[], Iterator[str]], on_finish: Callable[[], None] = None):
+        self._open = open_stream
+        self._on_finish = on_finish
+        self.upstream: Optional[Iterator[str]] = None
+        self.failure: Optional[Exception] = None
+        self._buffer: List[str] = []
+        self._finished = False
+        self._subscribers = 0
+        self._lock = threading.Lock()
+        self._pump_lock = threading.Lock()
+    
+    def subscribe(self) -> Optional["SharedStream"]:
+        """New subscriber, or None once the stream has finished"""
+        with self._lock:
+            if self._finished:
+                return None
+            self._subscribers += 1
+        return SharedStream(self)
+    
+    def _get(self, index: int) -> Any:
+        """Delta at index, pulling from upstream when needed (_END when exhausted)"""
+        while True:
+            if index < len(self._buffer):
+                return self._buffer[index]
+            if self._finished:
+                return _END
+            with self._pump_lock:
+                if index < len(self._buffer) or self._finished:
+                    continue
+                try:
+                    if self.upstream is None:
+                        self.upstream = self._open()
+                    self._buffer.append(next(self.upstream))
+                except StopIteration:
+                    self._finish()
+                except Exception as e:
+                    logger.error(f"Error reading shared stream: {e}")
+                    self.failure = e
+                    self._finish()
+    
+    def _unsubscribe(self) -> None:
+        with self._lock:
+            self._subscribers -= 1
+            abandon = self._subscribers == 0 and not self._finished
+        if abandon:
+            close = getattr(self.upstream, 'close', None)
+            if close is not None:
+                close()
+            self._finish()
+    
+    def _finish(self) -> None:
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        if self._on_finish is not None:
+            self._on_finish()
+
+
+class SharedStream:
+    """
+    A subscriber's view of a StreamFanout
+    
+    Iterates over every delta from the start. stats and error come from the
+    upstream stream (e.g. ChatStream) once it has produced them.
+    """
+    
+    def __init__(self, fanout: StreamFanout):
+        self._fanout = fanout
+        self._index = 0
+        self._closed = False
+        self.text = ""
+    
+    def __iter__(self) -> Iterator[str]:
+        return self
+    
+    def __next__(self) -> str:
+        if self._closed:
+            raise StopIteration
+        delta = self._fanout._get(self._index)
+        if delta is _END:
+            self.close()
+            if self._fanout.failure is not None:
+                raise self._fanout.failure
+            raise StopIteration
+        self._index += 1
+        self.text += delta
+        return delta
+    
+    def __enter__(self) -> "SharedStream":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return getattr(self._fanout.upstream, 'stats', {})
+    
+    @property
+    def error(self) -> Optional[Exception]:
+        return getattr(self._fanout.upstream, 'error', None)
+    
+    @property
+    def done(self) -> bool:
+        """Whether the final stats frame was received"""
+        return bool(self.stats.get('done'))
+    
+    def close(self) -> None:
+        """Stop following the stream"""
+        if not self._closed:
+            self._closed = True
+            self._fanout._unsubscribe()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls that share a key
+    
+    The shared call runs as a task, so a caller that is cancelled does not
+    cancel it for the others. Streams are read by a single pump task and
+    fanned out to every subscriber.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, "AsyncStreamFanout"] = {}
+        self._counters = {"calls": 0, "coalesced": 0}
+    
+    async def do(self, key: str, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await coro_fn(), or the identical call already in flight
+        
+        Args:
+            key: Identity of the call
+            coro_fn: Function returning the coroutine performing the call
+        
+        Returns:
+            Result of the (shared) call
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self._counters["calls"] += 1
+        else:
+            self._counters["coalesced"] += 1
+        return await asyncio.shield(task)
+    
+    def stream(self, key: str, open_stream: Callable[[], AsyncIterator[str]]) -> "AsyncSharedStream":
+        """
+        Subscribe to the identical stream in flight, or start a new one
+        
+        Args:
+            key: Identity of the stream
+            open_stream: Function returning the upstream async iterator
+        
+        Returns:
+            AsyncSharedStream for this caller
+        """
+        fanout = self._streams.get(key)
+        subscriber = fanout.subscribe() if fanout is not None else None
+        if subscriber is None:
+            fanout = AsyncStreamFanout(open_stream(), on_finish=lambda: self._forget(key, fanout))
+            self._streams[key] = fanout
+            subscriber = fanout.subscribe()
+            self._counters["calls"] += 1
+        else:
+            self._counters["coalesced"] += 1
+        return subscriber
+    
+    def _forget(self, key: str, fanout: "AsyncStreamFanout") -> None:
+        if self._streams.get(key) is fanout:
+            del self._streams[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls, coalesced callers and calls in flight"""
+        return {**self._counters, "in_flight": len(self._tasks) + len(self._streams)}
+
+
+class AsyncStreamFanout:
+    """
+    One upstream async iterator read by a pump task and shared by subscribers
+    
+    The pump starts with the first read; it is cancelled if every
+    subscriber closes before the end. An exception raised by the upstream is
+    re-raised to every subscriber after the deltas produced before it.
+    """
+    
+    def __init__(self, upstream: AsyncIterator[str], on_finish: Callable[[], None] = None):
+        self.upstream = upstream
+        self.failure: Optional[Exception] = None
+        self._on_finish = on_finish
+        self._buffer: List[str] = []
+        self._finished = False
+        self._subscribers = 0
+        self._changed = asyncio.Condition()
+        self._pump: Optional[asyncio.Task] = None
+    
+    def subscribe(self) -> Optional["AsyncSharedStream"]:
+        """New subscriber, or None once the stream has finished"""
+        if self._finished:
+            return None
+        self._subscribers += 1
+        return AsyncSharedStream(self)
+    
+    async def _run(self) -> None:
+        try:
+            async for delta in self.upstream:
+                async with self._changed:
+                    self._buffer.append(delta)
+                    self._changed.notify_all()
+        except Exception as e:
+            logger.error(f"Error reading shared stream: {e}")
+            self.failure = e
+        finally:
+            await self._finish()
+    
+    async def _get(self, index: int) -> Any:
+        """Delta at index, waiting for the pump when needed (_END when exhausted)"""
+        if self._pump is None and not self._finished:
+            self._pump = asyncio.ensure_future(self._run())
+        async with self._changed:
+            await self._changed.wait_for(lambda: index < len(self._buffer) or self._finished)
+        return self._buffer[index] if index < len(self._buffer) else _END
+    
+    async def _unsubscribe(self) -> None:
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self._finished:
+            if self._pump is not None:
+                self._pump.cancel()
+            aclose = getattr(self.upstream, 'aclose', None)
+            if aclose is not None and self._pump is None:
+                await aclose()
+            await self._finish()
+    
+    async def _finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        if self._on_finish is not None:
+            self._on_finish()
+        async with self._changed:
+            self._changed.notify_all()
+
+
+class AsyncSharedStream:
+    """A subscriber's view of an AsyncStreamFanout (mirrors SharedStream)"""
+    
+    def __init__(self, fanout: AsyncStreamFanout):
+        self._fanout = fanout
+        self._index = 0
+        self._closed = False
+        self.text = ""
+    
+    def __aiter__(self) -> "AsyncSharedStream":
+        return self
+    
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        delta = await self._fanout._get(self._index)
+        if delta is _END:
+            await self.aclose()
+            if self._fanout.failure is not None:
+                raise self._fanout.failure
+            raise StopAsyncIteration
+        self._index += 1
+        self.text += delta
+        return delta
+    
+    async def __aenter__(self) -> "AsyncSharedStream":
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return getattr(self._fanout.upstream, 'stats', {})
+    
+    @property
+    def error(self) -> Optional[Exception]:
+        return getattr(self._fanout.upstream, 'error', None)
+    
+    @property
+    def done(self) -> bool:
+        """Whether the final stats frame was received"""
+        return bool(self.stats.get('done'))
+    
+    async def aclose(self) -> None:
+        """Stop following the stream"""
+        if not self._closed:
+            self._closed = True
+            await self._fanout._unsubscribe()
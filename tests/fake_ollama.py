@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for the Ollama HTTP API, used by unit tests and benchmarks
+
+Serves /api/tags, /api/chat (plain and NDJSON streaming), /api/embed (batched)
+and /api/embeddings over HTTP/1.1 keep-alive, and counts accepted TCP connections so tests can
+check that clients reuse them. Chat calls mimic Ollama's prompt cache: only the part of the
+prompt that differs from the previous call is evaluated (and reported in prompt_eval_count),
+unless keep_alive 0 unloaded the model.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _embed(text):
+    """Deterministic toy embedding: length, word count and a constant"""
+    return [float(len(text)), float(text.count(" ") + 1), 1.0]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+    
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name} for name in self.server.models]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+    
+    def do_POST(self):
+        with self.server.lock:
+            self.server.requests += 1
+        payload = self._read_json()
+        with self.server.lock:
+            self.server.posts.append((self.path, payload))
+        if self.server.delay and self.server.serial:
+            with self.server.runner:
+                time.sleep(self.server.delay)
+        elif self.server.delay:
+            time.sleep(self.server.delay)
+        if self.path == "/api/chat":
+            self._chat(payload)
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": _embed(payload.get("prompt", ""))})
+        elif self.path == "/api/embed" and self.server.legacy_embeddings:
+            body = b"404 page not found"
+            self.send_response(404)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/embed":
+            texts = payload.get("input", "")
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send_json({"model": payload.get("model"), "embeddings": [_embed(t) for t in texts]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+    
+    def _prefill(self, payload):
+        """Evaluate the prompt past the prefix cached by the previous call; returns timing stats"""
+        prompt = "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in payload.get("messages", []))
+        with self.server.lock:
+            cached = self.server.cached_prompt
+            self.server.cached_prompt = "" if payload.get("keep_alive") in (0, "0", "0s") else prompt
+        reused = 0
+        for a, b in zip(cached, prompt):
+            if a != b:
+                break
+            reused += 1
+        evaluated = -(-(len(prompt) - reused) // 4) or 1  # ~4 characters per token, at least one
+        started = time.perf_counter()
+        if self.server.prefill_delay:
+            time.sleep(self.server.prefill_delay * evaluated)
+        return {
+            "load_duration": 0 if cached else 1000,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int((time.perf_counter() - started) * 1e9)
+        }
+    
+    def _chat(self, payload):
+        tokens = self.server.reply_tokens
+        stats = {"done": True, "eval_count": len(tokens), "total_duration": 1000, **self._prefill(payload)}
+        if not payload.get("stream", True):
+            self._send_json({"message": {"role": "assistant", "content": "".join(tokens)}, **stats})
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        frames = [{"message": {"role": "assistant", "content": t}, "done": False} for t in tokens]
+        frames.append({"message": {"role": "assistant", "content": ""}, **stats})
+        if self.server.stream_error:
+            frames = [{"error": self.server.stream_error}]
+        for frame in frames:
+            line = json.dumps(frame).encode('utf-8') + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded fake Ollama server on an ephemeral localhost port"""
+    
+    daemon_threads = True
+    
+    def __init__(
+        self,
+        reply_tokens=("Hello", " there", "!"),
+        models=("gemma:2b",),
+        delay=0.0,
+        token_delay=0.0,
+        legacy_embeddings=False,
+        serial=False,
+        prefill_delay=0.0,
+        stream_error=None
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.reply_tokens = list(reply_tokens)
+        self.models = list(models)
+        self.delay = delay
+        self.token_delay = token_delay
+        self.legacy_embeddings = legacy_embeddings  # Answer /api/embed with 404, like older Ollama
+        self.serial = serial  # Process one request's delay at a time, like a single model runner
+        self.prefill_delay = prefill_delay  # seconds per evaluated prompt token
+        self.stream_error = stream_error  # Answer streaming chat calls with this error frame
+        self.cached_prompt = ""  # prompt of the previous chat call (the simulated KV cache)
+        self.runner = threading.Lock()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.posts = []  # (path, payload) of every POST
+        self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,47 @@
+"""
+Shared pytest fixtures for unit tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import response_cache
+import model_registry
+import circuit_breaker
+import admission
+import backend_pool
+
+
+@pytest.fixture(autouse=True)
+def isolated_response_cache(monkeypatch):
+    """Give every test its own process-wide response cache"""
+    monkeypatch.setattr(response_cache, "_shared_cache", None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_registries(monkeypatch):
+    """Forget cached /api/tags answers (test servers may reuse ports)"""
+    monkeypatch.setattr(model_registry, "_registries", {})
+
+
+@pytest.fixture(autouse=True)
+def isolated_circuit_breakers(monkeypatch):
+    """Start every test with closed circuits (failures in one test must not open another's)"""
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+
+@pytest.fixture(autouse=True)
+def isolated_admission_controllers(monkeypatch):
+    """Start every test with free admission slots"""
+    monkeypatch.setattr(admission, "_controllers", {})
+
+
+@pytest.fixture(autouse=True)
+def isolated_backend_pools(monkeypatch):
+    """Start every test with idle backends and no latency history"""
+    monkeypatch.setattr(backend_pool, "_pools", {})
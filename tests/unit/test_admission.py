@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Unit tests for LLM admission control
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import web_widget
+from admission import AdmissionController, AdmissionRejected, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from async_llm_client import AsyncOllamaClient
+from chat_agent import SquareTradeAgent
+from data_loader import KnowledgeBase
+from escalation_handler import EscalationHandler
+from llm_client import OllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+
+def _wait_for_queue(controller, depth):
+    for _ in range(200):
+        if controller.stats()["queue_depth"] == depth:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"queue never reached {depth}")
+
+
+def test_limits_concurrent_calls():
+    """No more than max_inflight callers hold a slot at once"""
+    controller = AdmissionController(max_inflight=2, max_queue=10, queue_timeout=5)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    
+    def call():
+        release = controller.acquire()
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        release()
+    
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = controller.stats()
+    assert peak[0] == 2
+    assert stats["admitted"] == 6 and stats["inflight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_freed_slots_go_to_highest_priority_first():
+    """Waiters are admitted by priority, then arrival"""
+    controller = AdmissionController(max_inflight=1, max_queue=10, queue_timeout=5)
+    release = controller.acquire()
+    order = []
+    
+    def call(priority):
+        controller.acquire(priority)()
+        order.append(priority)
+    
+    threads = []
+    for depth, priority in enumerate([PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH], 1):
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        _wait_for_queue(controller, depth)
+    assert controller.stats()["queued_by_priority"] == {"high": 1, "normal": 1, "low": 1}
+    
+    release()
+    for t in threads:
+        t.join()
+    assert order == [PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW]
+
+
+def test_full_queue_sheds_with_retry_after():
+    """A full queue rejects at once; a higher-priority call displaces a low one"""
+    controller = AdmissionController(max_inflight=1, max_queue=1, queue_timeout=5)
+    release = controller.acquire()
+    outcome = {}
+    
+    def bulk():
+        try:
+            controller.acquire(PRIORITY_LOW)()
+            outcome["bulk"] = "admitted"
+        except AdmissionRejected as e:
+            outcome["bulk"] = e
+    
+    waiter = threading.Thread(target=bulk)
+    waiter.start()
+    _wait_for_queue(controller, 1)
+    
+    start = time.perf_counter()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(PRIORITY_LOW)
+    assert time.perf_counter() - start < 0.1
+    assert rejected.value.retry_after >= 1
+    
+    high = threading.Thread(target=lambda: controller.acquire(PRIORITY_HIGH)())
+    high.start()
+    waiter.join(timeout=1)
+    assert isinstance(outcome["bulk"], AdmissionRejected)
+    release()
+    high.join(timeout=1)
+    assert controller.stats()["rejected"] == 2 and controller.stats()["inflight"] == 0
+
+
+def test_wait_times_out():
+    """A waiter not admitted within queue_timeout is rejected"""
+    controller = AdmissionController(max_inflight=1, max_queue=5, queue_timeout=0.05)
+    release = controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire()
+    stats = controller.stats()
+    assert stats["timed_out"] == 1 and stats["queue_depth"] == 0
+    release()
+    controller.acquire()()
+
+
+def test_async_callers_share_slots_with_threads():
+    """An asyncio waiter is woken when a thread releases its slot"""
+    controller = AdmissionController(max_inflight=1, max_queue=5, queue_timeout=5)
+    release = controller.acquire()
+    
+    async def run():
+        waiting = asyncio.ensure_future(controller.acquire_async(PRIORITY_HIGH))
+        await asyncio.sleep(0.02)
+        assert not waiting.done()
+        threading.Timer(0.02, release).start()
+        (await waiting)()
+    
+    asyncio.run(run())
+    stats = controller.stats()
+    assert stats["admitted"] == 2 and stats["inflight"] == 0 and stats["p95_wait_ms"] > 0
+
+
+def test_clients_shed_without_calling_ollama():
+    """A saturated controller raises before any request is sent"""
+    with FakeOllamaServer() as server:
+        controller = AdmissionController(max_inflight=1, max_queue=0, queue_timeout=1)
+        release = controller.acquire()
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", admission=controller)
+        with pytest.raises(AdmissionRejected):
+            client.generate("Hello")
+        with pytest.raises(AdmissionRejected):
+            "".join(client.stream_generate("Hello", cache_version="v2"))
+        
+        async def run():
+            async_client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", admission=controller)
+            with pytest.raises(AdmissionRejected):
+                await async_client.generate("Hello")
+            with pytest.raises(AdmissionRejected):
+                async for _ in await async_client.stream_generate("Hello"):
+                    pass
+        
+        asyncio.run(run())
+        assert server.posts == []
+        release()
+        assert client.generate("Hello") == "Hello there!"
+        assert controller.stats()["inflight"] == 0
+
+
+def test_stream_holds_slot_until_closed():
+    """A streaming call keeps its slot while the answer is read"""
+    with FakeOllamaServer(reply_tokens=["Hi", " there"]) as server:
+        controller = AdmissionController(max_inflight=1, max_queue=0, queue_timeout=1)
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", admission=controller, coalesce=False)
+        stream = client.stream_generate("Hello")
+        assert controller.stats()["inflight"] == 1
+        assert "".join(stream) == "Hi there"
+        assert controller.stats()["inflight"] == 0
+
+
+@pytest.fixture
+def agent(tmp_path):
+    with FakeOllamaServer() as server:
+        controller = AdmissionController(max_inflight=1, max_queue=0, queue_timeout=1)
+        yield SquareTradeAgent(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="keyword"),
+            llm_client=OllamaClient(base_url=server.base_url, model="gemma:2b", admission=controller),
+            escalation_handler=EscalationHandler(db_path=tmp_path / "escalations.json")
+        )
+
+
+def test_chat_returns_503_with_retry_after(agent, monkeypatch):
+    """/chat sheds load with a fast 503 instead of escalating"""
+    monkeypatch.setattr(web_widget, "get_agent", lambda: agent)
+    monkeypatch.setattr(web_widget, "sessions", {})
+    release = agent.llm.admission.acquire()
+    
+    response = web_widget.app.test_client().post("/chat", json={"message": "How do I file a claim?"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["retry_after"] == int(response.headers["Retry-After"])
+    assert agent.escalation.get_pending_escalations() == []
+    
+    release()
+    assert web_widget.app.test_client().post("/chat", json={"message": "How do I file a claim?"}).status_code == 200
+    assert agent.get_metrics()["admission"]["rejected"] == 1
+
+
+def test_agent_priorities(agent):
+    """Escalation follow-ups go first and bulk requests last"""
+    agent.escalation.create_escalation("help", "User requested human support", metadata={"session_id": "s1"})
+    assert agent._llm_priority("s1") == PRIORITY_HIGH
+    assert agent._llm_priority("s2") == PRIORITY_NORMAL
+    assert agent._llm_priority("s1", "bulk") == PRIORITY_LOW
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the IVF approximate nearest-neighbour index
+"""
+import json
+import logging
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+import pytest
+
+import data_loader
+from ann_index import IVFIndex, recall_at_k
+from data_loader import KnowledgeBase
+from embedding_store import EmbeddingStore
+from vector_index import DenseIndex
+
+
+def make_index(n=2000, dim=16):
+    """Dense index over clustered random vectors"""
+    rng = np.random.default_rng(7)
+    centres = rng.standard_normal((20, dim))
+    data = centres[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dim))
+    dense = DenseIndex()
+    dense.add(data.astype(np.float32))
+    return dense, dense._normalize(data[:50].astype(np.float32))
+
+
+def test_probing_every_cluster_is_exact():
+    """With nprobe == nlist the IVF search matches exact search"""
+    dense, queries = make_index()
+    ivf = IVFIndex(nlist=16, nprobe=16).build(dense.matrix)
+    exact = [[i for i, _ in dense.search(q, 10)] for q in queries]
+    approx = [[i for i, _ in ivf.search(dense.matrix, q, 10)] for q in queries]
+    assert recall_at_k(exact, approx) == 1.0
+
+
+def test_recall_improves_with_nprobe():
+    """More probed clusters never lowers recall"""
+    dense, queries = make_index()
+    ivf = IVFIndex(nlist=64).build(dense.matrix)
+    exact = [[i for i, _ in dense.search(q, 10)] for q in queries]
+    recalls = [
+        recall_at_k(exact, [[i for i, _ in ivf.search(dense.matrix, q, 10, nprobe=p)] for q in queries])
+        for p in (1, 8, 64)
+    ]
+    assert recalls == sorted(recalls)
+    assert recalls[-1] == 1.0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    """A saved index gives identical results and checks its fingerprint"""
+    dense, queries = make_index()
+    ivf = IVFIndex(nlist=32, nprobe=4).build(dense.matrix)
+    path = tmp_path / "index.ivf.npz"
+    ivf.save(path, fingerprint="corpus-1")
+    
+    loaded = IVFIndex.load(path, fingerprint="corpus-1")
+    assert loaded.nprobe == 4 and loaded.ntotal == len(dense)
+    for q in queries[:5]:
+        assert loaded.search(dense.matrix, q, 5) == ivf.search(dense.matrix, q, 5)
+    
+    with pytest.raises(ValueError):
+        IVFIndex.load(path, fingerprint="corpus-2")
+
+
+def test_dense_index_uses_attached_ann_for_new_vectors():
+    """Vectors added after the IVF index is built are still searchable"""
+    dense, _ = make_index()
+    dense.build_ann(nlist=16, nprobe=16)
+    dense.add([[1.0] * 16])
+    assert dense.search([1.0] * 16, top_k=1)[0][0] == len(dense) - 1
+
+
+def test_saved_index_is_rebuilt_when_an_article_is_edited(tmp_path, monkeypatch, caplog):
+    """The saved IVF index is reused only for the same chunk text, not just the same ids"""
+    monkeypatch.setattr(data_loader, "ANN_MIN_VECTORS", 10)
+    docs = [{"id": f"doc_{i}", "title": f"Article {i}", "content": f"Article {i} covers topic {i}."} for i in range(30)]
+    kb_path = tmp_path / "kb.json"
+    
+    def embedder(text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+    
+    def search():
+        kb_path.write_text(json.dumps({"documents": docs}))
+        caplog.clear()
+        kb = KnowledgeBase(
+            kb_path=kb_path, retrieval_mode="semantic", embedder=embedder,
+            embedding_store=EmbeddingStore("m", cache_dir=tmp_path / "cache")
+        )
+        kb.search("topic", top_k=1)
+        return "Loaded IVF index" in caplog.text
+    
+    caplog.set_level(logging.INFO, logger="data_loader")
+    assert not search()
+    assert search()
+    docs[3]["content"] = "Article 3 now covers a different topic entirely."
+    assert not search()
+    assert search()
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asyncio Ollama client and async RAG pipeline
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from async_llm_client import AsyncOllamaClient
+from chat_agent import SquareTradeAgent
+from data_loader import KnowledgeBase
+from escalation_handler import EscalationHandler
+from llm_client import OllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+
+def test_generate_detects_model_and_reuses_connection():
+    """Sequential calls share one keep-alive connection"""
+    async def run(client):
+        replies = [await client.generate("hi") for _ in range(3)]
+        embedding = await client.get_embeddings("hello world")
+        await client.aclose()
+        return replies, embedding
+    
+    with FakeOllamaServer() as server:
+        client = AsyncOllamaClient(base_url=server.base_url, model="auto")
+        replies, embedding = asyncio.run(run(client))
+        assert replies == ["Hello there!"] * 3
+        assert embedding == [11.0, 2.0, 1.0]
+        assert client.model == "gemma:2b"
+        assert server.connections == 2  # the shared tags probe + one keep-alive connection for every async call
+
+
+def test_stream_generate_yields_chunked_deltas():
+    """Streaming chat decodes chunked NDJSON into deltas and stats"""
+    async def run(client):
+        stream = await client.stream_generate("hi")
+        return [delta async for delta in stream], stream
+    
+    with FakeOllamaServer(reply_tokens=["a", "b", "c"]) as server:
+        deltas, stream = asyncio.run(run(AsyncOllamaClient(base_url=server.base_url, model="gemma:2b")))
+        assert deltas == ["a", "b", "c"]
+        assert stream.done and stream.stats["eval_count"] == 3 and stream.error is None
+
+
+def test_stream_context_frees_the_server_when_reading_stops_early():
+    """Leaving async with after the first delta releases the server right away"""
+    async def run(client, coalesce):
+        client.inflight = client.inflight if coalesce else None
+        async with await client.stream_generate(f"hi {coalesce}") as stream:
+            async for _ in stream:
+                break
+        await asyncio.sleep(0)
+        return [b.in_flight for b in client.backends.backends]
+    
+    with FakeOllamaServer(reply_tokens=["a", "b", "c"], token_delay=0.05) as server:
+        client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b")
+        assert asyncio.run(run(client, False)) == [0]
+        assert asyncio.run(run(client, True)) == [0]
+
+
+def test_concurrent_requests_do_not_need_threads():
+    """Many slow requests wait concurrently on one event loop"""
+    async def run(client):
+        return await asyncio.gather(*(client.generate("q") for _ in range(30)))
+    
+    with FakeOllamaServer(delay=0.3) as server:
+        client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b")
+        client._model_detected = True
+        start = time.perf_counter()
+        replies = asyncio.run(run(client))
+        assert replies == ["Hello there!"] * 30
+        assert time.perf_counter() - start < 3
+
+
+def test_unreachable_server_falls_back():
+    """Connection failures return the fallback message"""
+    async def run(client):
+        stream = await client.stream_generate("hi")
+        return await client.generate("hi"), [d async for d in stream], await client.is_available()
+    
+    client = AsyncOllamaClient(base_url="http://127.0.0.1:9", model="gemma:2b")
+    client._model_detected = True
+    reply, deltas, available = asyncio.run(run(client))
+    assert reply == "Service temporarily unavailable. Please try again."
+    assert deltas == [reply] and available is False
+
+
+def test_process_message_async(tmp_path):
+    """The async agent path returns the same response shape as the sync one"""
+    with FakeOllamaServer(reply_tokens=["Log in", " and file."]) as server:
+        agent = SquareTradeAgent(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="keyword"),
+            llm_client=OllamaClient(base_url=server.base_url),
+            escalation_handler=EscalationHandler(db_path=tmp_path / "escalations.json")
+        )
+        result = asyncio.run(agent.process_message_async("How do I file a claim?"))
+        assert result["response"] == "Log in and file."
+        assert result["escalated"] is False and result["sources"] > 0
+        
+        escalated = asyncio.run(agent.process_message_async("Let me talk to a human"))
+        assert escalated["escalated"] is True
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
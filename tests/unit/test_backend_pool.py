@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for multi-backend routing of LLM calls
+"""
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend_pool import BackendPool, get_backend_pool
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from async_llm_client import AsyncOllamaClient
+from llm_client import OllamaClient, is_error_message
+from tests.fake_ollama import FakeOllamaServer
+
+URLS = ["http://ollama-a:11434", "http://ollama-b:11434", "http://ollama-c:11434"]
+
+
+def test_routes_to_least_outstanding_backend():
+    """Each call goes to the backend with the fewest calls in flight"""
+    pool = BackendPool(URLS)
+    picked = [pool.acquire() for _ in range(3)]
+    assert sorted(b.base_url for b in picked) == URLS
+    
+    pool.release(picked[1])
+    assert pool.acquire() is picked[1]
+    assert [b["in_flight"] for b in pool.stats()["backends"]] == [1, 1, 1]
+
+
+def test_latency_breaks_ties():
+    """Between equally loaded backends the faster one wins"""
+    pool = BackendPool(URLS[:2])
+    slow, fast = pool.backends
+    pool.record_success(slow, 1.0)
+    pool.record_success(fast, 0.2)
+    pool.record_success(fast, 1.2)  # one slow answer moves the average only part of the way
+    assert fast.latency == pytest.approx(0.5)
+    assert pool.acquire() is fast
+    assert pool.acquire() is slow
+
+
+def test_failing_backend_is_ejected_and_reinstated():
+    """A backend whose circuit opens leaves rotation until a probe succeeds"""
+    pool = BackendPool(URLS[:2], CircuitBreaker(failure_threshold=2, recovery_timeout=0.05))
+    flaky, steady = pool.backends
+    pool.record_failure(flaky)
+    pool.record_failure(flaky)
+    assert flaky.ejected and pool.stats()["healthy"] == 1
+    assert {pool.acquire().base_url for _ in range(3)} == {steady.base_url}
+    
+    time.sleep(0.06)
+    probe = pool.acquire()
+    assert probe is flaky  # half-open: one call is let through
+    pool.record_success(probe, 0.1)
+    assert not flaky.ejected and pool.stats()["healthy"] == 2
+
+
+def test_all_backends_ejected_fails_fast():
+    """With every circuit open the pool refuses calls"""
+    pool = BackendPool(URLS[:1], CircuitBreaker(failure_threshold=1, recovery_timeout=60))
+    pool.record_failure(pool.backends[0])
+    assert pool.is_open
+    with pytest.raises(CircuitOpenError):
+        pool.acquire()
+
+
+def test_pool_is_shared_per_server_set():
+    assert get_backend_pool(URLS) is get_backend_pool([url + "/" for url in URLS])
+    assert get_backend_pool(URLS) is not get_backend_pool(URLS[:2])
+
+
+def test_throughput_scales_with_backends():
+    """Concurrent calls are spread evenly, so two servers answer twice as fast as one"""
+    def run(servers, prompts):
+        client = OllamaClient(base_urls=[s.base_url for s in servers], model="gemma:2b", coalesce=False)
+        client.response_cache = None
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            answers = list(pool.map(lambda p: client.generate(p, stream=False), prompts))
+        assert answers == ["Hello there!"] * len(prompts)
+        return time.perf_counter() - start
+    
+    prompts = [f"Question {i}" for i in range(4)]
+    with FakeOllamaServer(delay=0.1, serial=True) as single:
+        one = run([single], prompts)
+    with FakeOllamaServer(delay=0.1, serial=True) as a, FakeOllamaServer(delay=0.1, serial=True) as b:
+        two = run([a, b], prompts)
+        assert len(a.posts) == len(b.posts) == 2
+    assert one >= 0.4 and two < 0.35
+
+
+def test_client_routes_around_dead_backend():
+    """A backend that refuses connections is ejected after its failures"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_urls=[server.base_url, "http://127.0.0.1:9"], model="gemma:2b")
+        client.response_cache = None
+        dead = client.backends.backends[1]
+        dead.circuit = CircuitBreaker(name=dead.base_url, failure_threshold=1, recovery_timeout=60)
+        
+        answers = [client.generate(f"Question {i}", stream=False) for i in range(6)]
+        assert sum(is_error_message(a) for a in answers) == 1
+        assert dead.ejected and dead.failures == 1
+        assert len(server.posts) == 5
+        assert client.backends.stats()["healthy"] == 1
+
+
+def test_async_client_balances_backends():
+    """The async client spreads concurrent chat calls and shares the pool with the sync client"""
+    with FakeOllamaServer(delay=0.05) as a, FakeOllamaServer(delay=0.05) as b:
+        urls = [a.base_url, b.base_url]
+        
+        async def run():
+            client = AsyncOllamaClient(base_urls=urls, model="gemma:2b")
+            answers = await asyncio.gather(*[client.generate(f"Question {i}") for i in range(4)])
+            await client.aclose()
+            return answers, client.backends
+        
+        answers, backends = asyncio.run(run())
+        assert answers == ["Hello there!"] * 4
+        assert len(a.posts) == len(b.posts) == 2
+        assert backends is OllamaClient(base_urls=urls, model="gemma:2b").backends
+        assert all(b["in_flight"] == 0 and b["latency_ms"] for b in backends.stats()["backends"])
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
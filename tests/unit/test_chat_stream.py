@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming chat endpoint
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import web_widget
+from chat_agent import SquareTradeAgent
+from data_loader import KnowledgeBase
+from escalation_handler import EscalationHandler
+from llm_client import OllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+
+def parse_sse(body):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    with FakeOllamaServer(reply_tokens=["To file", " a claim", ", log in."]) as server:
+        agent = SquareTradeAgent(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="keyword"),
+            llm_client=OllamaClient(base_url=server.base_url),
+            escalation_handler=EscalationHandler(db_path=tmp_path / "escalations.json")
+        )
+        monkeypatch.setattr(web_widget, "get_agent", lambda: agent)
+        monkeypatch.setattr(web_widget, "sessions", {})
+        yield web_widget.app.test_client()
+
+
+def test_stream_sends_metadata_tokens_then_done(client):
+    """Metadata comes first, then deltas, then the final response"""
+    response = client.post("/chat/stream", json={"message": "How do I file a claim?", "session_id": "s1"})
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    
+    names = [name for name, _ in events]
+    assert names[0] == "metadata" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"}
+    assert events[0][1]["sources"] and events[0][1]["session_id"] == "s1"
+    
+    streamed = "".join(data["delta"] for name, data in events if name == "token")
+    done = events[-1][1]
+    assert streamed == "To file a claim, log in."
+    assert done["response"] == streamed
+    assert done["escalated"] is False and "confidence" in done
+
+
+def test_stream_records_final_answer_in_session(client):
+    """Session history stores the complete answer"""
+    client.post("/chat/stream", json={"message": "How do I file a claim?", "session_id": "s2"}).get_data()
+    assert web_widget.sessions["s2"]["messages"][0]["agent"] == "To file a claim, log in."
+
+
+def test_stream_upfront_escalation(client):
+    """Explicit requests for a human stream the escalation response"""
+    events = parse_sse(client.get("/chat/stream?message=I+want+a+human+agent").get_data(as_text=True))
+    assert [name for name, _ in events] == ["metadata", "token", "done"]
+    assert events[-1][1]["escalated"] is True
+    assert events[-1][1]["escalation_id"].startswith("ESC_")
+
+
+def test_stream_requires_message(client):
+    """A missing message is rejected before streaming starts"""
+    assert client.post("/chat/stream", json={}).status_code == 400
+
+
+def test_chat_endpoint_unchanged(client):
+    """The non-streaming endpoint still returns the full answer"""
+    data = client.post("/chat", json={"message": "How do I file a claim?"}).get_json()
+    assert data["response"] == "To file a claim, log in."
+    assert data["success"] is True
+
+
+
+def test_metrics_reports_response_cache(client):
+    """Repeated questions show up as response cache hits"""
+    for _ in range(2):
+        client.post("/chat", json={"message": "How do I file a claim?"})
+    stats = client.get("/metrics").get_json()["response_cache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Unit tests for knowledge base chunking
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from chunking import chunk_text, chunk_document
+from data_loader import KnowledgeBase
+from rag_engine import RAGEngine
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def test_short_text_is_single_chunk():
+    """Text shorter than the chunk size is not split"""
+    assert chunk_text("short text", chunk_size=100, overlap=10) == ["short text"]
+
+
+def test_chunks_respect_size_and_overlap():
+    """Chunks stay within the size limit and consecutive chunks overlap"""
+    chunks = chunk_text(TEXT, chunk_size=120, overlap=30)
+    assert len(chunks) > 1
+    assert all(len(c) <= 120 for c in chunks)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.split()[0] in prev.split()
+    assert chunks[-1].endswith("word199")
+
+
+def test_chunk_document_back_references_parent():
+    """Every chunk points back at its parent document"""
+    doc = {"id": "doc_x", "title": "T", "content": TEXT, "keywords": ["k"]}
+    chunks = chunk_document(doc, chunk_size=120, overlap=30)
+    assert {c['parent_id'] for c in chunks} == {"doc_x"}
+    assert [c['chunk_index'] for c in chunks] == list(range(len(chunks)))
+    assert all(c['title'] == "T" for c in chunks)
+
+
+def test_search_and_context_use_chunks(tmp_path):
+    """Search returns chunks and the prompt context groups them by parent"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", chunk_size=80, chunk_overlap=20)
+    assert len(kb.chunks) > len(kb.documents)
+    
+    results = kb.search("file a claim", top_k=3)
+    assert results and all('parent_id' in r for r in results)
+    
+    rag = RAGEngine(kb=kb, llm_client=object())
+    context = rag._build_context(results)
+    parents = {r['parent_id'] for r in results}
+    assert context.count("Source ") == len(parents)
+
+
+def test_invalid_overlap_is_clamped(tmp_path):
+    """An overlap not smaller than the chunk size is replaced instead of failing startup"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", chunk_size=80, chunk_overlap=80)
+    assert kb.chunk_overlap == 40 and len(kb.chunks) > len(kb.documents)
+    assert KnowledgeBase(kb_path=tmp_path / "missing.json", chunk_size=80, chunk_overlap=-5).chunk_overlap == 0
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
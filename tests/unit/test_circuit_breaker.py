@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Ollama circuit breaker and adaptive timeouts
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend_pool import BackendPool
+from circuit_breaker import CircuitBreaker, AdaptiveTimeout, CLOSED, OPEN, HALF_OPEN
+from llm_client import OllamaClient, is_error_message
+from async_llm_client import AsyncOllamaClient
+from data_loader import KnowledgeBase
+from rag_engine import RAGEngine
+from tests.fake_ollama import FakeOllamaServer
+
+
+def test_opens_after_consecutive_failures():
+    """Failures open the circuit only when consecutive"""
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1 and breaker.stats()["opened"] == 1
+
+
+def test_half_open_lets_one_probe_through():
+    """After the recovery timeout one call probes; its outcome decides the state"""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_adaptive_timeout_follows_latency_percentile():
+    """The timeout is the percentile times the multiplier, within floor and ceiling"""
+    timeout = AdaptiveTimeout(percentile=90, multiplier=2.0, floor=1.0, ceiling=300.0, min_samples=10)
+    for _ in range(9):
+        timeout.observe(2.0)
+    assert timeout.current() == 300.0  # not enough samples yet
+    
+    for latency in [2.0] * 80 + [4.0] * 11:
+        timeout.observe(latency)
+    assert timeout.current() == 8.0
+    
+    fast = AdaptiveTimeout(percentile=99, multiplier=2.0, floor=5.0, ceiling=300.0, min_samples=1)
+    fast.observe(0.1)
+    assert fast.current() == 5.0
+
+
+def test_unreachable_server_opens_circuit_and_fails_fast():
+    """Once open, generate returns the fallback without touching the network"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = OllamaClient(
+        base_url="http://127.0.0.1:9", model="gemma:2b", session=requests.Session(), circuit_breaker=breaker
+    )
+    client.response_cache = None
+    for _ in range(2):
+        assert is_error_message(client.generate("Hello", stream=False))
+    assert breaker.is_open
+    
+    client.session.post = None  # any network call would now raise TypeError
+    assert is_error_message(client.generate("Hello", stream=False))
+    assert "".join(client.stream_generate("Hello"))
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_successful_calls_feed_adaptive_timeout():
+    """Sync and async clients record latency and use the adaptive read timeout"""
+    with FakeOllamaServer() as server:
+        breaker = CircuitBreaker()
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", circuit_breaker=breaker)
+        client.generate("Hello", stream=False)
+        "".join(client.stream_generate("Hello again"))
+        assert client.generate_timeout.stats()["samples"] == 1
+        assert client.stream_timeout.stats()["samples"] == 1
+        
+        async def run():
+            async_client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", circuit_breaker=breaker)
+            await async_client.generate("Async hello")
+            await async_client.aclose()
+            return async_client.generate_timeout.stats()["samples"]
+        
+        assert asyncio.run(run()) == 1
+        assert breaker.stats()["successes"] == 3 and breaker.state == CLOSED
+
+
+def test_async_client_fails_fast_when_open():
+    """The async client skips the request while the shared circuit is open"""
+    with FakeOllamaServer() as server:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+        breaker.record_failure()
+        
+        async def run():
+            client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", circuit_breaker=breaker)
+            text = await client.generate("Hello")
+            stream = await client.stream_generate("Hello again")
+            streamed = "".join([delta async for delta in stream])
+            return text, streamed
+        
+        text, streamed = asyncio.run(run())
+        assert is_error_message(text) and streamed
+        assert server.posts == []
+
+
+def test_cancelled_async_probe_can_be_retried():
+    """A half-open probe cancelled before the server answers does not block later probes"""
+    with FakeOllamaServer(delay=0.5) as server:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        breaker.record_failure()
+        
+        async def run():
+            client = AsyncOllamaClient(
+                base_url=server.base_url, model="gemma:2b", circuit_breaker=breaker, coalesce=False
+            )
+            client._model_detected = True
+            
+            async def stream():
+                return [delta async for delta in await client.stream_generate("Hello")]
+            
+            for call in (client.generate("Hello"), stream()):
+                task = asyncio.create_task(call)
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+                assert breaker.state == HALF_OPEN and breaker.allow()
+                breaker.cancel_probe()
+            await client.aclose()
+        
+        asyncio.run(run())
+
+
+class DownLLM:
+    """LLM stub whose circuit is open"""
+    
+    def __init__(self):
+        circuit = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+        circuit.record_failure()
+        self.backends = BackendPool(["http://127.0.0.1:9"], circuit)
+        self.calls = 0
+    
+    def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return "Service temporarily unavailable. Please try again."
+    
+    def stream_generate(self, prompt, **kwargs):
+        self.calls += 1
+        return iter(["Service temporarily unavailable. Please try again."])
+
+
+def test_rag_engine_answers_with_top_document_when_circuit_open(tmp_path):
+    """An open circuit returns the top article immediately instead of calling the LLM"""
+    llm = DownLLM()
+    rag = RAGEngine(kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=llm, retrieval_mode="keyword")
+    answer, metadata = rag.process_query("How do I file a claim for my broken phone?")
+    assert llm.calls == 0
+    assert metadata["degraded"] and metadata["reason"] == "LLM unavailable"
+    assert not metadata["escalated"]
+    assert metadata["retrieved_docs"][0]["title"] in answer
+    
+    tokens, stream_metadata = rag.process_query_stream("How do I file a claim for my broken phone?")
+    assert "".join(tokens) == answer and stream_metadata["degraded"]
+    assert llm.calls == 0
+
+
+def test_rag_engine_degrades_on_llm_error(tmp_path):
+    """A fallback error message from the LLM is replaced by the top article"""
+    llm = DownLLM()
+    llm.backends = None
+    rag = RAGEngine(kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=llm, retrieval_mode="keyword")
+    answer, metadata = rag.process_query("How do I file a claim for my broken phone?")
+    assert llm.calls == 1 and metadata["degraded"]
+    assert not is_error_message(answer)
+    
+    tokens, stream_metadata = rag.process_query_stream("How do I file a claim for my broken phone?")
+    assert llm.calls == 2 and stream_metadata["degraded"]
+    assert "".join(tokens) == answer
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
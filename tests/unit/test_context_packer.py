@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for token-budgeted context packing and num_ctx selection
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import context_packer
+from chunking import chunk_document
+from context_packer import ContextPacker, estimate_tokens, choose_num_ctx
+from data_loader import KnowledgeBase
+from llm_client import OllamaClient
+from rag_engine import RAGEngine
+from response_cache import ResponseCache
+from tests.fake_ollama import FakeOllamaServer
+
+TEXT = " ".join(f"Sentence {i} explains one part of the claim process." for i in range(40))
+
+
+def _chunk(doc_id, content, index=0, title=None):
+    return {"id": doc_id, "parent_id": doc_id, "title": title or doc_id, "content": content, "chunk_index": index}
+
+
+def test_estimate_tokens():
+    """Words and punctuation count as tokens; long words as several"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("How do I file a claim?") == 7
+    assert estimate_tokens("extraordinarily") == 3
+    assert 0.15 < estimate_tokens(TEXT) / len(TEXT) < 0.35
+
+
+def test_choose_num_ctx_picks_smallest_adequate_rung():
+    assert choose_num_ctx(200, reserve=500, ladder=[4096, 1024, 2048]) == 1024
+    assert choose_num_ctx(1000, reserve=500, ladder=[1024, 2048, 4096]) == 2048
+    assert choose_num_ctx(9000, reserve=500, ladder=[1024, 2048, 4096]) == 4096
+
+
+def test_pack_fills_budget_by_relevance():
+    """The most relevant chunks are kept and the estimate stays within budget"""
+    docs = [_chunk(f"doc_{i}", f"Passage {i}: " + " ".join(f"detail{i}x{j}" for j in range(40))) for i in range(6)]
+    packer = ContextPacker(budget=150)
+    context, used = packer.pack(docs)
+    assert used <= 150
+    assert "Source 1: doc_0" in context and "Passage 1:" in context
+    assert "Passage 5:" not in context
+
+
+def test_oversized_chunk_is_cut_and_small_ones_still_fit():
+    """A chunk past the budget is truncated; with little room left it is skipped instead"""
+    packer = ContextPacker(budget=120)
+    context, used = packer.pack([_chunk("long", TEXT)])
+    assert context.split("\n")[1].endswith(" ...") and used <= 120
+    
+    filler = _chunk("a", " ".join(f"w{j}" for j in range(80)))
+    big = _chunk("b", TEXT)
+    small = _chunk("c", "Claims are answered within two days.")
+    context, used = packer.pack([filler, big, small])
+    assert "Source 2: c" in context and "Sentence" not in context
+    assert used <= 120
+
+
+def test_duplicate_passages_are_dropped():
+    """The same passage reached through two documents is packed once"""
+    passage = "To file a claim, sign in and choose the device that needs repair."
+    near = passage.replace("sign in", "log in")
+    context, _ = ContextPacker(budget=500).pack([
+        _chunk("faq", passage), _chunk("intent", passage), _chunk("other", near), _chunk("extra", "Refunds take five days.")
+    ])
+    assert context.count("To file a claim") == 1
+    assert "Source 2: extra" in context
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    """Consecutive chunks of one document read as continuous text"""
+    doc = {"id": "doc", "title": "Claims", "content": TEXT}
+    chunks = chunk_document(doc, chunk_size=200, overlap=60)
+    context, _ = ContextPacker(budget=2000).pack([chunks[1], chunks[0], chunks[3]])
+    body = context.split("\n")[1]
+    assert context.count("Source ") == 1
+    assert body.startswith(chunks[0]["content"])
+    assert body.count("Sentence 3 explains") == 1  # the overlap of chunks 0 and 1 appears once
+    assert " ... " + chunks[3]["content"] in body
+
+
+def test_num_ctx_steps_up_at_once_and_down_slowly(monkeypatch):
+    """A larger window is used immediately; a smaller one only after a run of small requests"""
+    monkeypatch.setattr(context_packer, "NUM_CTX_DOWNSHIFT_AFTER", 3)
+    packer = ContextPacker()
+    short, long = "Short question?", TEXT * 2
+    assert packer.num_ctx(short) == 1024
+    assert packer.num_ctx(long) == 2048
+    assert [packer.num_ctx(short) for _ in range(3)] == [2048, 2048, 1024]
+    assert packer.num_ctx(short, short) == 1024
+
+
+def test_rag_engine_sizes_num_ctx(tmp_path):
+    """Answers request the smallest num_ctx that holds the packed prompt"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b")
+        client.response_cache = None
+        rag = RAGEngine(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=client, retrieval_mode="keyword",
+            context_packer=ContextPacker(budget=300)
+        )
+        rag.process_query("How do I file a claim for my broken phone?")
+        chat = [payload for path, payload in server.posts if path == "/api/chat"][0]
+        assert chat["options"]["num_ctx"] == 1024
+        assert estimate_tokens(chat["messages"][1]["content"]) < 300 + 50
+
+
+def test_cached_answer_survives_num_ctx_change(tmp_path):
+    """num_ctx is not part of the response cache key, so a ladder change still hits"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b")
+        client.response_cache = ResponseCache()
+        rag = RAGEngine(kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=client, retrieval_mode="keyword")
+        rag.semantic_cache = None
+        question = "How do I file a claim for my broken phone?"
+        first, _ = rag.process_query(question)
+        rag.process_query(TEXT * 2)  # moves the window up the ladder
+        second, _ = rag.process_query(question)
+        
+        chats = [payload for path, payload in server.posts if path == "/api/chat"]
+        assert [chat["options"]["num_ctx"] for chat in chats] == [1024, 2048]
+        assert second == first
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for batched embeddings and the micro-batcher
+"""
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from micro_batcher import MicroBatcher, AsyncMicroBatcher
+from llm_client import OllamaClient
+from async_llm_client import AsyncOllamaClient
+from data_loader import KnowledgeBase
+from tests.fake_ollama import FakeOllamaServer
+
+
+def _expected(text):
+    return [float(len(text)), float(text.count(" ") + 1), 1.0]
+
+
+def _embed_posts(server):
+    return [payload for path, payload in server.posts if path == "/api/embed"]
+
+
+def test_embed_many_batches_requests():
+    """Texts are sent to /api/embed in EMBEDDING_BATCH_SIZE slices with the embedding model"""
+    texts = [f"text number {i}" for i in range(150)]
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", embedding_model="nomic-embed-text")
+        assert client.embed_many(texts) == [_expected(t) for t in texts]
+        posts = _embed_posts(server)
+        assert [len(p["input"]) for p in posts] == [64, 64, 22]
+        assert {p["model"] for p in posts} == {"nomic-embed-text"}
+        assert client.get_embedding_model() == "nomic-embed-text"
+
+
+def test_embedding_model_defaults_to_chat_model():
+    """Without an embedding model the chat model is used"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", embedding_model="")
+        client.embed_many(["hi"])
+        assert _embed_posts(server)[0]["model"] == "gemma:2b"
+
+
+def test_legacy_server_falls_back_to_single_embeddings():
+    """Servers without /api/embed are served one text at a time"""
+    with FakeOllamaServer(legacy_embeddings=True) as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", embed_batch_window_ms=0)
+        assert client.embed_many(["a b", "c"]) == [_expected("a b"), _expected("c")]
+        assert client.get_embeddings("hello world") == [11.0, 2.0, 1.0]
+        assert sum(path == "/api/embeddings" for path, _ in server.posts) == 3
+
+
+def test_concurrent_get_embeddings_are_micro_batched():
+    """Concurrent single-text calls are merged into a few /api/embed requests"""
+    texts = [f"query {i}" for i in range(16)]
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", embed_batch_window_ms=50)
+        client.get_embedding_model()
+        barrier = threading.Barrier(len(texts))
+        
+        def embed(text):
+            barrier.wait()
+            return client.get_embeddings(text)
+        
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            vectors = list(pool.map(embed, texts))
+        assert vectors == [_expected(t) for t in texts]
+        assert len(_embed_posts(server)) <= 2
+        assert client.embed_batcher.stats()["items"] == len(texts)
+
+
+def test_micro_batcher_propagates_errors():
+    """An exception from the batch function reaches every caller"""
+    def fail(items):
+        raise RuntimeError("down")
+    
+    batcher = MicroBatcher(fail, window=0.001)
+    with pytest.raises(RuntimeError):
+        batcher.submit("x")
+
+
+def test_micro_batcher_fails_items_without_results():
+    """Items the batch function returned no result for raise instead of blocking forever"""
+    batcher = MicroBatcher(lambda items: ["first"], window=0.05)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(batcher.submit, i) for i in range(3)]
+        outcomes = [f.exception(timeout=5) or f.result() for f in futures]
+    assert outcomes.count("first") == 1
+    assert sum(isinstance(o, RuntimeError) for o in outcomes) == 2
+    
+    async def main():
+        batcher = AsyncMicroBatcher(_first_only, window=0.01)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), timeout=5
+        )
+    
+    outcomes = asyncio.run(main())
+    assert outcomes[0] == 0
+    assert all(isinstance(o, RuntimeError) for o in outcomes[1:])
+
+
+async def _first_only(items):
+    return items[:1]
+
+
+def test_async_get_embeddings_are_micro_batched():
+    """Concurrent coroutines share one /api/embed request"""
+    texts = [f"query {i}" for i in range(10)]
+    with FakeOllamaServer() as server:
+        async def main():
+            client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", embed_batch_window_ms=20)
+            vectors = await asyncio.gather(*(client.get_embeddings(t) for t in texts))
+            await client.aclose()
+            return vectors
+        
+        assert asyncio.run(main()) == [_expected(t) for t in texts]
+        assert len(_embed_posts(server)) == 1
+
+
+def test_knowledge_base_embeds_chunks_in_bulk(tmp_path):
+    """Chunk embedding goes through the batch embedder in one call"""
+    calls = []
+    
+    def batch_embedder(texts):
+        calls.append(len(texts))
+        return [_expected(t) for t in texts]
+    
+    kb = KnowledgeBase(
+        kb_path=tmp_path / "missing.json",
+        embedder=_expected,
+        batch_embedder=batch_embedder
+    )
+    pytest.importorskip("numpy")
+    assert kb._ensure_dense_index() is not None
+    assert calls == [len(kb.chunks)]
+
+
+def test_short_batch_is_completed_one_by_one(tmp_path):
+    """Texts the batch endpoint returned no vector for are embedded singly"""
+    single = []
+    
+    def embedder(text):
+        single.append(text)
+        return _expected(text)
+    
+    kb = KnowledgeBase(
+        kb_path=tmp_path / "missing.json",
+        embedder=embedder,
+        batch_embedder=lambda texts: [_expected(t) for t in texts[:-2]]
+    )
+    texts = ["first text", "second text", "third text"]
+    assert kb._embed_texts(texts) == [_expected(t) for t in texts]
+    assert single == texts[1:]
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
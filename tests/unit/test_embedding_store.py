@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the persistent embedding cache
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+import embedding_store
+from data_loader import KnowledgeBase
+from embedding_store import EmbeddingStore
+
+
+def test_round_trip_survives_reopen(tmp_path):
+    """Vectors written by one store are readable by a fresh instance"""
+    store = EmbeddingStore("test-model", cache_dir=tmp_path)
+    assert store.put_many(["a", "b", "a"], [[1.0, 2.0], [3.0, 4.0], [9.0, 9.0]]) == 2
+    
+    reopened = EmbeddingStore("test-model", cache_dir=tmp_path)
+    assert len(reopened) == 2
+    assert isinstance(reopened._table[1], np.memmap)
+    np.testing.assert_array_equal(reopened.get("b"), [3.0, 4.0])
+    assert reopened.get("missing") is None
+
+
+def test_keys_are_scoped_by_model(tmp_path):
+    """The same text cached for one model is a miss for another"""
+    EmbeddingStore("model-a", cache_dir=tmp_path).put_many(["text"], [[1.0]])
+    assert EmbeddingStore("model-b", cache_dir=tmp_path).get("text") is None
+
+
+def test_appends_from_other_writers_are_kept(tmp_path):
+    """Two store instances (e.g. two workers) both append without losing rows"""
+    first = EmbeddingStore("m", cache_dir=tmp_path)
+    second = EmbeddingStore("m", cache_dir=tmp_path)
+    first.put_many(["x"], [[1.0, 0.0]])
+    second.put_many(["y"], [[0.0, 1.0]])
+    
+    merged = EmbeddingStore("m", cache_dir=tmp_path)
+    np.testing.assert_array_equal(merged.get("x"), [1.0, 0.0])
+    np.testing.assert_array_equal(merged.get("y"), [0.0, 1.0])
+
+
+def test_reads_during_reload_see_a_consistent_snapshot(tmp_path, monkeypatch):
+    """A lock-free get() while put_many reloads never pairs new rows with the old map"""
+    store = EmbeddingStore("m", cache_dir=tmp_path)
+    store.put_many(["x"], [[1.0, 0.0]])
+    seen = []
+    memmap = np.memmap
+    
+    def mapping_while_reading(*args, **kwargs):
+        seen.append(store.get("y"))  # another thread reading mid-reload
+        return memmap(*args, **kwargs)
+    
+    monkeypatch.setattr(embedding_store.np, "memmap", mapping_while_reading)
+    store.put_many(["y"], [[0.0, 1.0]])
+    assert seen and all(v is None for v in seen)
+    np.testing.assert_array_equal(store.get("y"), [0.0, 1.0])
+
+
+def test_knowledge_base_only_embeds_uncached_chunks(tmp_path):
+    """A restarted knowledge base reuses cached chunk embeddings"""
+    calls = []
+    
+    def embedder(text):
+        calls.append(text)
+        return [float(len(text)), 1.0]
+    
+    def build():
+        kb = KnowledgeBase(
+            kb_path=tmp_path / "missing.json",
+            retrieval_mode="semantic",
+            embedder=embedder,
+            embedding_store=EmbeddingStore("m", cache_dir=tmp_path / "cache")
+        )
+        kb.search("claim", top_k=1)
+        return kb
+    
+    kb = build()
+    first_run = len(calls)
+    assert first_run == len(kb.chunks) + 1
+    
+    calls.clear()
+    build()
+    assert calls == ["claim"]
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Unit tests for hedged LLM requests
+"""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from circuit_breaker import CircuitBreaker, HALF_OPEN
+from hedging import HedgePolicy
+from llm_client import OllamaClient, is_error_message
+from tests.fake_ollama import FakeOllamaServer
+
+
+def _policy(delay=0.05, budget=100.0):
+    """Policy that hedges after delay seconds (it has seen enough fast calls)"""
+    policy = HedgePolicy(percentile=95, budget=budget, min_delay=delay, min_samples=5)
+    for _ in range(5):
+        policy.observe(0.001)
+    return policy
+
+
+def _client(servers, policy):
+    client = OllamaClient(
+        base_urls=[s.base_url for s in servers], model="gemma:2b", coalesce=False, hedging=policy
+    )
+    client.response_cache = None
+    return client
+
+
+def _wait_idle(client):
+    for _ in range(200):
+        if all(b["in_flight"] == 0 for b in client.backends.stats()["backends"]):
+            return
+        time.sleep(0.01)
+    raise AssertionError("backends still busy")
+
+
+def test_delay_follows_first_token_percentile():
+    """No hedging before enough samples; then the percentile, never below the floor"""
+    policy = HedgePolicy(percentile=90, budget=10, min_delay=0.2, min_samples=10)
+    policy.observe(1.0)
+    assert policy.delay() > 60
+    for latency in [0.5] * 89 + [3.0] * 10:
+        policy.observe(latency)
+    assert policy.delay() == 3.0
+    
+    fast = HedgePolicy(percentile=90, budget=10, min_delay=0.2, min_samples=1)
+    fast.observe(0.01)
+    assert fast.delay() == 0.2
+
+
+def test_budget_caps_hedges():
+    """Each call earns budget percent of a hedge"""
+    policy = HedgePolicy(budget=25, min_samples=1)
+    for _ in range(3):
+        policy.start()
+    assert not policy.try_hedge()
+    policy.start()
+    assert policy.try_hedge()
+    assert not policy.try_hedge()
+    stats = policy.stats()
+    assert stats["calls"] == 4 and stats["hedged"] == 1 and stats["over_budget"] == 2
+    assert stats["hedge_rate"] == 0.25
+
+
+def test_slow_backend_is_hedged_and_cancelled():
+    """A stuck first server is beaten by the hedge; the loser's server is freed"""
+    with FakeOllamaServer(delay=0.6) as slow, FakeOllamaServer() as fast:
+        client = _client([slow, fast], _policy())
+        start = time.perf_counter()
+        assert client.generate("Hello", stream=False) == "Hello there!"
+        assert time.perf_counter() - start < 0.4
+        assert len(slow.posts) == 1 and len(fast.posts) == 1
+        
+        stats = client.hedging.stats()
+        assert stats["hedged"] == 1 and stats["hedge_wins"] == 1 and stats["hedge_win_rate"] == 1.0
+        assert max(client.hedging._first_token._samples) >= 0.05  # measured from the first attempt
+        _wait_idle(client)
+        slow_backend = client.backends.backends[0]
+        assert slow_backend.failures == 0 and not slow_backend.ejected
+
+
+def test_error_frame_does_not_win_the_race():
+    """A hedge answered with an error frame counts against its server; the slow healthy one wins"""
+    with FakeOllamaServer(delay=0.3) as slow, FakeOllamaServer(stream_error="model not found") as broken:
+        client = _client([slow, broken], _policy())
+        assert client.generate("Hello", stream=False) == "Hello there!"
+        assert len(broken.posts) == 1
+        assert client.hedging.stats()["primary_wins"] == 1
+        _wait_idle(client)
+        assert client.backends.backends[1].failures == 1
+
+
+def test_fast_backend_is_not_hedged():
+    """A first token within the delay needs no duplicate"""
+    with FakeOllamaServer() as a, FakeOllamaServer() as b:
+        client = _client([a, b], _policy(delay=0.5))
+        assert "".join(client.stream_generate("Hello")) == "Hello there!"
+        assert client.generate("Hi", stream=False) == "Hello there!"
+        assert len(a.posts) + len(b.posts) == 2
+        assert client.hedging.stats()["hedged"] == 0 and client.hedging.stats()["calls"] == 2
+        _wait_idle(client)
+
+
+def test_streamed_reply_comes_from_winner():
+    """The winning stream yields every delta, including the one read while racing"""
+    with FakeOllamaServer(delay=0.6) as slow, FakeOllamaServer(reply_tokens=["One", " two", " three"]) as fast:
+        client = _client([slow, fast], _policy())
+        with client.stream_generate("Count") as stream:
+            assert list(stream) == ["One", " two", " three"]
+        assert stream.done
+        _wait_idle(client)
+
+
+def test_no_hedge_without_budget():
+    """With the budget spent the call waits for the first server"""
+    with FakeOllamaServer(delay=0.3) as slow, FakeOllamaServer() as fast:
+        client = _client([slow, fast], _policy(budget=0))
+        assert client.generate("Hello", stream=False) == "Hello there!"
+        assert fast.posts == []
+        assert client.hedging.stats()["over_budget"] == 1
+
+
+def _half_open(backend):
+    """Give a backend a breaker that has failed and is ready to probe"""
+    backend.circuit = CircuitBreaker(name=backend.base_url, failure_threshold=1, recovery_timeout=0)
+    backend.circuit.record_failure()
+    assert backend.circuit.state == HALF_OPEN
+
+
+def test_declined_hedge_leaves_half_open_backend_probeable():
+    """A hedge the budget refuses does not use up the second server's probe"""
+    with FakeOllamaServer(delay=0.2) as slow, FakeOllamaServer() as fast:
+        client = _client([slow, fast], _policy(budget=0))
+        _half_open(client.backends.backends[1])
+        assert client.generate("Hello", stream=False) == "Hello there!"
+        assert fast.posts == []
+        recovering = client.backends.backends[1]
+        assert recovering.in_flight == 0 and recovering.circuit.allow()
+
+
+def test_cancelled_probe_can_be_retried():
+    """A half-open server whose probe loses the race may be probed again"""
+    with FakeOllamaServer(delay=0.4) as slow, FakeOllamaServer() as fast:
+        client = _client([slow, fast], _policy())
+        _half_open(client.backends.backends[0])
+        assert client.generate("Hello", stream=False) == "Hello there!"
+        assert client.hedging.stats()["hedge_wins"] == 1
+        _wait_idle(client)
+        probe = client.backends.backends[0]
+        assert probe.circuit.state == HALF_OPEN and probe.circuit.allow()
+
+
+def test_failed_attempt_counts_against_its_server():
+    """A refused connection is reported to the pool and yields the fallback message"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(
+            base_urls=["http://127.0.0.1:9", server.base_url], model="gemma:2b", hedging=_policy(delay=1.0)
+        )
+        client.response_cache = None
+        assert is_error_message(client.generate("Hello", stream=False))
+        dead = client.backends.backends[0]
+        assert dead.failures == 1 and dead.in_flight == 0
+        assert server.posts == []
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
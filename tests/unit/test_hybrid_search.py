@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Unit tests for hybrid lexical + dense retrieval
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import data_loader
+from data_loader import KnowledgeBase
+from rag_engine import RAGEngine
+
+# Paraphrase-aware fake embedder: "expense" and "price" share a dimension
+CONCEPTS = [("price", "expense", "cost"), ("claim",), ("status", "progress")]
+
+
+def fake_embedder(text):
+    lowered = text.lower()
+    return [float(sum(lowered.count(w) for w in words)) for words in CONCEPTS]
+
+
+def make_kb(tmp_path):
+    return KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="hybrid", embedder=fake_embedder)
+
+
+def test_hybrid_finds_paraphrase_missed_by_lexical(tmp_path):
+    """Dense retrieval contributes documents with no shared tokens"""
+    kb = make_kb(tmp_path)
+    assert kb.search("expense", top_k=3, mode="bm25f") == []
+    results = kb.search("expense", top_k=3)
+    assert results and results[0]['id'] == "plan_002"
+
+
+def test_rrf_ranks_documents_found_by_both_retrievers_first(tmp_path):
+    """A document ranked by both retrievers beats one ranked by either alone"""
+    kb = make_kb(tmp_path)
+    results = kb.search("claim processing status", top_k=3)
+    assert results[0]['id'] == "claim_002"
+    assert all('fusion_score' in r and 0 < r['relevance_score'] <= 10 for r in results)
+
+
+def test_weighted_fusion_keeps_relevance_scale(tmp_path, monkeypatch):
+    """Weighted fusion produces relevance scores on the 0-10 scale"""
+    monkeypatch.setattr(data_loader, "HYBRID_FUSION", "weighted")
+    results = make_kb(tmp_path).search("claim status", top_k=2)
+    assert results and all(0 < r['relevance_score'] <= 10 for r in results)
+
+
+def test_hybrid_without_embedder_uses_lexical_only(tmp_path):
+    """Missing embeddings degrade to the lexical ranking"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="hybrid")
+    assert kb.search("file a claim", top_k=1)[0]['id'] == "claim_001"
+
+
+def test_rag_engine_selects_mode(tmp_path):
+    """RAGEngine passes its configured retrieval mode to the knowledge base"""
+    kb = make_kb(tmp_path)
+    modes = []
+    original_search = kb.search
+    kb.search = lambda query, top_k=3, mode=None: modes.append(mode) or original_search(query, top_k, mode)
+    
+    rag = RAGEngine(kb=kb, llm_client=object(), retrieval_mode="hybrid")
+    rag.process_query("zzz unrelated")
+    assert modes == ["hybrid"]
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for intent-routed retrieval
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import data_loader
+from data_loader import KnowledgeBase
+from embedding_store import EmbeddingStore
+from rag_engine import RAGEngine
+
+
+def make_intent_kb(tmp_path, monkeypatch, **kwargs):
+    """Knowledge base loaded from the intent file because the default file is missing"""
+    monkeypatch.setattr(data_loader, "KNOWLEDGE_BASE_PATH", tmp_path / "missing.json")
+    return KnowledgeBase(**kwargs)
+
+
+def test_default_kb_loads_intent_documents(tmp_path, monkeypatch):
+    """Without knowledge_base.json the intent file's documents are used"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    assert kb.get_by_id("doc_003")['title'] == "How to File a Claim"
+    assert len(kb.documents) == 10
+
+
+def test_explicit_missing_path_uses_sample_documents(tmp_path):
+    """An explicit kb_path that does not exist still falls back to the samples"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json")
+    assert kb.get_by_id("claim_001") is not None
+    assert kb.get_by_id("doc_003") is None
+
+
+def test_get_by_ids_skips_unknown_ids(tmp_path, monkeypatch):
+    """Documents come back in the requested order, unknown ids are dropped"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    docs = kb.get_by_ids(["doc_008", "doc_999", "doc_003"])
+    assert [d['id'] for d in docs] == ["doc_008", "doc_003"]
+
+
+def test_search_restricted_to_doc_ids(tmp_path, monkeypatch):
+    """doc_ids limits every retrieval mode to the given documents"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    for mode in ("keyword", "bm25f", "hybrid"):
+        results = kb.search("claim", top_k=5, mode=mode, doc_ids=["doc_008"])
+        assert results and {r['id'] for r in results} == {"doc_008"}
+    assert kb.search("claim", doc_ids=["doc_999"]) == []
+
+
+def test_restricted_semantic_search(tmp_path, monkeypatch):
+    """Dense search only scores chunks of the given documents"""
+    def embedder(text):
+        return [float(text.lower().count("claim")), 1.0]
+    
+    kb = make_intent_kb(tmp_path, monkeypatch, embedder=embedder, embedding_store=EmbeddingStore("m", cache_dir=tmp_path / "cache"))
+    results = kb.search("claim", top_k=5, mode="semantic", doc_ids=["doc_005", "doc_006"])
+    assert results and {r['id'] for r in results} <= {"doc_005", "doc_006"}
+
+
+def test_added_document_is_indexed_by_id(tmp_path, monkeypatch):
+    """add_document keeps the id lookups current"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    kb.add_document({"id": "doc_011", "title": "Gift cards", "category": "general",
+                     "content": "Gift cards cannot be used for claim deductibles.", "keywords": ["gift"]})
+    assert kb.get_by_id("doc_011")['title'] == "Gift cards"
+    assert [r['id'] for r in kb.search("gift", doc_ids=["doc_011"])] == ["doc_011"]
+
+
+def test_confident_intent_routes_to_mapped_documents(tmp_path, monkeypatch):
+    """A confident intent searches only its mapped documents"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    rag = RAGEngine(kb=kb, llm_client=object(), retrieval_mode="bm25f")
+    rag._generate_answer = lambda query, docs, priority: "answer"
+    
+    _, metadata = rag.process_query("How do I file a claim for my broken phone?")
+    assert metadata["intent"] == "intent_file_claim"
+    assert metadata["routing"] == "intent"
+    mapped = set(rag.intents["intent_file_claim"]["documents"])
+    assert {d['id'] for d in metadata["retrieved_docs"]} <= mapped
+
+
+def test_weak_intent_uses_full_search(tmp_path, monkeypatch):
+    """Low intent confidence falls back to searching the whole knowledge base"""
+    kb = make_intent_kb(tmp_path, monkeypatch)
+    rag = RAGEngine(kb=kb, llm_client=object(), retrieval_mode="bm25f")
+    rag._generate_answer = lambda query, docs, priority: "answer"
+    
+    _, metadata = rag.process_query("deductible")
+    assert metadata["routing"] == "search"
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Aho-Corasick keyword matcher
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from keyword_matcher import KeywordMatcher, build_keyword_matcher
+from escalation_handler import EscalationHandler
+from data_loader import KnowledgeBase
+from rag_engine import RAGEngine
+
+
+def test_find_all_respects_word_boundaries():
+    """Keywords only match whole words"""
+    matcher = KeywordMatcher({"q": ["what", "how much"]})
+    assert matcher.find_all("whatever somewhat") == []
+    assert [kw for _, _, kw in matcher.find_all("What? How much is it")] == ["what", "how much"]
+
+
+def test_plural_s_is_allowed():
+    """A trailing 's' still matches, except after very short keywords"""
+    matcher = KeywordMatcher({"q": ["claim", "hi"]})
+    assert matcher.scan("my claims")["q"] == {"claim"}
+    assert "q" not in matcher.scan("his claimsx")
+
+
+def test_overlapping_keywords_all_reported():
+    """Keywords sharing suffixes and prefixes are each found"""
+    matcher = KeywordMatcher({"a": ["not working", "working"], "b": ["work"]})
+    matches = matcher.scan("it is not working")
+    assert matches["a"] == {"not working", "working"}
+    assert "b" not in matches
+
+
+def test_keyword_in_several_groups():
+    """A keyword shared by groups is reported under each of them"""
+    matcher = KeywordMatcher({"x": ["coverage"], "y": ["coverage", "damage"]})
+    matches = matcher.scan("Coverage for damage")
+    assert matches["x"] == {"coverage"}
+    assert matches["y"] == {"coverage", "damage"}
+
+
+def test_scan_results_are_cached():
+    """Repeated scans of the same text return the cached result"""
+    matcher = KeywordMatcher({"q": ["claim"]})
+    assert matcher.scan("file a claim") is matcher.scan("file a claim")
+
+
+def test_rule_matcher_groups():
+    """The rule matcher covers categories, intents, escalation and priority"""
+    matcher = build_keyword_matcher({"intent_test": ["refund"]})
+    matches = matcher.scan("I need a human, my refund claim is urgent")
+    assert {"category:claims", "intent:intent_test", "escalation", "priority:high", "priority:medium"} <= set(matches)
+
+
+def test_escalation_handler_uses_word_boundaries(tmp_path):
+    """Escalation and priority ignore keywords embedded in other words"""
+    handler = EscalationHandler(db_path=tmp_path / "escalations.json")
+    assert handler.should_escalate("I want to speak to a human agent")
+    assert not handler.should_escalate("Is this supportive of older phones?")
+    assert handler._calculate_priority("my phone is not working") == "high"
+    assert handler._calculate_priority("refunds please") == "medium"
+    assert handler._calculate_priority("claimant details") == "low"
+
+
+def test_escalation_keyword_outside_config_is_logged(tmp_path):
+    """A matched keyword with no exact counterpart in ESCALATION_KEYWORDS still escalates"""
+    matcher = KeywordMatcher({"escalation": ["  Talk To Someone "]})
+    handler = EscalationHandler(db_path=tmp_path / "escalations.json", matcher=matcher)
+    assert handler.should_escalate("Can I talk to someone please")
+
+
+def test_pending_escalation_sessions_follow_tickets(tmp_path):
+    """A session stays pending until its last ticket is resolved, also after a reload"""
+    handler = EscalationHandler(db_path=tmp_path / "escalations.json")
+    first = handler.create_escalation("human please", "request", metadata={"session_id": "s1"})
+    second = handler.create_escalation("still waiting", "request", metadata={"session_id": "s1"})
+    handler.create_escalation("no session", "request")
+    assert handler.has_pending_escalation("s1") and not handler.has_pending_escalation("s2")
+    
+    handler.resolve_escalation(first["id"])
+    assert handler.has_pending_escalation("s1")
+    assert EscalationHandler(db_path=tmp_path / "escalations.json").has_pending_escalation("s1")
+    
+    handler.resolve_escalation(second["id"])
+    assert not handler.has_pending_escalation("s1")
+    assert not EscalationHandler(db_path=tmp_path / "escalations.json").has_pending_escalation("s1")
+
+
+def test_rag_engine_intent_and_category(tmp_path):
+    """Intent scoring counts whole-word keyword matches"""
+    rag = RAGEngine(kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=object())
+    intent, score = rag._detect_intent("How do I file a claim for my broken phone?")
+    assert intent == "intent_file_claim" and score > 0.5
+    assert rag._detect_category("whatever") == "support"
+    assert rag._detect_category("my plans") == "protection_plans"
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
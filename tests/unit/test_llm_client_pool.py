@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pooled keep-alive HTTP sessions in OllamaClient
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import llm_client
+from llm_client import OllamaClient, get_session
+from tests.fake_ollama import FakeOllamaServer
+
+
+def test_clients_share_session_per_server():
+    """Clients for the same server reuse one session"""
+    first = OllamaClient(base_url="http://example.invalid:11434/")
+    second = OllamaClient(base_url="http://example.invalid:11434")
+    assert first.session is second.session
+    assert get_session("http://other.invalid:11434") is not first.session
+
+
+def test_sequential_requests_reuse_connection():
+    """Keep-alive means one TCP connection serves many requests"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="auto")
+        for _ in range(5):
+            assert client.generate("hi") == "Hello there!"
+        assert client.get_embeddings("hello world") == [11.0, 2.0, 1.0]
+        assert client.is_available()
+        assert server.requests == 7  # tags lookup + 5 chats + embedding (is_available reads the cached tags)
+        assert server.connections == 1
+        assert client.model == "gemma:2b"
+
+
+def test_concurrent_requests_bounded_by_pool(monkeypatch):
+    """Concurrent callers open at most pool_size kept-alive connections"""
+    monkeypatch.setattr(llm_client, "_sessions", {})
+    with FakeOllamaServer(delay=0.02) as server:
+        session = get_session(server.base_url, pool_size=4)
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", session=session)
+        client._model_detected = True
+        
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for _ in range(3):
+                results = list(pool.map(client.generate, ["q"] * 4))
+        assert results == ["Hello there!"] * 4
+        assert server.connections <= 4
+
+
+def test_connection_error_returns_fallback_message():
+    """An unreachable server is reported, not raised"""
+    client = OllamaClient(base_url="http://127.0.0.1:9", model="gemma:2b")
+    client._model_detected = True
+    assert client.generate("hi") == "Service temporarily unavailable. Please try again."
+    assert client.is_available() is False
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Unit tests for token streaming in OllamaClient
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from llm_client import OllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+
+def make_client(server):
+    client = OllamaClient(base_url=server.base_url, model="gemma:2b")
+    client._model_detected = True
+    return client
+
+
+def test_stream_yields_deltas_and_stats():
+    """Deltas come from message.content and the final frame becomes stats"""
+    with FakeOllamaServer(reply_tokens=["Hel", "lo", " world"]) as server:
+        stream = make_client(server).stream_generate("hi")
+        assert list(stream) == ["Hel", "lo", " world"]
+        assert stream.text == "Hello world"
+        assert stream.done and stream.stats["eval_count"] == 3
+        assert "message" not in stream.stats and stream.error is None
+
+
+def test_first_token_arrives_before_generation_finishes():
+    """The first delta is available long before the last one is sent"""
+    with FakeOllamaServer(reply_tokens=["a"] * 5, token_delay=0.1) as server:
+        start = time.perf_counter()
+        stream = make_client(server).stream_generate("hi")
+        next(stream)
+        first_token = time.perf_counter() - start
+        list(stream)
+        total = time.perf_counter() - start
+        assert first_token < 0.25 < total
+
+
+def test_generate_with_stream_collects_chat_content():
+    """generate(stream=True) returns the streamed chat reply"""
+    with FakeOllamaServer(reply_tokens=[" Hello", " there "]) as server:
+        assert make_client(server).generate("hi", stream=True) == "Hello there"
+
+
+def test_connection_error_yields_fallback():
+    """A failed request yields the fallback message and records the error"""
+    client = OllamaClient(base_url="http://127.0.0.1:9", model="gemma:2b")
+    client._model_detected = True
+    stream = client.stream_generate("hi")
+    assert list(stream) == ["Service temporarily unavailable. Please try again."]
+    assert stream.error is not None and not stream.done
+
+
+def test_stream_can_be_closed_early():
+    """Closing a stream mid-way releases the connection for reuse"""
+    with FakeOllamaServer(reply_tokens=["a", "b", "c"]) as server:
+        client = make_client(server)
+        with client.stream_generate("hi") as stream:
+            assert next(stream) == "a"
+        assert client.generate("again") == "abc"
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
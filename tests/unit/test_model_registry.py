@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared /api/tags model registry
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from model_registry import ModelRegistry, select_model
+from llm_client import OllamaClient
+from async_llm_client import AsyncOllamaClient
+from chat_agent import SquareTradeAgent
+from data_loader import KnowledgeBase
+from escalation_handler import EscalationHandler
+from tests.fake_ollama import FakeOllamaServer
+
+
+class _Response:
+    def __init__(self, names):
+        self.names = names
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return {"models": [{"name": name} for name in self.names]}
+
+
+class GatedSession:
+    """Session stub whose /api/tags answers wait for a gate to open"""
+    
+    def __init__(self, names):
+        self.names = names
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = 0
+    
+    def get(self, url, timeout=None):
+        self.calls += 1
+        self.gate.wait()
+        return _Response(list(self.names))
+
+
+def test_select_model_prefers_in_order():
+    """Preference order wins over installation order"""
+    assert select_model(["llama2:7b", "gemma:7b", "gemma:2b"], ["gemma:2b", "gemma"]) == "gemma:2b"
+    assert select_model(["phi3"], ["gemma"]) == "phi3"
+    assert select_model([], ["gemma"]) is None
+
+
+def test_stale_reads_return_cached_answer_while_refreshing():
+    """After the TTL, reads return at once and a background probe updates the cache"""
+    session = GatedSession(["gemma:2b"])
+    registry = ModelRegistry("http://ollama.test", session=session, ttl=0.01)
+    assert registry.model_names() == ["gemma:2b"]
+    
+    time.sleep(0.02)
+    session.gate.clear()
+    session.names = ["mistral"]
+    start = time.perf_counter()
+    assert registry.model_names() == ["gemma:2b"]
+    assert registry.is_available()
+    assert time.perf_counter() - start < 0.05
+    
+    session.gate.set()
+    for _ in range(100):
+        if registry.status()["probes"] == 2:
+            break
+        time.sleep(0.01)
+    assert session.calls == 2  # one refresh for both stale reads
+    assert registry.model_names() == ["mistral"]
+
+
+def test_has_model_accepts_names_with_or_without_tag():
+    """Models match by full name or by name without the tag"""
+    registry = ModelRegistry("http://ollama.test", session=GatedSession(["gemma:2b"]))
+    assert registry.has_model("gemma:2b") and registry.has_model("gemma")
+    assert not registry.has_model("mistral")
+
+
+def test_unreachable_server_is_reported_and_cached():
+    """A failed probe marks the server unavailable with the error"""
+    registry = ModelRegistry("http://127.0.0.1:9")
+    assert registry.is_available() is False
+    status = registry.status()
+    assert status["available"] is False and status["error"] and status["failures"] == 1
+    assert registry.is_available() is False
+    assert registry.status()["probes"] == 1
+
+
+def test_clients_share_one_tags_probe():
+    """Sync and async clients for a server share the registry"""
+    with FakeOllamaServer() as server:
+        first = OllamaClient(base_url=server.base_url, model="auto")
+        second = OllamaClient(base_url=server.base_url, model="auto")
+        assert first.registry is second.registry
+        assert first.is_available() and second.validate_model_available() is False
+        first._ensure_model()
+        second._ensure_model()
+        assert second.validate_model_available()
+        
+        async def run():
+            client = AsyncOllamaClient(base_url=server.base_url, model="auto")
+            await client._ensure_model()
+            return client.model, await client.is_available()
+        
+        assert asyncio.run(run()) == ("gemma:2b", True)
+        assert server.requests == 1
+
+
+def test_health_checks_do_not_probe_upstream(tmp_path):
+    """Agent startup and repeated status checks cost one /api/tags call"""
+    with FakeOllamaServer() as server:
+        agent = SquareTradeAgent(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json"),
+            llm_client=OllamaClient(base_url=server.base_url, model="gemma:2b"),
+            escalation_handler=EscalationHandler(db_path=tmp_path / "escalations.json")
+        )
+        for _ in range(5):
+            status = agent.get_agent_status()
+            agent.test_connectivity()
+        assert status["llm_available"] and status["llm_registry"]["models"] == ["gemma:2b"]
+        assert server.requests == 1
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
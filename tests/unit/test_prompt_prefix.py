@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the prefix-cache-friendly chat payload (system message and keep_alive)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SYSTEM_PROMPT
+from async_llm_client import AsyncOllamaClient
+from data_loader import KnowledgeBase
+from llm_client import OllamaClient
+from rag_engine import RAGEngine
+from tests.fake_ollama import FakeOllamaServer
+
+
+def _chats(server):
+    return [payload for path, payload in server.posts if path == "/api/chat"]
+
+
+def test_system_message_goes_first_with_keep_alive():
+    """Both clients send the system message ahead of the prompt, plus keep_alive"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", keep_alive="1h")
+        client.generate("Question", system="Rules")
+        "".join(client.stream_generate("Question 2", system="Rules"))
+        
+        async def run():
+            async_client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", keep_alive=-1)
+            await async_client.generate("Question 3", system="Rules")
+            await async_client.aclose()
+        
+        asyncio.run(run())
+        chats = _chats(server)
+        assert [c["messages"][0] for c in chats] == [{"role": "system", "content": "Rules"}] * 3
+        assert [c["messages"][1]["content"] for c in chats] == ["Question", "Question 2", "Question 3"]
+        assert [c["keep_alive"] for c in chats] == ["1h", "1h", -1]
+
+
+def test_no_system_message_or_keep_alive_unless_set():
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", keep_alive="")
+        client.generate("Question")
+        chat = _chats(server)[0]
+        assert chat["messages"] == [{"role": "user", "content": "Question"}]
+        assert "keep_alive" not in chat
+
+
+def test_rag_prompt_keeps_instructions_in_system_message(tmp_path):
+    """The user message holds only the context and question; the prefix is reused"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", keep_alive="30m")
+        client.response_cache = None
+        rag = RAGEngine(
+            kb=KnowledgeBase(kb_path=tmp_path / "missing.json"), llm_client=client, retrieval_mode="keyword"
+        )
+        rag.semantic_cache = None
+        rag.process_query("How do I file a claim for my broken phone?")
+        rag.process_query("How long does a repair take for my phone?")
+        
+        first, second = _chats(server)
+        assert first["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+        assert first["messages"][1]["content"].startswith("Knowledge Base Content:")
+        assert "SquareTrade customer support assistant" not in first["messages"][1]["content"]
+        assert second["messages"][0] == first["messages"][0]
+
+
+def test_warm_prefix_evaluates_fewer_tokens():
+    """With the same system message only the new part of the prompt is evaluated"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", coalesce=False)
+        client.response_cache = None
+        
+        def prompt_tokens(prompt, system):
+            with client.stream_generate(prompt, system=system) as stream:
+                "".join(stream)
+            return stream.stats["prompt_eval_count"]
+        
+        cold = prompt_tokens("First question", SYSTEM_PROMPT)
+        warm = prompt_tokens("Second question", SYSTEM_PROMPT)
+        changed = prompt_tokens("Third question", "Different rules. " + SYSTEM_PROMPT)
+        assert warm < cold / 4
+        assert changed >= cold
+        
+        client.keep_alive = 0  # the model is unloaded after this call, dropping its cache
+        prompt_tokens("Fourth question", SYSTEM_PROMPT)
+        assert prompt_tokens("Fifth question", SYSTEM_PROMPT) >= cold
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
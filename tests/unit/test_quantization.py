@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Unit tests for quantized embedding storage
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+import pytest
+
+from ann_index import recall_at_k
+from quantization import Int8Vectors, PQVectors, pq_subspaces
+from vector_index import DenseIndex
+
+rng = np.random.default_rng(3)
+DATA = (rng.standard_normal((1500, 8)) @ rng.standard_normal((8, 32))).astype(np.float32)
+QUERIES = DATA[:30] + 0.01
+
+
+def exact_results():
+    index = DenseIndex(quantization="none")
+    index.add(DATA)
+    return index, [[i for i, _ in index.search(q, 5)] for q in QUERIES]
+
+
+def test_int8_is_4x_smaller_with_high_recall():
+    """int8 storage keeps recall close to float32"""
+    exact_index, exact = exact_results()
+    index = DenseIndex(quantization="int8", rerank=0)
+    index.add(DATA)
+    assert exact_index.nbytes / index.nbytes > 3.5
+    approx = [[i for i, _ in index.search(q, 5)] for q in QUERIES]
+    assert recall_at_k(exact, approx) > 0.9
+
+
+def test_pq_codes_use_one_byte_per_subspace():
+    """PQ stores m bytes per vector and reconstructs approximately"""
+    pq = PQVectors(32, m=8)
+    pq.add(DATA)
+    assert pq.codes.shape == (len(DATA), 8) and pq.codes.dtype == np.uint8
+    error = np.linalg.norm(pq.decode() - DATA) / np.linalg.norm(DATA)
+    assert error < 0.5
+
+
+def test_asymmetric_scores_match_decoded_inner_products():
+    """ADC scoring equals the inner product with reconstructed vectors"""
+    for storage in (Int8Vectors(32), PQVectors(32, m=8)):
+        storage.add(DATA)
+        np.testing.assert_allclose(storage.score(QUERIES[0]), storage.decode() @ QUERIES[0], rtol=1e-4, atol=1e-3)
+
+
+def test_rerank_restores_exact_order():
+    """Exact re-ranking of PQ candidates recovers the float32 top-k"""
+    exact_index, exact = exact_results()
+    index = DenseIndex(quantization="pq", rerank=50, rerank_fn=lambda ids: DATA[ids])
+    index.quantized = PQVectors(32, m=8)
+    index.add(DATA)
+    approx = [[i for i, _ in index.search(q, 5)] for q in QUERIES]
+    assert recall_at_k(exact, approx) > 0.95
+
+
+def test_pq_rejects_indivisible_dimension():
+    with pytest.raises(ValueError):
+        PQVectors(30, m=8)
+
+
+def test_pq_subspaces_divide_any_dimension():
+    """The dense index stays usable when the dimension is not a multiple of PQ_SUBSPACES"""
+    assert pq_subspaces(768) == 16 and pq_subspaces(30, limit=16) == 15 and pq_subspaces(7) == 7
+    data = DATA[:, :30].copy()
+    index = DenseIndex(quantization="pq")
+    index.add(data)
+    assert index.quantized.m == 15
+    assert index.search(data[0], 1)[0][0] == 0
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the LLM response cache
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from response_cache import ResponseCache, make_cache_key
+from async_llm_client import AsyncOllamaClient
+from data_loader import KnowledgeBase
+from llm_client import OllamaClient
+from rag_engine import RAGEngine
+from tests.fake_ollama import FakeOllamaServer
+
+
+def test_key_depends_on_every_component():
+    """Model, prompt, options and version all change the key"""
+    base = make_cache_key("m", "p", {"temperature": 0.3}, "v1")
+    assert base == make_cache_key("m", "p", {"temperature": 0.3}, "v1")
+    assert len({
+        base,
+        make_cache_key("m2", "p", {"temperature": 0.3}, "v1"),
+        make_cache_key("m", "p2", {"temperature": 0.3}, "v1"),
+        make_cache_key("m", "p", {"temperature": 0.4}, "v1"),
+        make_cache_key("m", "p", {"temperature": 0.3}, "v2"),
+    }) == 5
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    """Least recently used entries go first when either limit is exceeded"""
+    cache = ResponseCache(max_entries=2, max_bytes=1000, ttl=0)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None and cache.get("a") == "1"
+    
+    small = ResponseCache(max_entries=10, max_bytes=10, ttl=0)
+    small.put("a", "x" * 6)
+    small.put("b", "y" * 6)
+    assert small.get("a") is None and small.get("b") == "y" * 6
+    assert small.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    """Entries past their TTL are misses"""
+    cache = ResponseCache(ttl=0.05)
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.08)
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_sqlite_tier_shared_between_instances(tmp_path):
+    """A second worker finds entries written by the first through SQLite"""
+    path = tmp_path / "responses.db"
+    ResponseCache(sqlite_path=path).put("k", "shared answer")
+    other = ResponseCache(sqlite_path=path)
+    assert other.get("k") == "shared answer"
+    assert other.get("k") == "shared answer"
+    stats = other.stats()
+    assert stats["sqlite_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_client_serves_repeat_prompts_from_cache():
+    """Identical low-temperature requests reach Ollama once"""
+    with FakeOllamaServer() as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", response_cache=ResponseCache())
+        client._model_detected = True
+        assert client.generate("q", temperature=0.3) == "Hello there!"
+        assert client.generate("q", temperature=0.3) == "Hello there!"
+        assert list(client.stream_generate("q", temperature=0.3)) == ["Hello there!"]
+        assert server.requests == 1
+        
+        client.generate("q", temperature=0.9)
+        client.generate("q", temperature=0.9)
+        assert server.requests == 3
+        assert client.response_cache.stats()["hits"] == 2
+
+
+def test_streamed_reply_is_cached():
+    """A completed stream fills the cache for later calls"""
+    with FakeOllamaServer(reply_tokens=["a", "b"]) as server:
+        client = OllamaClient(base_url=server.base_url, model="gemma:2b", response_cache=ResponseCache())
+        client._model_detected = True
+        assert list(client.stream_generate("q", temperature=0.3)) == ["a", "b"]
+        assert client.generate("q", temperature=0.3) == "ab"
+        assert server.requests == 1
+
+
+def test_async_stream_uses_cache():
+    """The async client stores completed streams and replays them as one delta"""
+    async def collect(stream):
+        return [delta async for delta in await stream]
+    
+    async def run(server):
+        client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b", response_cache=ResponseCache())
+        client._model_detected = True
+        first = await collect(client.stream_generate("q", temperature=0.3))
+        second = await collect(client.stream_generate("q", temperature=0.3))
+        cached = await client.generate("q", temperature=0.3)
+        other = await collect(client.stream_generate("q", temperature=0.3, cache_version="v2"))
+        await client.aclose()
+        return first, second, cached, other
+    
+    with FakeOllamaServer(reply_tokens=["a", "b"]) as server:
+        first, second, cached, other = asyncio.run(run(server))
+        assert first == ["a", "b"] and other == ["a", "b"]
+        assert second == ["ab"] and cached == "ab"
+        assert server.requests == 2
+
+
+def test_errors_are_not_cached():
+    """Fallback messages from failed calls never enter the cache"""
+    client = OllamaClient(base_url="http://127.0.0.1:9", model="gemma:2b", response_cache=ResponseCache())
+    client._model_detected = True
+    client.generate("q", temperature=0.3)
+    assert client.response_cache.stats()["entries"] == 0
+
+
+def test_kb_change_invalidates_answers(tmp_path):
+    """Adding a document changes the KB version and so the cache key"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json")
+    with FakeOllamaServer() as server:
+        rag = RAGEngine(kb=kb, llm_client=OllamaClient(base_url=server.base_url, response_cache=ResponseCache()))
+        rag.process_query("How do I file a claim?")
+        rag.process_query("How do I file a claim?")
+        chats = server.requests
+        
+        version = kb.version
+        kb.add_document({"id": "new", "title": "Gift cards", "content": "Gift cards.", "keywords": []})
+        assert kb.version != version
+        rag.process_query("How do I file a claim?")
+        assert server.requests == chats + 1
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
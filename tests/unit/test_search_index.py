@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the knowledge base inverted index
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from data_loader import KnowledgeBase
+from search_index import InvertedIndex, STOP_WORDS, normalize_token, tokenize
+
+DOCS = [
+    {"id": "a", "title": "How to file a claim", "content": "Log in and click File a Claim.", "keywords": ["claim", "file"]},
+    {"id": "b", "title": "Plan pricing", "content": "Plans start from $99 annually.", "keywords": ["price", "plan"]},
+    {"id": "c", "title": "Claim processing time", "content": "Most claims take 5-10 days.", "keywords": ["claim", "status"]},
+]
+
+
+def test_tokenize_normalizes_case_punctuation_and_plurals():
+    """Tokens are lowercased, punctuation-free and singular"""
+    assert tokenize("How do I file CLAIMS?") == ["how", "do", "i", "file", "claim"]
+    assert tokenize("class") == ["class"]
+
+
+def test_postings_only_cover_matching_documents():
+    """A token's posting list holds only documents containing it"""
+    index = InvertedIndex(DOCS)
+    assert set(index.get_postings("claim")) == {0, 2}
+    assert index.get_postings("nonexistent") == {}
+
+
+def test_keyword_search_scores_like_linear_scan():
+    """Content/title hits score 2 and keyword hits score 3"""
+    index = InvertedIndex(DOCS)
+    hits = index.keyword_search("file claim", top_k=3)
+    assert hits[0] == (0, 10)
+    assert hits[1] == (2, 5)
+    assert len(hits) == 2
+
+
+def test_bm25f_ignores_stop_words_and_normalizes_scores():
+    """Stop-word-only queries match nothing and scores stay on a 0-10 scale"""
+    index = InvertedIndex(DOCS)
+    assert index.bm25f_search("what how do I", top_k=3) == []
+    
+    hits = index.bm25f_search("how do I file a claim", top_k=3)
+    assert hits[0][0] == 0
+    assert all(0 < score <= 10 for _, score in hits)
+
+
+def test_stop_words_are_normalized_tokens():
+    """Every stop word is in the form tokenize() produces, so it can match a query token"""
+    assert all(normalize_token(word) == word for word in STOP_WORDS)
+    assert set(tokenize("What was this and does it")) <= STOP_WORDS
+
+
+def test_bm25f_unknown_terms_lower_score():
+    """Query terms absent from the corpus reduce the normalised score"""
+    index = InvertedIndex(DOCS)
+    focused = index.bm25f_search("file claim", top_k=1)[0][1]
+    diluted = index.bm25f_search("file claim pizza recipe", top_k=1)[0][1]
+    assert diluted < focused
+
+
+def test_bm25f_statistics_refresh_after_add():
+    """Documents added after build are ranked once statistics are recomputed"""
+    index = InvertedIndex(DOCS)
+    index.add({"id": "d", "title": "Refund policy", "content": "Refunds are issued within 30 days.", "keywords": ["refund"]})
+    assert index.bm25f_search("refund", top_k=1)[0][0] == 3
+
+
+class _UnwalkableDict(dict):
+    """Posting list that fails if scanned as a whole"""
+    def items(self):
+        raise AssertionError("full posting list walked")
+
+
+def test_restricted_search_only_visits_restricted_documents():
+    """A narrowed search looks up its documents instead of scanning common terms' postings"""
+    docs = [dict(DOCS[i % 3], id=str(i)) for i in range(30)]
+    index = InvertedIndex(docs)
+    expected = {
+        mode: [hit for hit in getattr(index, mode)("file claim", top_k=30) if hit[0] in {2, 3}]
+        for mode in ("keyword_search", "bm25f_search")
+    }
+    index.postings["claim"] = _UnwalkableDict(index.postings["claim"])
+    assert index.keyword_search("file claim", top_k=30, restrict_to={2, 3}) == expected["keyword_search"]
+    assert [d for d, _ in index.bm25f_search("file claim", top_k=30, restrict_to={2, 3})] == [
+        d for d, _ in expected["bm25f_search"]
+    ]
+
+
+def test_knowledge_base_search_contract(tmp_path):
+    """KnowledgeBase.search returns documents with relevance_score, best first"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json")
+    results = kb.search("How do I file a claim?", top_k=2)
+    assert 0 < len(results) <= 2
+    assert all('relevance_score' in doc for doc in results)
+    assert results[0]['relevance_score'] >= results[-1]['relevance_score']
+    
+    bm25f_results = kb.search("How do I file a claim?", top_k=2, mode="bm25f")
+    assert bm25f_results and all('relevance_score' in doc for doc in bm25f_results)
+    
+    kb.add_document({"title": "Test Document", "content": "This is a test document", "keywords": ["test"]})
+    assert kb.search("test document", top_k=1)[0]['title'] == "Test Document"
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the semantic answer cache
+"""
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from semantic_cache import SemanticCache
+from data_loader import KnowledgeBase
+from rag_engine import RAGEngine
+from chat_agent import SquareTradeAgent
+from escalation_handler import EscalationHandler
+
+
+def _cache(tmp_path, **kwargs):
+    kwargs.setdefault("threshold", 0.9)
+    kwargs.setdefault("audit_path", tmp_path / "audit.jsonl")
+    return SemanticCache(**kwargs)
+
+
+def test_near_duplicate_hits_and_distant_misses(tmp_path):
+    """Only queries above the cosine threshold are served"""
+    cache = _cache(tmp_path)
+    cache.add("how do I file a claim", [1.0, 0.0, 0.1], "intent_file_claim", "Go online.", {"confidence": 0.8})
+    hit = cache.lookup("how can I file a claim", [0.98, 0.02, 0.1], "intent_file_claim")
+    assert hit["response"] == "Go online." and hit["similarity"] > 0.99
+    assert cache.lookup("cancel my plan", [0.0, 1.0, 0.0], "intent_file_claim") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_intent_and_version_must_match(tmp_path):
+    """A similar query with another intent or KB version is a miss"""
+    cache = _cache(tmp_path)
+    cache.add("q", [1.0, 0.0], "intent_a", "A", {}, version="v1")
+    assert cache.lookup("q", [1.0, 0.0], "intent_b", "v1") is None
+    assert cache.lookup("q", [1.0, 0.0], "intent_a", "v2") is None
+    assert cache.lookup("q", [1.0, 0.0], "intent_a", "v1")["response"] == "A"
+
+
+def test_lru_eviction_bounds_entries(tmp_path):
+    """The least recently used slot is reused once the cache is full"""
+    cache = _cache(tmp_path, max_entries=2)
+    cache.add("a", [1.0, 0.0, 0.0], None, "A", {})
+    cache.add("b", [0.0, 1.0, 0.0], None, "B", {})
+    assert cache.lookup("a", [1.0, 0.0, 0.0], None) is not None
+    cache.add("c", [0.0, 0.0, 1.0], None, "C", {})
+    assert len(cache) == 2
+    assert cache.lookup("b", [0.0, 1.0, 0.0], None) is None
+    assert cache.lookup("a", [1.0, 0.0, 0.0], None)["response"] == "A"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_miss(tmp_path, monkeypatch):
+    """Entries older than the TTL are dropped on lookup"""
+    cache = _cache(tmp_path, ttl=10)
+    cache.add("a", [1.0, 0.0], None, "A", {})
+    monkeypatch.setattr("semantic_cache.time.time", lambda: 10 ** 12)
+    assert cache.lookup("a", [1.0, 0.0], None) is None
+    assert len(cache) == 0
+
+
+def test_audit_mode_samples_hits(tmp_path):
+    """With audit_rate=1 every hit is written to the audit log"""
+    cache = _cache(tmp_path, audit_rate=1.0)
+    cache.add("how do I file a claim", [1.0, 0.0], "intent_file_claim", "Go online.", {})
+    cache.lookup("filing a claim?", [1.0, 0.05], "intent_file_claim")
+    record = json.loads((tmp_path / "audit.jsonl").read_text().strip())
+    assert record["query"] == "filing a claim?"
+    assert record["cached_query"] == "how do I file a claim"
+    assert record["response"] == "Go online."
+
+
+class CountingLLM:
+    """LLM stub counting generations"""
+    
+    def __init__(self, reply="Answer from the knowledge base."):
+        self.reply = reply
+        self.calls = 0
+    
+    def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return self.reply
+    
+    def stream_generate(self, prompt, **kwargs):
+        self.calls += 1
+        return iter([self.reply[:6], self.reply[6:]])
+
+
+def _embed(text):
+    """Bag-of-words embedding over a tiny vocabulary"""
+    words = text.lower().replace("?", "").split()
+    vocab = ["claim", "file", "cancel", "plan", "phone", "broken"]
+    return [float(words.count(w)) for w in vocab] + [0.1]
+
+
+def _engine(tmp_path, llm):
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", embedder=_embed)
+    return RAGEngine(kb=kb, llm_client=llm, retrieval_mode="keyword", semantic_cache=_cache(tmp_path))
+
+
+def test_rag_engine_serves_near_duplicates_from_cache(tmp_path):
+    """A rephrased question with the same intent skips generation"""
+    llm = CountingLLM()
+    rag = _engine(tmp_path, llm)
+    answer, metadata = rag.process_query("How do I file a claim for my broken phone?")
+    assert llm.calls == 1 and metadata["cache"] is None
+    
+    cached, cached_metadata = rag.process_query("how do i file a claim for a broken phone")
+    assert llm.calls == 1
+    assert cached == answer
+    assert cached_metadata["cache"]["type"] == "semantic"
+    assert cached_metadata["user_query"] == "how do i file a claim for a broken phone"
+    assert cached_metadata["confidence"] == metadata["confidence"]
+
+
+def test_rag_engine_does_not_cache_error_fallbacks(tmp_path):
+    """Error fallback messages are never stored"""
+    llm = CountingLLM(reply="Service temporarily unavailable. Please try again.")
+    rag = _engine(tmp_path, llm)
+    rag.process_query("How do I file a claim for my broken phone?")
+    rag.process_query("How do I file a claim for my broken phone?")
+    assert llm.calls == 2
+
+
+def test_streamed_answers_are_cached(tmp_path):
+    """A completed stream populates the cache for the next request"""
+    llm = CountingLLM()
+    rag = _engine(tmp_path, llm)
+    tokens, _ = rag.process_query_stream("How do I file a claim for my broken phone?")
+    assert "".join(tokens) == llm.reply
+    answer, metadata = rag.process_query("How do I file a claim for my broken phone?")
+    assert answer == llm.reply and metadata["cache"] is not None and llm.calls == 1
+
+
+def test_metrics_report_semantic_cache(tmp_path):
+    """Agent metrics include the semantic cache counters"""
+    llm = CountingLLM()
+    llm.response_cache = None
+    agent = SquareTradeAgent(
+        kb=KnowledgeBase(kb_path=tmp_path / "missing.json"),
+        llm_client=llm,
+        escalation_handler=EscalationHandler(db_path=tmp_path / "escalations.json")
+    )
+    agent.rag.semantic_cache = _cache(tmp_path)
+    assert agent.get_metrics()["semantic_cache"]["entries"] == 0
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Unit tests for coalescing identical in-flight LLM requests
+"""
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from singleflight import SingleFlight
+from llm_client import OllamaClient
+from async_llm_client import AsyncOllamaClient
+from tests.fake_ollama import FakeOllamaServer
+
+CALLERS = 5
+
+
+def _run_together(fn, n=CALLERS):
+    """Call fn from n threads released at the same moment"""
+    barrier = threading.Barrier(n)
+    
+    def call(_):
+        barrier.wait()
+        return fn()
+    
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+def _client(server, **kwargs):
+    client = OllamaClient(base_url=server.base_url, model="gemma:2b", **kwargs)
+    client._ensure_model()
+    return client
+
+
+def test_concurrent_generate_makes_one_upstream_call():
+    """Identical concurrent prompts share a single /api/chat request"""
+    with FakeOllamaServer(delay=0.3) as server:
+        client = _client(server)
+        before = server.requests
+        replies = _run_together(lambda: client.generate("is the claims site down"))
+        assert replies == ["Hello there!"] * CALLERS
+        assert server.requests - before == 1
+        assert client.inflight.stats()["coalesced"] == CALLERS - 1
+
+
+def test_different_prompts_are_not_coalesced():
+    """Only identical requests share a call"""
+    with FakeOllamaServer(delay=0.2) as server:
+        client = _client(server)
+        before = server.requests
+        prompts = iter([f"question {i}" for i in range(3)])
+        lock = threading.Lock()
+        
+        def ask():
+            with lock:
+                prompt = next(prompts)
+            return client.generate(prompt)
+        
+        _run_together(ask, n=3)
+        assert server.requests - before == 3
+
+
+def test_coalescing_can_be_disabled():
+    """With coalesce=False every caller reaches the server"""
+    with FakeOllamaServer(delay=0.2) as server:
+        client = _client(server, coalesce=False)
+        before = server.requests
+        _run_together(lambda: client.generate("same"), n=3)
+        assert server.requests - before == 3
+
+
+def test_concurrent_streams_fan_out_from_one_upstream():
+    """Every streaming consumer receives all deltas from one upstream stream"""
+    with FakeOllamaServer(delay=0.2, token_delay=0.02) as server:
+        client = _client(server)
+        before = server.requests
+        
+        def consume():
+            with client.stream_generate("is the claims site down") as stream:
+                deltas = list(stream)
+            return deltas, stream.done
+        
+        results = _run_together(consume)
+        assert all(result == (["Hello", " there", "!"], True) for result in results)
+        assert server.requests - before == 1
+
+
+def test_late_subscriber_replays_buffered_deltas():
+    """A subscriber joining mid-stream still sees the stream from the start"""
+    flight = SingleFlight()
+    first = flight.stream("k", lambda: iter(["a", "b", "c"]))
+    assert next(first) == "a"
+    second = flight.stream("k", lambda: iter(["never"]))
+    assert list(second) == ["a", "b", "c"]
+    assert list(first) == ["b", "c"]
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_upstream_closed_when_every_subscriber_leaves():
+    """Abandoning all subscribers closes the upstream and starts fresh next time"""
+    closed = []
+    
+    def upstream():
+        try:
+            yield "a"
+            yield "b"
+        finally:
+            closed.append(True)
+    
+    flight = SingleFlight()
+    stream = flight.stream("k", upstream)
+    assert next(stream) == "a"
+    stream.close()
+    assert closed == [True]
+    assert list(flight.stream("k", lambda: iter(["x"]))) == ["x"]
+
+
+def test_leader_error_reaches_followers():
+    """An exception raised by the shared call is re-raised for every caller"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    
+    def failing():
+        started.set()
+        release.wait()
+        raise RuntimeError("boom")
+    
+    def call():
+        try:
+            flight.do("k", failing)
+        except RuntimeError as e:
+            return str(e)
+    
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(call)
+        started.wait()
+        follower = pool.submit(call)
+        while flight.stats()["coalesced"] == 0:
+            pass
+        release.set()
+        assert leader.result() == follower.result() == "boom"
+
+
+def test_async_generate_makes_one_upstream_call():
+    """Concurrent coroutines with the same prompt share one request"""
+    with FakeOllamaServer(delay=0.2) as server:
+        async def main():
+            client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b")
+            await client._ensure_model()
+            before = server.requests
+            replies = await asyncio.gather(*(client.generate("is the claims site down") for _ in range(CALLERS)))
+            await client.aclose()
+            return replies, server.requests - before
+        
+        replies, upstream_calls = asyncio.run(main())
+        assert replies == ["Hello there!"] * CALLERS
+        assert upstream_calls == 1
+
+
+def test_async_streams_fan_out_from_one_upstream():
+    """Async streaming consumers share one upstream stream"""
+    with FakeOllamaServer(delay=0.1, token_delay=0.02) as server:
+        async def consume(client):
+            stream = await client.stream_generate("is the claims site down")
+            return [delta async for delta in stream], stream.done
+        
+        async def main():
+            client = AsyncOllamaClient(base_url=server.base_url, model="gemma:2b")
+            await client._ensure_model()
+            before = server.requests
+            results = await asyncio.gather(*(consume(client) for _ in range(3)))
+            await client.aclose()
+            return results, server.requests - before
+        
+        results, upstream_calls = asyncio.run(main())
+        assert all(result == (["Hello", " there", "!"], True) for result in results)
+        assert upstream_calls == 1
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
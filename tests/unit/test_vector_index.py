@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Unit tests for dense (semantic) retrieval
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from data_loader import KnowledgeBase
+from vector_index import DenseIndex
+
+VOCAB = ["claim", "file", "plan", "price", "cost", "coverage", "status", "damage"]
+
+
+def fake_embedder(text):
+    """Bag-of-words embedding over a tiny vocabulary"""
+    lowered = text.lower()
+    return [float(lowered.count(word)) for word in VOCAB]
+
+
+def test_dense_index_returns_best_matches_first():
+    """Top-k is ordered by cosine similarity"""
+    index = DenseIndex()
+    index.add([[1, 0, 0], [0.7, 0.7, 0], [0, 0, 1]])
+    assert index.matrix.dtype == np.float32
+    assert index.matrix.flags['C_CONTIGUOUS']
+    
+    hits = index.search([1, 0.1, 0], top_k=2)
+    assert [i for i, _ in hits] == [0, 1]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_dense_index_keeps_failed_embeddings_aligned():
+    """None vectors become zero rows that never match"""
+    index = DenseIndex()
+    index.add([None, [0, 1]])
+    assert len(index) == 2
+    assert index.search([0, 1], top_k=2) == [(1, 1.0)]
+
+
+def test_semantic_search_result_contract(tmp_path):
+    """Semantic mode returns chunk dicts with 0-10 relevance scores"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="semantic", embedder=fake_embedder)
+    results = kb.search("what is the price", top_k=2)
+    assert results[0]['id'] == "plan_002"
+    assert all(0 < r['relevance_score'] <= 10 for r in results)
+    assert len(kb.dense_index) == len(kb.chunks)
+    
+    kb.add_document({"id": "new", "title": "Claim status", "content": "Check claim status online.", "keywords": []})
+    kb.search("status", top_k=1)
+    assert len(kb.dense_index) == len(kb.chunks)
+
+
+def test_semantic_search_falls_back_without_embedder(tmp_path):
+    """Without an embedder semantic mode degrades to keyword search"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="semantic")
+    assert kb.search("file a claim", top_k=1)[0]['id'] == "claim_001"
+
+
+def test_dense_index_replace_overwrites_rows():
+    """Replaced rows are found under their new vectors, with or without quantization and IVF"""
+    for quantization in ("none", "int8", "pq"):
+        index = DenseIndex(quantization=quantization)
+        index.add([None, [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+        index.build_ann(nlist=2, nprobe=2)
+        index.replace([0], [[0, 0, 1, 1]])
+        assert index.search([0, 0, 1, 1], top_k=1)[0][0] == 0
+
+
+def test_failed_chunk_embeddings_are_retried(tmp_path, monkeypatch):
+    """Chunks stored as zero rows are embedded again on a later search"""
+    failing = {"claim_001"}
+    
+    def flaky_embedder(text):
+        if any(c['id'] in failing and kb._chunk_text_for_embedding(c) == text for c in kb.chunks):
+            return None
+        return fake_embedder(text)
+    
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="semantic", embedder=flaky_embedder)
+    monkeypatch.setattr(KnowledgeBase, "_EMBED_RETRY_INTERVAL", 0.0)
+    assert "claim_001" not in [r['id'] for r in kb.search("file a claim", top_k=3)]
+    
+    failing.clear()
+    assert kb.search("file a claim", top_k=1)[0]['id'] == "claim_001"
+    assert kb._unembedded == set()
+
+
+def test_semantic_search_falls_back_on_dimension_mismatch(tmp_path):
+    """An embedder whose dimension changes degrades to keyword search instead of raising"""
+    kb = KnowledgeBase(kb_path=tmp_path / "missing.json", retrieval_mode="semantic", embedder=fake_embedder)
+    kb.search("price", top_k=1)
+    kb.embedder = lambda text: [1.0, 2.0]
+    kb.add_document({"id": "new", "title": "Claim status", "content": "Check claim status online.", "keywords": []})
+    assert kb.search("file a claim", top_k=1)[0]['id'] == "claim_001"
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,225 @@
+"""
+Dense vector index for semantic retrieval over knowledge base chunks
+"""
+
+import logging
+from typing import List, Tuple, Optional, Sequence, Callable, Set
+from config import EMBEDDING_QUANTIZATION, QUANTIZED_RERANK
+from ann_index import IVFIndex
+from quantization import make_quantized_vectors
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for semantic retrieval
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+def numpy_available() -> bool:
+    """Check whether numpy is installed"""
+    return np is not None
+
+
+class DenseIndex:
+    """
+    Cosine-similarity index backed by a contiguous float32 matrix
+    
+    Rows are L2-normalised at insert time so a query is scored against the
+    whole corpus with a single matrix-vector product. For large corpora an
+    IVF index can be attached so queries only score a few clusters.
+    
+    With quantization ('int8' or 'pq') rows are kept only in compressed form
+    and scored asymmetrically; the best candidates can then be re-scored
+    exactly with float32 vectors fetched through rerank_fn (for example from
+    the memory-mapped embedding cache).
+    """
+    
+    def __init__(
+        self,
+        dim: int = None,
+        quantization: str = None,
+        rerank: int = None,
+        rerank_fn: Callable[[List[int]], Optional["np.ndarray"]] = None
+    ):
+        """
+        Initialize an empty index
+        
+        Args:
+            dim: Embedding dimension (inferred from the first vector if omitted)
+            quantization: 'none', 'int8' or 'pq' (defaults to EMBEDDING_QUANTIZATION)
+            rerank: Candidates re-scored exactly when quantized (0 disables)
+            rerank_fn: Function returning float32 vectors for row ids, used for re-ranking
+        """
+        if np is None:
+            raise ImportError("numpy is required for semantic retrieval")
+        self.dim = dim
+        self.quantization = quantization or EMBEDDING_QUANTIZATION
+        self.rerank = QUANTIZED_RERANK if rerank is None else rerank
+        self.rerank_fn = rerank_fn
+        self.matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self.quantized = None
+        self.ann: Optional[IVFIndex] = None
+    
+    def __len__(self) -> int:
+        if self.quantized is not None:
+            return len(self.quantized)
+        return self.matrix.shape[0]
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the stored vectors"""
+        if self.quantized is not None:
+            return self.quantized.nbytes
+        return self.matrix.nbytes
+    
+    @staticmethod
+    def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+        """L2-normalise rows, leaving zero rows untouched"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def add(self, vectors: Sequence[Optional[Sequence[float]]]) -> None:
+        """
+        Append vectors to the index
+        
+        Args:
+            vectors: Embedding vectors; None entries (failed embeddings) are
+                stored as zero rows so positions stay aligned with the corpus
+        """
+        if len(vectors) == 0:
+            return
+        if self.dim is None:
+            first = next((v for v in vectors if v is not None), None)
+            if first is None:
+                raise ValueError("Cannot infer embedding dimension without any vector")
+            self.dim = len(first)
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+        
+        block = self._block(vectors)
+        start_id = len(self)
+        
+        if self.quantization != "none":
+            if self.quantized is None:
+                self.quantized = make_quantized_vectors(self.quantization, self.dim)
+            self.quantized.add(block)
+        else:
+            self.matrix = np.ascontiguousarray(np.vstack([self.matrix, block]))
+        if self.ann is not None:
+            self.ann.add(block, start_id=start_id)
+    
+    def replace(self, ids: Sequence[int], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Overwrite stored rows, e.g. zero rows left by embeddings that failed
+        
+        Args:
+            ids: Row positions to overwrite
+            vectors: Their embedding vectors
+        """
+        if len(ids) == 0:
+            return
+        block = self._block(vectors)
+        if self.quantized is not None:
+            self.quantized.replace(ids, block)
+        else:
+            self.matrix[ids] = block
+        if self.ann is not None:
+            self.ann.replace(ids, block)
+    
+    def _block(self, vectors: Sequence[Optional[Sequence[float]]]) -> "np.ndarray":
+        """Normalised float32 rows for vectors (None as zero rows), checking the dimension"""
+        if isinstance(vectors, np.ndarray):
+            block = np.array(vectors, dtype=np.float32, ndmin=2)
+            if block.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {block.shape[1]} does not match index dimension {self.dim}")
+        else:
+            block = np.zeros((len(vectors), self.dim), dtype=np.float32)
+            for row, vector in enumerate(vectors):
+                if vector is not None:
+                    if len(vector) != self.dim:
+                        raise ValueError(f"Embedding dimension {len(vector)} does not match index dimension {self.dim}")
+                    block[row] = vector
+        return self._normalize(block)
+    
+    def build_ann(self, nlist: int = None, nprobe: int = None) -> IVFIndex:
+        """
+        Train and attach an IVF index over the current vectors
+        
+        Args:
+            nlist: Number of clusters (defaults to config)
+            nprobe: Clusters probed per query (defaults to config)
+        
+        Returns:
+            The attached IVFIndex
+        """
+        kwargs = {k: v for k, v in (("nlist", nlist), ("nprobe", nprobe)) if v is not None}
+        vectors = self.quantized.decode() if self.quantized is not None else self.matrix
+        self.ann = IVFIndex(**kwargs).build(vectors)
+        return self.ann
+    
+    def _score(self, query: "np.ndarray", ids: "np.ndarray" = None) -> "np.ndarray":
+        """Inner products between the query and stored rows (all rows if ids is None)"""
+        if self.quantized is not None:
+            return self.quantized.score(query, ids)
+        return (self.matrix if ids is None else self.matrix[ids]) @ query
+    
+    @staticmethod
+    def _best(scores: "np.ndarray", k: int) -> "np.ndarray":
+        """Positions of the k highest scores, best first"""
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        return best[np.argsort(-scores[best], kind='stable')]
+    
+    def search(
+        self,
+        query_vector: Sequence[float],
+        top_k: int = 3,
+        restrict_to: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the rows most similar to a query vector
+        
+        Uses the attached IVF index when present, otherwise exact search.
+        
+        Args:
+            query_vector: Query embedding
+            top_k: Number of results to return
+            restrict_to: Only score these rows (None searches the whole index)
+        
+        Returns:
+            List of (row position, cosine similarity) sorted by similarity
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+        
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        
+        subset = None
+        if restrict_to is not None:
+            subset = np.array(sorted(i for i in restrict_to if i < len(self)), dtype=np.int64)
+        elif self.ann is not None:
+            subset = self.ann.probe(query)
+        candidates = subset if subset is not None else np.arange(len(self))
+        if len(candidates) == 0:
+            return []
+        scores = self._score(query, subset)
+        
+        rerank = self.quantized is not None and self.rerank_fn is not None and self.rerank > 0
+        best = self._best(scores, max(top_k, self.rerank) if rerank else top_k)
+        ids, scores = candidates[best], scores[best]
+        
+        if rerank:
+            exact = self.rerank_fn([int(i) for i in ids])
+            if exact is not None:
+                scores = self._normalize(np.asarray(exact, dtype=np.float32)) @ query
+                order = self._best(scores, top_k)
+                ids, scores = ids[order], scores[order]
+        
+        return [(int(i), float(score)) for i, score in zip(ids[:top_k], scores[:top_k]) if score > 0]
@@ -3,12 +3,14 @@ Flask web API for SquareTrade chat widget
 Provides endpoints for the front-end chat interface
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
+import json
 import logging
 import uuid
 from datetime import datetime
 from chat_agent import get_agent
+from admission import AdmissionRejected
 
 app = Flask(__name__)
 CORS(app)
@@ -19,6 +21,39 @@ logger = logging.getLogger(__name__)
 sessions = {}
 
 
+def _track_session(session_id: str, user_id: str) -> None:
+    """Create the session record on first use"""
+    if session_id not in sessions:
+        sessions[session_id] = {
+            "created_at": datetime.utcnow().isoformat(),
+            "user_id": user_id,
+            "messages": []
+        }
+
+
+def _record_message(session_id: str, user_message: str, response: str) -> None:
+    """Append an exchange to the session history"""
+    sessions[session_id]["messages"].append({
+        "user": user_message,
+        "agent": response,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _busy_payload(error: AdmissionRejected) -> dict:
+    """Body returned when a request is shed by LLM admission control"""
+    return {
+        "error": "The assistant is busy right now. Please try again shortly.",
+        "success": False,
+        "retry_after": error.retry_after
+    }
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -27,6 +62,13 @@ def health():
     return jsonify(status), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Operational counters (cache hit rates, ...)"""
+    agent = get_agent()
+    return jsonify(agent.get_metrics()), 200
+
+
 @app.route('/test', methods=['GET'])
 def test():
     """Test connectivity of all components"""
@@ -42,8 +84,10 @@ def chat():
     Expects JSON: {
         "message": "user message",
         "user_id": "optional user id",
-        "session_id": "optional session id"
+        "session_id": "optional session id",
+        "priority": "optional, 'bulk' for batch jobs"
     }
+    Returns 503 with Retry-After when the LLM is saturated.
     """
     try:
         data = request.get_json()
@@ -56,27 +100,19 @@ def chat():
         session_id = data.get('session_id') or str(uuid.uuid4())
         
         # Track session
-        if session_id not in sessions:
-            sessions[session_id] = {
-                "created_at": datetime.utcnow().isoformat(),
-                "user_id": user_id,
-                "messages": []
-            }
+        _track_session(session_id, user_id)
         
         # Process message
         agent = get_agent()
         response_data = agent.process_message(
             user_message=user_message,
             user_id=user_id,
-            session_id=session_id
+            session_id=session_id,
+            priority=data.get('priority')
         )
         
         # Log message in session
-        sessions[session_id]["messages"].append({
-            "user": user_message,
-            "agent": response_data.get('response'),
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        _record_message(session_id, user_message, response_data.get('response'))
         
         # Return response
         return jsonify({
@@ -85,11 +121,67 @@ def chat():
             **response_data
         }), 200
     
+    except AdmissionRejected as e:
+        logger.warning(f"/chat request shed: {e}")
+        return jsonify(_busy_payload(e)), 503, {"Retry-After": str(e.retry_after)}
+    
     except Exception as e:
         logger.error(f"Error in /chat endpoint: {e}")
         return jsonify({"error": str(e), "success": False}), 500
 
 
+@app.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Accepts the same fields as /chat, as a JSON body or query parameters.
+    Emits a "metadata" event with retrieval results, "token" events with
+    answer text deltas, then a "done" event with the full /chat response.
+    A request shed by LLM admission control ends with an "error" event
+    carrying retry_after.
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    if not data or 'message' not in data:
+        return jsonify({"error": "message field is required"}), 400
+    
+    user_message = data.get('message', '').strip()
+    user_id = data.get('user_id', 'anonymous')
+    session_id = data.get('session_id') or str(uuid.uuid4())
+    _track_session(session_id, user_id)
+    
+    def generate():
+        try:
+            agent = get_agent()
+            for event, payload in agent.process_message_stream(
+                user_message=user_message,
+                user_id=user_id,
+                session_id=session_id,
+                priority=data.get('priority')
+            ):
+                if event == "done":
+                    _record_message(session_id, user_message, payload.get('response'))
+                    payload = {
+                        "session_id": session_id,
+                        "timestamp": datetime.utcnow().isoformat(),
+                        **payload
+                    }
+                elif event == "metadata":
+                    payload = {"session_id": session_id, **payload}
+                yield _sse(event, payload)
+        except AdmissionRejected as e:
+            logger.warning(f"/chat/stream request shed: {e}")
+            yield _sse("error", _busy_payload(e))
+        except Exception as e:
+            logger.error(f"Error in /chat/stream endpoint: {e}")
+            yield _sse("error", {"error": str(e), "success": False})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route('/faq', methods=['GET'])
 def faq():
     """
@@ -196,7 +288,7 @@ def widget():
         </div>
         
         <script>
-            const API_URL = '/chat';
+            const API_URL = '/chat/stream';
             let sessionId = localStorage.getItem('squaretrade_session_id') || '';
             let userId = localStorage.getItem('squaretrade_user_id') || 'widget_user';
             
@@ -216,6 +308,8 @@ def widget():
                 loadingDiv.textContent = 'Thinking...';
                 document.getElementById('messages').appendChild(loadingDiv);
                 
+                let agentText = null;
+                let answer = '';
                 try {
                     const response = await fetch(API_URL, {
                         method: 'POST',
@@ -226,42 +320,84 @@ def widget():
                             session_id: sessionId
                         })
                     });
-                    
-                    const data = await response.json();
-                    
-                    // Save session info
-                    if (data.session_id) {
-                        sessionId = data.session_id;
-                        localStorage.setItem('squaretrade_session_id', sessionId);
+                    if (!response.ok || !response.body) {
+                        throw new Error('HTTP ' + response.status);
                     }
                     
-                    // Remove loading indicator
-                    loadingDiv.remove();
-                    
-                    // Display agent response
-                    if (data.escalated) {
-                        const notice = document.createElement('div');
-                        notice.className = 'escalation-notice';
-                        notice.textContent = '⚠️ Escalated to human support. Ticket: ' + data.escalation_id;
-                        document.getElementById('messages').appendChild(notice);
-                    }
-                    
-                    displayMessage(data.response, 'agent');
-                    
-                    // Show confidence if available
-                    if (data.confidence !== undefined) {
-                        const confidence = document.createElement('div');
-                        confidence.className = 'loading';
-                        confidence.textContent = `Confidence: ${(data.confidence * 100).toFixed(1)}%`;
-                        document.getElementById('messages').appendChild(confidence);
+                    // Parse Server-Sent Events frames as they arrive
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                            const frame = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
+                            let event = 'message';
+                            let dataLines = [];
+                            for (const line of frame.split('\\n')) {
+                                if (line.startsWith('event:')) event = line.slice(6).trim();
+                                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                            }
+                            if (!dataLines.length) continue;
+                            const data = JSON.parse(dataLines.join('\\n'));
+                            
+                            if (event === 'metadata' || event === 'done') {
+                                // Save session info
+                                if (data.session_id) {
+                                    sessionId = data.session_id;
+                                    localStorage.setItem('squaretrade_session_id', sessionId);
+                                }
+                            }
+                            if (event === 'token') {
+                                // Render tokens incrementally
+                                if (!agentText) {
+                                    loadingDiv.remove();
+                                    agentText = displayMessage('', 'agent');
+                                }
+                                answer += data.delta;
+                                agentText.textContent = answer;
+                                scrollToBottom();
+                            } else if (event === 'done') {
+                                loadingDiv.remove();
+                                if (!agentText) {
+                                    agentText = displayMessage('', 'agent');
+                                }
+                                agentText.textContent = data.response || answer;
+                                
+                                if (data.escalated) {
+                                    const notice = document.createElement('div');
+                                    notice.className = 'escalation-notice';
+                                    notice.textContent = '⚠️ Escalated to human support. Ticket: ' + data.escalation_id;
+                                    document.getElementById('messages').appendChild(notice);
+                                }
+                                
+                                // Show confidence if available
+                                if (data.confidence !== undefined) {
+                                    const confidence = document.createElement('div');
+                                    confidence.className = 'loading';
+                                    confidence.textContent = `Confidence: ${(data.confidence * 100).toFixed(1)}%`;
+                                    document.getElementById('messages').appendChild(confidence);
+                                }
+                            } else if (event === 'error') {
+                                throw new Error(data.error);
+                            }
+                        }
                     }
                 } catch (error) {
                     loadingDiv.remove();
                     displayMessage('Error: ' + error.message, 'agent');
                 }
                 
-                // Scroll to bottom
-                document.getElementById('messages').scrollTop = document.getElementById('messages').scrollHeight;
+                scrollToBottom();
+            }
+            
+            function scrollToBottom() {
+                const messages = document.getElementById('messages');
+                messages.scrollTop = messages.scrollHeight;
             }
             
             function displayMessage(text, sender) {
@@ -269,6 +405,7 @@ def widget():
                 div.className = 'message ' + sender;
                 div.innerHTML = '<div class="text">' + escapeHtml(text) + '</div>';
                 document.getElementById('messages').appendChild(div);
+                return div.querySelector('.text');
             }
             
             function escapeHtml(text) {
@@ -303,6 +440,7 @@ def index():
             <li><a href="/widget">Open Chat Widget</a></li>
             <li><a href="/health">Health Check</a></li>
             <li><a href="/test">Test Components</a></li>
+            <li><a href="/metrics">Metrics</a></li>
             <li><a href="/faq">Get FAQs</a></li>
             <li><a href="/escalations">View Escalations</a></li>
         </ul>